@@ -1,13 +1,25 @@
-import pandas as pd
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+import base64
+import itertools
+import json
 import os
 import re
 import time
+import uuid
 from src.logging_config import app_logger
-from src.cache_manager import cache_manager, cached
-from src.connection_pool import connection_pool
+from src.cache_manager import cache_manager, cache_requests, cached
+from src.connection_pool import connection_pool, circuit_breakers, CircuitOpenError, is_connection_failure
+from src.intent_engine import intent_engine, canonical_intent, normalize_query
+from src.metrics import registry
+from src.profiling import profiled
+from src.tracing import get_tracer, traced
+
+tracer = get_tracer(__name__)
 
 def clean_text(text: str) -> str:
     """Clean text by removing invalid UTF-8 characters"""
@@ -16,18 +28,151 @@ def clean_text(text: str) -> str:
     # Remove invalid UTF-8 characters
     return text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
 
+# Hard caps that bound per-request memory regardless of how broad a match is
+MAX_RESULT_ROWS = int(os.getenv("DB_MAX_RESULT_ROWS", "200"))
+CURSOR_ITERSIZE = int(os.getenv("DB_CURSOR_ITERSIZE", "100"))
+DEFAULT_PAGE_SIZE = int(os.getenv("DB_DEFAULT_PAGE_SIZE", "50"))
+# Matching rows sampled for aggregate stats (e.g. top keywords), which stream rather than return rows
+MAX_SCAN_ROWS = int(os.getenv("DB_MAX_SCAN_ROWS", "5000"))
+
+_HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+def _is_successful_result(result: Any) -> bool:
+    """Only successful lookups are cached, so outages don't outlive the circuit breaker"""
+    return not (isinstance(result, dict) and (result.get("success") is False or "error" in result))
+
+agent_requests = registry.counter(
+    "website_agent_requests_total", "Website database lookups by outcome", ["operation", "intent", "status"]
+)
+agent_request_seconds = registry.histogram(
+    "website_agent_request_seconds", "Website database lookup latency (including cache hits)", ["operation", "intent"]
+)
+
+def _instrumented(operation: str, intent_of: Optional[Callable[..., str]] = None):
+    """Count and time a lookup; a result is an error if _is_successful_result rejects it"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            intent = intent_of(*args, **kwargs) if intent_of else ""
+            start = time.perf_counter()
+            status = "error"
+            try:
+                result = func(*args, **kwargs)
+                if _is_successful_result(result):
+                    status = "ok"
+                return result
+            finally:
+                agent_requests.labels(operation, intent, status).inc()
+                agent_request_seconds.labels(operation, intent).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def stream_rows(conn, query: str, params: Optional[Iterable] = None,
+                max_rows: int = MAX_RESULT_ROWS, itersize: int = CURSOR_ITERSIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Stream query results through a named (server-side) cursor
+    
+    Only `itersize` rows are held client-side at a time and iteration stops after
+    `max_rows`, so memory stays bounded however many rows match.
+    """
+    cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+    cursor.itersize = min(itersize, max_rows) if max_rows else itersize
+    try:
+        with tracer.start_as_current_span("db.execute", attributes={"db.max_rows": max_rows}):
+            cursor.execute(query, list(params) if params else None)
+        for count, row in enumerate(cursor):
+            if max_rows and count >= max_rows:
+                break
+            yield dict(row)
+    finally:
+        cursor.close()
+
+# Keyset columns of the paginated queries, in ORDER BY order (all descending)
+RECENT_KEYSET = ("downloaded_at", "id")
+RELEVANCE_KEYSET = ("occurrence_count", "downloaded_at", "id")
+
+def encode_page_token(row: Dict[str, Any], keyset: Tuple[str, ...] = RECENT_KEYSET) -> str:
+    """Encode the keyset position of the last row on a page"""
+    payload = {}
+    for column in keyset:
+        value = row.get(column)
+        payload[column] = value.isoformat() if isinstance(value, datetime) else value
+    encoded = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(encoded.encode('utf-8')).decode('ascii')
+
+def decode_page_token(token: Optional[str], keyset: Tuple[str, ...] = RECENT_KEYSET) -> Optional[Tuple[Any, ...]]:
+    """Decode a page token into keyset values, or None for the first page"""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        values = []
+        for column in keyset:
+            value = payload[column]
+            if column == "downloaded_at":
+                # Matches COALESCE(downloaded_at, 'epoch') in the queries
+                value = datetime.fromisoformat(value) if value else datetime(1970, 1, 1)
+            values.append(value)
+        return tuple(values)
+    except Exception as e:
+        raise ValueError(f"Invalid page token: {str(e)}")
+
+def _relevance_page_query(keyset: Optional[Tuple[Any, ...]]) -> str:
+    """
+    Term search with context snippets, most occurrences first, one keyset page at a time
+    
+    Parameters: term (x4), ILIKE pattern, the keyset values when paging, then the LIMIT.
+    """
+    keyset_clause = "WHERE (occurrence_count, COALESCE(downloaded_at, 'epoch'), id) < (%s, %s, %s)" if keyset else ""
+    return f"""
+        SELECT * FROM (
+            SELECT 
+                id, 
+                url, 
+                domain,
+                downloaded_at,
+                -- Extract a snippet of text around the match (100 chars before and after)
+                substring(content, 
+                        greatest(1, position(lower(%s) in lower(content)) - 100), 
+                        200 + length(%s)) AS context_snippet,
+                -- Count occurrences
+                (length(lower(content)) - length(replace(lower(content), lower(%s), ''))) / length(%s) AS occurrence_count
+            FROM websites
+            WHERE content ILIKE %s
+        ) matches
+        {keyset_clause}
+        ORDER BY occurrence_count DESC, COALESCE(downloaded_at, 'epoch') DESC, id DESC
+        LIMIT %s
+    """
+
 class WebsiteAgent:
     """Agent class to handle website search and database queries with connection pooling"""
     
     def __init__(self):
         """Initialize with connection pool manager"""
-        self.stats = {"queries": 0, "cache_hits": 0, "errors": 0}
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Lifetime query counters (from the metrics registry)"""
+        return {
+            "queries": int(agent_requests.total(intent="")),
+            "cache_hits": int(cache_requests.total(cache_type="database_queries", result="hit")
+                              + cache_requests.total(cache_type="stats", result="hit")),
+            "errors": int(agent_requests.total(intent="", status="error")),
+        }
             
-    @cached("database_queries", ttl=3600)  # Cache for 1 hour
-    def search_websites(self, term: str) -> Dict[str, Any]:
-        """Search websites for a specific term with context snippets and advanced caching"""
+    @profiled("website_agent.search_websites")
+    @traced("website_agent.search_websites")
+    @_instrumented("search_websites")
+    @cached("database_queries", ttl=3600, cache_if=_is_successful_result)  # Cache for 1 hour
+    def search_websites(self, term: str, page_token: Optional[str] = None, page_size: int = 50) -> Dict[str, Any]:
+        """
+        Search websites for a specific term with context snippets and advanced caching
+        
+        Results are paginated by relevance with a keyset on (occurrence_count, downloaded_at, id);
+        pass the returned next_page_token to fetch the following page.
+        """
         start_time = time.time()
-        self.stats["queries"] += 1
         
         try:
             # Check if database pool is available
@@ -41,28 +186,15 @@ class WebsiteAgent:
                     "search_term": term
                 }
             
+            page_size = max(1, min(page_size, MAX_RESULT_ROWS))
+            keyset = decode_page_token(page_token, RELEVANCE_KEYSET)
+            
             with connection_pool.get_db_connection() as conn:
                 # Create a cursor that returns dictionaries
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
                 
                 # Use parameterized query to prevent SQL injection with context snippets
-                query = """
-                    SELECT 
-                        id, 
-                        url, 
-                        domain,
-                        downloaded_at,
-                        -- Extract a snippet of text around the match (100 chars before and after)
-                        substring(content, 
-                                greatest(1, position(lower(%s) in lower(content)) - 100), 
-                                200 + length(%s)) AS context_snippet,
-                        -- Count occurrences
-                        (length(lower(content)) - length(replace(lower(content), lower(%s), ''))) / length(%s) AS occurrence_count
-                    FROM websites
-                    WHERE content ILIKE %s
-                    ORDER BY occurrence_count DESC, downloaded_at DESC
-                    LIMIT 50  -- Limit results for performance
-                """
+                query = _relevance_page_query(keyset)
                 
                 # Count query
                 count_query = """
@@ -72,10 +204,12 @@ class WebsiteAgent:
                 """
                 
                 search_param = f"%{term}%"
+                params = [term, term, term, term, search_param, *(keyset or ()), page_size + 1]
                 
-                # Execute the search query
-                cursor.execute(query, (term, term, term, term, search_param))
-                results = cursor.fetchall()
+                # Stream the search query through a server-side cursor; one extra row tells us whether another page exists
+                results = list(stream_rows(conn, query, params, max_rows=page_size + 1))
+                has_more = len(results) > page_size
+                results = results[:page_size]
                 
                 # Execute the count query
                 cursor.execute(count_query, (search_param,))
@@ -90,13 +224,13 @@ class WebsiteAgent:
                 return {
                     "success": True,
                     "count": total_count,
-                    "results": list(results),
+                    "results": results,
                     "search_term": term,
-                    "processing_time": processing_time
+                    "processing_time": processing_time,
+                    "next_page_token": encode_page_token(results[-1], RELEVANCE_KEYSET) if has_more and results else None
                 }
                 
         except Exception as e:
-            self.stats["errors"] += 1
             app_logger.error(f"Error searching websites: {str(e)}")
             return {
                 "success": False,
@@ -105,7 +239,10 @@ class WebsiteAgent:
                 "results": []
             }
     
-    @cached("stats", ttl=1800)  # Cache stats for 30 minutes
+    @profiled("website_agent.get_stats")
+    @traced("website_agent.get_stats")
+    @_instrumented("get_stats")
+    @cached("stats", ttl=1800, cache_if=_is_successful_result)  # Cache stats for 30 minutes
     def get_stats(self) -> Dict[str, Any]:
         """Get general statistics about the website database with caching"""
         start_time = time.time()
@@ -150,15 +287,22 @@ class WebsiteAgent:
                 }
                 
         except Exception as e:
-            self.stats["errors"] += 1
             app_logger.error(f"Error getting website stats: {str(e)}")
             return {
                 "success": False,
                 "error": str(e)
             }
 
-    def search_by_domain(self, domain: str) -> Dict[str, Any]:
-        """Search websites for content mentioning a specific domain"""
+    @profiled("website_agent.search_by_domain")
+    @traced("website_agent.search_by_domain")
+    @_instrumented("search_by_domain")
+    def search_by_domain(self, domain: str, page_token: Optional[str] = None, page_size: int = 20) -> Dict[str, Any]:
+        """
+        Search websites for content mentioning a specific domain
+        
+        Results are paginated like search_websites; pass the returned next_page_token
+        to fetch the following page.
+        """
         # Check if database pool is available
         if not connection_pool._db_pool:
             return {
@@ -169,27 +313,14 @@ class WebsiteAgent:
             }
         
         try:
+            page_size = max(1, min(page_size, MAX_RESULT_ROWS))
+            keyset = decode_page_token(page_token, RELEVANCE_KEYSET)
+            
             with connection_pool.get_db_connection() as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
                 
                 # Use parameterized query with context snippets and occurrence counting
-                query = """
-                    SELECT 
-                        id, 
-                        url, 
-                        domain,
-                        downloaded_at,
-                        -- Extract a snippet of text around the match (100 chars before and after)
-                        substring(content, 
-                                greatest(1, position(lower(%s) in lower(content)) - 100), 
-                                200 + length(%s)) AS context_snippet,
-                        -- Count occurrences
-                        (length(lower(content)) - length(replace(lower(content), lower(%s), ''))) / length(%s) AS occurrence_count
-                    FROM websites
-                    WHERE content ILIKE %s
-                    ORDER BY occurrence_count DESC, downloaded_at DESC
-                    LIMIT 20
-                """
+                query = _relevance_page_query(keyset)
                 
                 # Count query
                 count_query = """
@@ -200,9 +331,12 @@ class WebsiteAgent:
                 
                 search_param = f"%{domain}%"
                 
-                # Execute the search query
-                cursor.execute(query, (domain, domain, domain, domain, search_param))
-                results = cursor.fetchall()
+                params = [domain, domain, domain, domain, search_param, *(keyset or ()), page_size + 1]
+                
+                # Stream the search query through a server-side cursor; one extra row tells us whether another page exists
+                results = list(stream_rows(conn, query, params, max_rows=page_size + 1))
+                has_more = len(results) > page_size
+                results = results[:page_size]
                 
                 # Execute the count query
                 cursor.execute(count_query, (search_param,))
@@ -217,17 +351,15 @@ class WebsiteAgent:
                         SELECT keywords 
                         FROM websites 
                         WHERE content ILIKE %s AND keywords IS NOT NULL
+                        LIMIT %s
                     """
-                    cursor.execute(keyword_query, (search_param,))
-                    keywords_raw = cursor.fetchall()
-                    
-                    all_keywords = []
-                    for row in keywords_raw:
+                    # Count keywords as rows stream in instead of materializing every row
+                    keyword_counter = Counter()
+                    for row in stream_rows(conn, keyword_query, (search_param, MAX_SCAN_ROWS), max_rows=MAX_SCAN_ROWS):
                         if row["keywords"]:
-                            all_keywords.extend([kw.strip() for kw in row["keywords"].split(',')])
+                            keyword_counter.update(kw.strip() for kw in row["keywords"].split(','))
                     
-                    from collections import Counter
-                    keyword_counts = Counter(all_keywords).most_common(5)
+                    keyword_counts = keyword_counter.most_common(5)
                     domain_stats["top_keywords"] = [{"keyword": kw, "count": count} for kw, count in keyword_counts]
                 
                 cursor.close()
@@ -235,9 +367,10 @@ class WebsiteAgent:
                 return {
                     "success": True,
                     "count": total_count,
-                    "results": list(results),
+                    "results": results,
                     "domain_stats": domain_stats,
-                    "domain": domain
+                    "domain": domain,
+                    "next_page_token": encode_page_token(results[-1], RELEVANCE_KEYSET) if has_more and results else None
                 }
                 
         except Exception as e:
@@ -249,8 +382,17 @@ class WebsiteAgent:
                 "results": []
             }
 
-    def search_by_link_domain(self, domain: str) -> Dict[str, Any]:
-        """Search websites for pages that have href links to a specific domain"""
+    @profiled("website_agent.search_by_link_domain")
+    @traced("website_agent.search_by_link_domain")
+    @_instrumented("search_by_link_domain")
+    def search_by_link_domain(self, domain: str, page_token: Optional[str] = None,
+                              page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        Search websites for pages that have href links to a specific domain
+        
+        Results are paginated newest first with a keyset on (downloaded_at, id);
+        pass the returned next_page_token to fetch the following page.
+        """
         # Check if database pool is available
         if not connection_pool._db_pool:
             return {
@@ -261,35 +403,50 @@ class WebsiteAgent:
             }
         
         try:
+            page_size = max(1, min(page_size, MAX_RESULT_ROWS))
+            keyset = decode_page_token(page_token)
+            
             with connection_pool.get_db_connection() as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
                 
+                link_pattern = """'<a[^>]*href=["''][^"'']*' || %s || '[^"'']*["''][^>]*>'"""
+                keyset_clause = "AND (COALESCE(downloaded_at, 'epoch'), id) < (%s, %s)" if keyset else ""
+                
                 # Use a query to find pages with links to the specified domain
-                query = """
+                query = f"""
                     SELECT 
                         id, 
                         url, 
                         domain,
                         downloaded_at,
-                        -- Look for anchor tags with href containing the domain
-                        regexp_matches(content, '<a[^>]*href=["''][^"'']*' || %s || '[^"'']*["''][^>]*>', 'gi') AS link_sample,
+                        -- First anchor tag with href containing the domain (case-insensitive, like the WHERE clause)
+                        substring(content from '(?i)' || {link_pattern}) AS link_sample,
                         -- Count occurrences of such links
-                        array_length(regexp_matches(content, '<a[^>]*href=["''][^"'']*' || %s || '[^"'']*["''][^>]*>', 'gi'), 1) AS link_count
+                        (SELECT COUNT(*) FROM regexp_matches(content, {link_pattern}, 'gi')) AS link_count
                     FROM websites
-                    WHERE content ~* ('<a[^>]*href=["''][^"'']*' || %s || '[^"'']*["''][^>]*>')
-                    ORDER BY link_count DESC, downloaded_at DESC
+                    WHERE content ~* ({link_pattern})
+                    {keyset_clause}
+                    ORDER BY COALESCE(downloaded_at, 'epoch') DESC, id DESC
+                    LIMIT %s
                 """
                 
                 # Count query
-                count_query = """
+                count_query = f"""
                     SELECT COUNT(*) as total
                     FROM websites 
-                    WHERE content ~* ('<a[^>]*href=["''][^"'']*' || %s || '[^"'']*["''][^>]*>')
+                    WHERE content ~* ({link_pattern})
                 """
                 
-                # Execute the search query
-                cursor.execute(query, (domain, domain, domain))
-                results = cursor.fetchall()
+                params = [domain, domain, domain]
+                if keyset:
+                    params.extend(keyset)
+                # One extra row tells us whether another page exists
+                params.append(page_size + 1)
+                
+                # Stream the search query through a server-side cursor
+                results = list(stream_rows(conn, query, params, max_rows=page_size + 1))
+                has_more = len(results) > page_size
+                results = results[:page_size]
                 
                 # Execute the count query
                 cursor.execute(count_query, (domain,))
@@ -301,8 +458,9 @@ class WebsiteAgent:
                 return {
                     "success": True,
                     "count": total_count,
-                    "results": list(results),
-                    "domain": domain
+                    "results": results,
+                    "domain": domain,
+                    "next_page_token": encode_page_token(results[-1]) if has_more and results else None
                 }
                 
         except Exception as e:
@@ -314,170 +472,158 @@ class WebsiteAgent:
                 "results": []
             }
 
-
 def detect_database_intent(query: str) -> Optional[Dict[str, Any]]:
     """
     Detect if a user query requires database access and extract relevant parameters
     Returns None if no database intent is detected, or a dict with intent details
+    (type, search_term for term-based intents, and a confidence score)
     """
-    # Patterns for different types of queries
-    patterns = {
-        "count_websites": r"(?:how\s+many|count|number\s+of)\s+(?:websites?|pages?|sites?)\s+(?:have|contain|include|about|mention|discuss)\s+(?:the\s+(?:word|term|keyword|phrase)\s+)?['\"]?([^'\"]+?)['\"]?",
-        "search_content": r"(?:find|search|show|list|get)\s+(?:websites?|pages?|sites?|content)\s+(?:that\s+)?(?:contain|include|have|about|mention|discuss|with)\s+(?:the\s+(?:word|term|keyword|phrase)\s+)?['\"]?([^'\"]+?)['\"]?",
-        "find_links": r"(?:find|show|list|get)\s+(?:websites?|pages?|sites?)\s+(?:that\s+)?(?:have|contain|include|with)\s+(?:links?\s+to|hrefs?\s+to|references?\s+to)\s+['\"]?([^'\"]+?)['\"]?",
-        "list_websites": r"(?:list|show|get)\s+(?:all\s+)?(?:websites?|domains?|sites?)",
-        "website_stats": r"(?:statistics|stats|info|information)\s+(?:about|on|for)\s+(?:the\s+)?(?:websites?|pages?|database)"
-    }
-    
-    # Check each pattern
-    for intent_type, pattern in patterns.items():
-        match = re.search(pattern, query.lower())
-        if match:
-            # For patterns that extract a search term
-            if intent_type in ["count_websites", "search_content", "find_links"]:
-                groups = [g for g in match.groups() if g]
-                if groups:
-                    search_term = groups[0].strip()
-                    return {
-                        "type": intent_type,
-                        "search_term": search_term
-                    }
-            # For patterns without extraction
-            elif intent_type in ["list_websites", "website_stats"]:
-                return {
-                    "type": intent_type
-                }
-    
-    return None
+    return intent_engine.detect(query)
 
 
-def execute_database_intent(intent: Dict) -> Any:
-    """Execute database queries using the websites table only"""
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
+def _build_intent_query(intent: Dict) -> Tuple[str, List]:
+    """Build the SQL query and parameters for a canonical database intent"""
+    # Build query based on intent type
+    query = ""
+    params = []
     
-    try:
-        # Get database connection
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            port=os.getenv('DB_PORT', 5432),
-            options=f"-c search_path={os.getenv('DB_NAME')}",
-        )
-        
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Log the intent for debugging
-        app_logger.info(f"Executing database intent: {intent}")
-        
-        # Build query based on intent type
-        query = ""
-        params = []
-        
-        if intent["type"] == "count_websites":
-            search_term = intent.get("search_term", "")
-            query = """
-                SELECT COUNT(*) as count
-                FROM websites 
-                WHERE content ILIKE %s
-            """
-            params = [f"%{search_term}%"]
-                
-        elif intent["type"] == "search_content":
-            search_term = intent.get("search_term", "")
-            query = """
-                SELECT 
-                    url, 
-                    domain,
-                    downloaded_at,
-                    -- Extract a snippet of text around the match
-                    substring(content, 
-                            greatest(1, position(lower(%s) in lower(content)) - 100), 
-                            300) AS context_snippet,
-                    -- Count occurrences
-                    (length(lower(content)) - length(replace(lower(content), lower(%s), ''))) / length(%s) AS occurrence_count
-                FROM websites 
-                WHERE content ILIKE %s
-                ORDER BY occurrence_count DESC, downloaded_at DESC
-                LIMIT 10
-            """
-            params = [search_term, search_term, search_term, f"%{search_term}%"]
-            
-        elif intent["type"] == "find_links":
-            link_pattern = intent.get("search_term", "")
-            query = """
-                SELECT 
-                    url, 
-                    domain,
-                    downloaded_at,
-                    -- Extract HTML snippets containing the links
-                    substring(content FROM '.*<a[^>]*href[^>]*' || %s || '[^>]*>.*') AS link_context
-                FROM websites 
-                WHERE content ~* ('<a[^>]*href[^>]*' || %s || '[^>]*>')
-                ORDER BY downloaded_at DESC
-                LIMIT 10
-            """
-            params = [link_pattern, link_pattern]
+    if intent["type"] == "count_websites":
+        search_term = intent.get("search_term", "")
+        query = """
+            SELECT COUNT(*) as count
+            FROM websites 
+            WHERE content ILIKE %s
+        """
+        params = [f"%{search_term}%"]
             
-        elif intent["type"] == "list_websites":
-            query = """
-                SELECT 
-                    domain,
-                    COUNT(*) as page_count,
-                    MAX(downloaded_at) as last_updated
-                FROM websites 
-                WHERE domain IS NOT NULL
-                GROUP BY domain
-                ORDER BY page_count DESC
-                LIMIT 20
-            """
-            
-        elif intent["type"] == "website_stats":
-            query = """
-                SELECT 
-                    COUNT(*) as total_websites,
-                    COUNT(DISTINCT domain) as unique_domains,
-                    AVG(length(content)) as avg_content_length,
-                    MAX(downloaded_at) as last_download
-                FROM websites
-            """
-            
-        else:
-            # Default fallback query
-            query = "SELECT COUNT(*) as total_records FROM websites"
+    elif intent["type"] == "search_content":
+        search_term = intent.get("search_term", "")
+        query = """
+            SELECT 
+                url, 
+                domain,
+                downloaded_at,
+                -- Extract a snippet of text around the match
+                substring(content, 
+                        greatest(1, position(lower(%s) in lower(content)) - 100), 
+                        300) AS context_snippet,
+                -- Count occurrences
+                (length(lower(content)) - length(replace(lower(content), lower(%s), ''))) / length(%s) AS occurrence_count
+            FROM websites 
+            WHERE content ILIKE %s
+            ORDER BY occurrence_count DESC, downloaded_at DESC
+            LIMIT 10
+        """
+        params = [search_term, search_term, search_term, f"%{search_term}%"]
         
-        # Log the actual SQL query for debugging
-        app_logger.info(f"Executing SQL query: {query}")
-        app_logger.info(f"Query parameters: {params}")
+    elif intent["type"] == "find_links":
+        link_pattern = intent.get("search_term", "")
+        query = """
+            SELECT 
+                url, 
+                domain,
+                downloaded_at,
+                -- Extract the first matching anchor tag (not the whole page)
+                substring(content FROM '<a[^>]*href[^>]*' || %s || '[^>]*>') AS link_context
+            FROM websites 
+            WHERE content ~* ('<a[^>]*href[^>]*' || %s || '[^>]*>')
+            ORDER BY downloaded_at DESC
+            LIMIT 10
+        """
+        params = [link_pattern, link_pattern]
         
-        # Execute query
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
+    elif intent["type"] == "list_websites":
+        query = """
+            SELECT 
+                domain,
+                COUNT(*) as page_count,
+                MAX(downloaded_at) as last_updated
+            FROM websites 
+            WHERE domain IS NOT NULL
+            GROUP BY domain
+            ORDER BY page_count DESC
+            LIMIT 20
+        """
         
-        # Fetch results
-        results = cursor.fetchall()
+    elif intent["type"] == "website_stats":
+        query = """
+            SELECT 
+                COUNT(*) as total_websites,
+                COUNT(DISTINCT domain) as unique_domains,
+                AVG(length(content)) as avg_content_length,
+                MAX(downloaded_at) as last_download
+            FROM websites
+        """
         
-        # Convert to list of dictionaries
-        result_list = []
-        for row in results:
-            if isinstance(row, dict):
-                result_list.append(dict(row))
-            else:
-                # Handle other row types
-                result_list.append(dict(row))
-        
-        cursor.close()
+    else:
+        # Default fallback query
+        query = "SELECT COUNT(*) as total_records FROM websites"
+    
+    return query, params
+
+
+def _intent_label(intent: Optional[Dict]) -> str:
+    """Canonical intent type used as a metrics label"""
+    return (canonical_intent(intent) or {}).get("type") or "unknown"
+
+
+def _connect_intent_db():
+    """Open a connection for intent queries against the websites schema"""
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        port=os.getenv('DB_PORT', 5432),
+        options=f"-c search_path={os.getenv('DB_NAME')}",
+    )
+
+
+def iter_database_intent(intent: Dict, max_rows: int = MAX_RESULT_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the rows for a database intent through a server-side cursor
+    
+    The connection is closed when the generator is exhausted or closed.
+    """
+    # Resolve aliases such as website_count so they don't fall through to the default query
+    intent = canonical_intent(intent) or {"type": None}
+    query, params = _build_intent_query(intent)
+    
+    # Full SQL and parameters are DEBUG-only (lazy %-formatting: nothing is built unless enabled)
+    app_logger.debug("Executing SQL query: %s", query)
+    app_logger.debug("Query parameters: %s", params)
+    
+    # The circuit only covers connecting: only connection-level errors count against it
+    # (a bad query proves the server is up), and its outcome mustn't depend on how long
+    # the consumer holds this generator open
+    with circuit_breakers["postgres"].protect(is_failure=is_connection_failure):
+        with tracer.start_as_current_span("db.connect"):
+            conn = _connect_intent_db()
+    try:
+        yield from stream_rows(conn, query, params, max_rows=max_rows)
+    finally:
         conn.close()
+
+
+@traced("execute_database_intent")
+@_instrumented("execute_database_intent", lambda intent, *args, **kwargs: _intent_label(intent))
+def execute_database_intent(intent: Dict, max_rows: int = MAX_RESULT_ROWS) -> Any:
+    """Execute database queries using the websites table only (at most max_rows rows)"""
+    try:
+        # Log the intent for debugging
+        app_logger.debug("Executing database intent: %s", intent)
+        
+        result_list = list(iter_database_intent(intent, max_rows=max_rows))
         
-        app_logger.info(f"Database query successful, returned {len(result_list)} rows")
-        app_logger.info(f"Sample result: {result_list[0] if result_list else 'No results'}")
+        app_logger.info("Database intent %s returned %d rows", _intent_label(intent), len(result_list))
+        if result_list:
+            app_logger.debug("Sample result: %s", result_list[0])
         
         return result_list
         
+    except CircuitOpenError as e:
+        app_logger.warning(f"Skipping database intent: {str(e)}")
+        return {"error": "The website database is temporarily unavailable"}
     except psycopg2.Error as e:
         app_logger.error(f"PostgreSQL error: {str(e)}")
         app_logger.error(f"Error code: {e.pgcode}")
@@ -490,105 +636,189 @@ def execute_database_intent(intent: Dict) -> Any:
         return {"error": f"Query execution failed: {str(e)}"}
 
 
+@traced("database_response")
+def database_response(intent: Dict, max_rows: int = MAX_RESULT_ROWS) -> Optional[str]:
+    """
+    Answer a database intent by streaming its rows straight into format_database_response
+    
+    Rows are formatted as they arrive and never collected into a list. Returns None when
+    nothing matched or the query failed, so the caller can fall back to the knowledge base.
+    """
+    canonical = canonical_intent(intent)
+    if not canonical:
+        return None
+    failures = []
+    
+    def _rows():
+        try:
+            yield from iter_database_intent(canonical, max_rows=max_rows)
+        except Exception as e:
+            failures.append(e)
+            raise
+    
+    rows = _rows()
+    try:
+        first_row = next(rows, None)
+        if first_row is None:
+            return None
+        # The formatter catches errors raised mid-stream; those answers are dropped below
+        response = format_database_response(canonical["type"], itertools.chain([first_row], rows))
+    except CircuitOpenError as e:
+        app_logger.warning(f"Skipping database intent: {str(e)}")
+        return None
+    except Exception as e:
+        app_logger.error(f"Database intent {_intent_label(canonical)} failed: {str(e)}")
+        return None
+    finally:
+        rows.close()
+    
+    if failures:
+        app_logger.error(f"Database intent {_intent_label(canonical)} failed: {str(failures[0])}")
+        return None
+    return response
+
+
+def query_cache_key(query: str) -> str:
+    """Cache key for intent detection, shared with the cache warmer"""
+    return cache_manager._generate_cache_key("intent_detection", normalize_query(query))
+
+
+def intent_cache_key(intent: Dict[str, Any]) -> Optional[str]:
+    """Cache key for a database intent's formatted response, shared with the cache warmer"""
+    canonical = canonical_intent(intent)
+    if not canonical:
+        return None
+    return cache_manager._generate_cache_key(
+        "database_response", canonical["type"], canonical.get("search_term", "")
+    )
+
+
+def cached_detect_database_intent(query: str) -> Optional[Dict[str, Any]]:
+    """detect_database_intent with results cached per normalized query"""
+    cache_key = query_cache_key(query)
+    
+    # Wrapped so a cached "no intent" is distinguishable from a cache miss
+    cached_entry = cache_manager.get("intent_detection", cache_key)
+    if cached_entry is not None:
+        return cached_entry.get("intent")
+    
+    intent = detect_database_intent(query)
+    cache_manager.set("intent_detection", cache_key, {"intent": intent})
+    return intent
+
+
+def cached_database_response(intent: Dict) -> Optional[str]:
+    """database_response with answers cached per canonical intent (misses and failures are not cached)"""
+    cache_key = intent_cache_key(intent)
+    if not cache_key:
+        return None
+    
+    cached_result = cache_manager.get("database_queries", cache_key)
+    if cached_result is not None:
+        return cached_result
+    
+    response = database_response(intent)
+    if response:
+        cache_manager.set("database_queries", cache_key, response)
+    return response
+
+
+@traced("format_database_response")
 def format_database_response(intent_type: str, db_result: Any) -> str:
-    """Format database results for display with better error handling"""
+    """
+    Format database results for display with better error handling
+    
+    db_result may be a list of rows or any row iterator (e.g. iter_database_intent);
+    rows are consumed once and the response is assembled from parts.
+    """
     
-    app_logger.info(f"Formatting database response for intent: {intent_type}")
-    app_logger.info(f"Database result type: {type(db_result)}")
+    app_logger.debug("Formatting database response for intent %s (result type %s)", intent_type, type(db_result).__name__)
     
     try:
         # Handle error results
         if isinstance(db_result, dict) and "error" in db_result:
             return f"I'm sorry, I encountered an error while searching the database: {db_result['error']}"
         
+        if isinstance(db_result, dict):
+            db_result = [db_result]
+        
+        # Peek at the first row so empty streams are detected without materializing them
+        rows = iter(db_result or [])
+        first_row = next(rows, None)
+        
         # Handle empty results
-        if not db_result or (isinstance(db_result, list) and len(db_result) == 0):
+        if first_row is None:
             return "No results found for your query."
         
+        rows = itertools.chain([first_row], rows)
+        
         # Format based on intent type
         if intent_type == "count_websites":
-            if isinstance(db_result, list) and len(db_result) > 0:
-                count = db_result[0].get('count', 0)
-                return f"I found {count} websites containing your search term."
-            else:
-                return "Unable to count websites from the results."
+            count = first_row.get('count', 0)
+            return f"I found {count} websites containing your search term."
                 
         elif intent_type == "search_content":
-            if isinstance(db_result, list):
-                if len(db_result) == 0:
-                    return "No content found matching your search terms."
-                
-                response = f"I found {len(db_result)} websites with relevant content:\n\n"
-                for i, result in enumerate(db_result, 1):
-                    url = result.get('url', 'No URL')
-                    domain = result.get('domain', 'Unknown domain')
-                    context = result.get('context_snippet', 'No context available')
-                    occurrences = result.get('occurrence_count', 0)
-                    
-                    # Clean up HTML from context snippet
-                    import re
-                    clean_context = re.sub(r'<[^>]+>', '', str(context))[:200] + "..."
-                    
-                    response += f"{i}. **{domain}**\n"
-                    response += f"   URL: {url}\n"
-                    response += f"   Occurrences: {occurrences}\n"
-                    response += f"   Context: {clean_context}\n\n"
-                
-                return response
-            else:
-                return "Search completed but results are in an unexpected format."
+            parts = []
+            total = 0
+            for i, result in enumerate(rows, 1):
+                total = i
+                url = result.get('url', 'No URL')
+                domain = result.get('domain', 'Unknown domain')
+                context = result.get('context_snippet', 'No context available')
+                occurrences = result.get('occurrence_count', 0)
+                
+                # Clean up HTML from context snippet
+                clean_context = _HTML_TAG_PATTERN.sub('', str(context))[:200] + "..."
+                
+                parts.append(
+                    f"{i}. **{domain}**\n"
+                    f"   URL: {url}\n"
+                    f"   Occurrences: {occurrences}\n"
+                    f"   Context: {clean_context}\n\n"
+                )
+            
+            return f"I found {total} websites with relevant content:\n\n" + "".join(parts)
                 
         elif intent_type == "find_links":
-            if isinstance(db_result, list):
-                if len(db_result) == 0:
-                    return "No pages found with the specified links."
-                
-                response = f"I found {len(db_result)} websites with matching links:\n\n"
-                for i, result in enumerate(db_result, 1):
-                    url = result.get('url', 'No URL')
-                    domain = result.get('domain', 'Unknown domain')
-                    response += f"{i}. **{domain}**\n   URL: {url}\n\n"
-                
-                return response
-            else:
-                return "Link search completed but results are in an unexpected format."
+            parts = []
+            total = 0
+            for i, result in enumerate(rows, 1):
+                total = i
+                url = result.get('url', 'No URL')
+                domain = result.get('domain', 'Unknown domain')
+                parts.append(f"{i}. **{domain}**\n   URL: {url}\n\n")
+            
+            return f"I found {total} websites with matching links:\n\n" + "".join(parts)
                 
         elif intent_type == "list_websites":
-            if isinstance(db_result, list):
-                if len(db_result) == 0:
-                    return "No websites found in the database."
-                
-                response = f"Here are the top {len(db_result)} websites by page count:\n\n"
-                for i, result in enumerate(db_result, 1):
-                    domain = result.get('domain', 'Unknown domain')
-                    page_count = result.get('page_count', 0)
-                    last_updated = result.get('last_updated', 'Unknown')
-                    response += f"{i}. **{domain}** - {page_count} pages (last updated: {last_updated})\n"
-                
-                return response
-            else:
-                return "Website listing completed but results are in an unexpected format."
+            parts = []
+            total = 0
+            for i, result in enumerate(rows, 1):
+                total = i
+                domain = result.get('domain', 'Unknown domain')
+                page_count = result.get('page_count', 0)
+                last_updated = result.get('last_updated', 'Unknown')
+                parts.append(f"{i}. **{domain}** - {page_count} pages (last updated: {last_updated})\n")
+            
+            return f"Here are the top {total} websites by page count:\n\n" + "".join(parts)
                 
         elif intent_type == "website_stats":
-            if isinstance(db_result, list) and len(db_result) > 0:
-                stats = db_result[0]
-                total = stats.get('total_websites', 0)
-                domains = stats.get('unique_domains', 0)
-                avg_length = stats.get('avg_content_length', 0)
-                last_download = stats.get('last_download', 'Unknown')
-                
-                response = f"Website Database Statistics:\n\n"
-                response += f"- Total websites: {total}\n"
-                response += f"- Unique domains: {domains}\n"
-                response += f"- Average content length: {avg_length:,.0f} characters\n"
-                response += f"- Last download: {last_download}\n"
-                
-                return response
-            else:
-                return "Unable to retrieve database statistics."
+            stats = first_row
+            total = stats.get('total_websites', 0)
+            domains = stats.get('unique_domains', 0)
+            avg_length = stats.get('avg_content_length', 0) or 0
+            last_download = stats.get('last_download', 'Unknown')
+            
+            response = f"Website Database Statistics:\n\n"
+            response += f"- Total websites: {total}\n"
+            response += f"- Unique domains: {domains}\n"
+            response += f"- Average content length: {float(avg_length):,.0f} characters\n"
+            response += f"- Last download: {last_download}\n"
+            
+            return response
         
         # Default formatting for unknown intent types
-        return f"Query completed successfully. Found {len(db_result) if isinstance(db_result, list) else 1} result(s)."
+        return f"Query completed successfully. Found {sum(1 for _ in rows)} result(s)."
         
     except Exception as e:
         app_logger.error(f"Error formatting database response: {str(e)}")
@@ -0,0 +1,458 @@
+"""
+Offline end-to-end benchmark
+
+Drives answer_query, answer_query_async, process_queries_batch, the chat
+turn pipeline (ChatOrchestrator.process_turn) and the WebsiteAgent methods
+against local stand-ins:
+
+- Bedrock: in-process fakes of the runtime / agent-runtime clients with
+  configurable latency (and a streaming invoke_model_with_response_stream)
+- Redis: fakeredis (``--redis fake``), a real local Redis (``--redis url``) or
+  the in-memory fallback (``--redis memory``)
+- Postgres: a dedicated benchmark database from BENCH_DB_* variables (the
+  app's DB_* settings are overridden, never used), optionally seeded with a
+  synthetic ``websites`` corpus (``--with-db --rows N --allow-drop``, local
+  hosts only, since seeding drops public.websites). The agent's SQL is
+  PostgreSQL-specific (ILIKE, server-side cursors, regexp_matches), so there is
+  no SQLite shim.
+
+Queries are drawn from a Zipf distribution over ``--unique-queries`` so cache
+hit rates look like real traffic. Results (throughput, p50/p90/p99, cache hit
+rates, memory) are printed as JSON; ``--compare`` checks them against a
+previous run and exits 1 on regression.
+
+Usage (from the directory that contains ``src``):
+
+    python -m src.benchmarks.e2e_benchmark --requests 500 --concurrency 1,8,32 --output bench.json
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Keep per-request INFO logging out of the measurements (and out of the JSON on stdout)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FILE", "")
+# Every run starts cold: no restored cache snapshot, and no query log left behind
+os.environ.setdefault("CACHE_SNAPSHOT_FILE", "")
+os.environ.setdefault("QUERY_LOG_FILE", "")
+
+_VOCABULARY = (
+    "oil gas climate energy wildfire drilling lease federal land water wildlife park "
+    "refuge mining permit renewable solar wind geothermal tribal grazing habitat "
+    "restoration science survey report policy regulation environmental protection"
+).split()
+_DOMAINS = [f"{name}.gov" for name in (
+    "doi", "usgs", "blm", "nps", "fws", "boem", "bsee", "usbr", "bia", "osmre", "onrr", "usa"
+)]
+_TOPICS = ["wildfires", "oil production", "renewable energy", "water rights", "grazing permits",
+           "endangered species", "offshore leasing", "mining reclamation", "national parks", "tribal lands"]
+
+class FakeBedrockAgentRuntime:
+    """Stand-in for the bedrock-agent-runtime client (retrieve only)"""
+
+    def __init__(self, latency: float = 0.15, jitter: float = 0.05, document_words: int = 180):
+        self.latency = latency
+        self.jitter = jitter
+        self.document_words = document_words
+        self.calls = 0
+
+    def retrieve(self, retrievalQuery: Dict[str, str], knowledgeBaseId: Optional[str] = None,
+                 retrievalConfiguration: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        self.calls += 1
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        count = (retrievalConfiguration or {}).get("vectorSearchConfiguration", {}).get("numberOfResults", 5)
+        rng = random.Random(retrievalQuery.get("text", ""))
+        results = []
+        for rank in range(count):
+            words = " ".join(rng.choice(_VOCABULARY) for _ in range(self.document_words))
+            results.append({
+                "content": {"text": f"Document {rank} about {retrievalQuery.get('text', '')}\n{words}"},
+                "location": {"type": "S3", "s3Location": {"uri": f"s3://benchmark/doc-{rng.randint(0, 10**6)}.txt"}},
+                "score": 1.0 - rank * 0.05,
+            })
+        return {"retrievalResults": results}
+
+class FakeBedrockRuntime:
+    """Stand-in for the bedrock-runtime client with latency proportional to output tokens"""
+
+    def __init__(self, first_token_latency: float = 0.4, per_token_latency: float = 0.002,
+                 output_tokens: int = 250, jitter: float = 0.1):
+        self.first_token_latency = first_token_latency
+        self.per_token_latency = per_token_latency
+        self.output_tokens = output_tokens
+        self.jitter = jitter
+        self.calls = 0
+
+    def _answer_tokens(self, body: str) -> List[str]:
+        rng = random.Random(body)
+        return [rng.choice(_VOCABULARY) + " " for _ in range(self.output_tokens)]
+
+    def invoke_model(self, modelId: str, body: str, contentType: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        self.calls += 1
+        tokens = self._answer_tokens(body)
+        delay = self.first_token_latency + self.per_token_latency * len(tokens)
+        time.sleep(max(delay + random.uniform(-self.jitter, self.jitter), 0))
+        payload = {"content": [{"type": "text", "text": "".join(tokens).strip()}],
+                   "usage": {"output_tokens": len(tokens)}}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        self.calls += 1
+        tokens = self._answer_tokens(body)
+
+        def _events():
+            time.sleep(self.first_token_latency)
+            for token in tokens:
+                time.sleep(self.per_token_latency)
+                delta = {"type": "content_block_delta", "delta": {"type": "text_delta", "text": token}}
+                yield {"chunk": {"bytes": json.dumps(delta).encode("utf-8")}}
+            yield {"chunk": {"bytes": json.dumps({"type": "message_stop"}).encode("utf-8")}}
+
+        return {"body": _events()}
+
+def zipf_queries(unique: int, total: int, skew: float = 1.1, seed: int = 7) -> List[str]:
+    """`total` queries drawn from `unique` distinct ones with Zipf-distributed popularity"""
+    rng = random.Random(seed)
+    pool = [f"What does the department say about {topic} in report {index}?"
+            for index, topic in zip(range(unique), _TOPICS * (unique // len(_TOPICS) + 1))]
+    weights = [1.0 / (rank ** skew) for rank in range(1, unique + 1)]
+    return rng.choices(pool, weights=weights, k=total)
+
+_BENCH_DB_DEFAULTS = {"HOST": "localhost", "PORT": "5432", "NAME": "doi_bench", "USER": "postgres", "PASSWORD": ""}
+_LOCAL_DB_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+def use_benchmark_database() -> Dict[str, str]:
+    """Point the app's DB_* settings at the BENCH_DB_* database (before any src import)"""
+    settings = {name: os.getenv(f"BENCH_DB_{name}", default) for name, default in _BENCH_DB_DEFAULTS.items()}
+    for name, value in settings.items():
+        os.environ[f"DB_{name}"] = value
+    # Replicas from the app's configuration would point reads elsewhere
+    os.environ["DB_REPLICA_HOSTS"] = ""
+    return settings
+
+def seed_websites(rows: int, seed: int = 7, allow_drop: bool = False) -> int:
+    """Create and fill a synthetic websites table in the benchmark database (drops public.websites)"""
+    host = os.getenv("BENCH_DB_HOST", _BENCH_DB_DEFAULTS["HOST"])
+    # An empty host or a socket path means a local Unix socket connection
+    if not allow_drop or not (host in _LOCAL_DB_HOSTS or not host or host.startswith("/")):
+        raise SystemExit(f"Refusing to drop and reseed public.websites on {host!r}: "
+                         f"seeding needs --allow-drop and a local BENCH_DB_HOST")
+
+    import psycopg2
+    from psycopg2.extras import execute_values
+    from src.connection_pool import ConnectionPoolManager
+
+    rng = random.Random(seed)
+    config = ConnectionPoolManager._db_config(host, int(os.getenv("BENCH_DB_PORT", _BENCH_DB_DEFAULTS["PORT"])))
+    conn = psycopg2.connect(**config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS public.websites CASCADE")
+            cursor.execute("""
+                CREATE TABLE public.websites (
+                    id SERIAL PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    content TEXT,
+                    downloaded_at TIMESTAMPTZ
+                )
+            """)
+            # The agent also reads discover_doi.websites and (for intents) <DB_NAME>.websites
+            for schema in {"discover_doi", config["database"]}:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+                cursor.execute(f'CREATE OR REPLACE VIEW "{schema}".websites AS SELECT * FROM public.websites')
+
+            batch = []
+            for index in range(rows):
+                domain = rng.choice(_DOMAINS)
+                words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(80, 400))]
+                for _ in range(rng.randint(0, 4)):
+                    target = rng.choice(_DOMAINS)
+                    words.insert(rng.randrange(len(words)), f'<a href="https://www.{target}/page{rng.randint(1, 999)}">{target}</a>')
+                batch.append((f"https://www.{domain}/page/{index}", domain, " ".join(words),
+                              f"2024-01-01T00:00:00Z"))
+                if len(batch) >= 1000:
+                    execute_values(cursor, "INSERT INTO public.websites (url, domain, content, downloaded_at) VALUES %s", batch)
+                    batch = []
+            if batch:
+                execute_values(cursor, "INSERT INTO public.websites (url, domain, content, downloaded_at) VALUES %s", batch)
+            cursor.execute("UPDATE public.websites SET downloaded_at = downloaded_at + (id || ' minutes')::interval")
+            cursor.execute("ANALYZE public.websites")
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+def install_fakes(args) -> Dict[str, Any]:
+    """Point the shared clients at the local stand-ins"""
+    from src.cache_manager import cache_manager
+    from src.connection_pool import connection_pool
+
+    agent_runtime = FakeBedrockAgentRuntime(latency=args.retrieve_latency)
+    runtime = FakeBedrockRuntime(first_token_latency=args.generate_latency,
+                                 per_token_latency=args.per_token_latency, output_tokens=args.output_tokens)
+    connection_pool._bedrock_agent_client = agent_runtime
+    connection_pool._bedrock_client = runtime
+
+    if args.redis == "fake":
+        try:
+            import fakeredis
+            import fakeredis.aioredis
+        except ImportError:
+            raise SystemExit("--redis fake requires the fakeredis package")
+        server = fakeredis.FakeServer()
+        cache_manager.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        cache_manager.async_redis_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    elif args.redis == "memory":
+        # Never connect: every operation goes to the in-process fallback cache
+        cache_manager._redis_connector.stop()
+        cache_manager.redis_client = None
+        cache_manager._redis_connect_wait = 0
+    # "url": leave CacheManager to connect to REDIS_URL as usual
+
+    return {"bedrock_runtime": runtime, "bedrock_agent_runtime": agent_runtime}
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def cache_counts() -> Dict[str, Dict[str, float]]:
+    from src.cache_manager import cache_requests
+    counts = {}
+    for labels, counter in cache_requests.children():
+        counts.setdefault(labels["cache_type"], {}).setdefault(labels["result"], 0.0)
+        counts[labels["cache_type"]][labels["result"]] += counter.get()
+    return counts
+
+def _hit_rates(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    rates = {}
+    for cache_type, results in after.items():
+        hits = results.get("hit", 0) - before.get(cache_type, {}).get("hit", 0)
+        misses = results.get("miss", 0) - before.get(cache_type, {}).get("miss", 0)
+        if hits + misses:
+            rates[cache_type] = round(hits / (hits + misses), 4)
+    return rates
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _is_error(result: Any) -> bool:
+    from src.query_engine import ERROR_RESPONSE_PREFIX, UNAVAILABLE_RESPONSE
+    if isinstance(result, tuple) and result and isinstance(result[0], str):
+        return result[0].startswith((ERROR_RESPONSE_PREFIX, UNAVAILABLE_RESPONSE))
+    if isinstance(result, dict) and isinstance(result.get("response"), str):
+        # ChatOrchestrator.process_turn
+        return result["response"].startswith((ERROR_RESPONSE_PREFIX, UNAVAILABLE_RESPONSE))
+    if isinstance(result, dict):
+        return result.get("success") is False or "error" in result
+    return False
+
+def _summarize(name: str, concurrency: int, latencies: List[float], errors: int, wall: float,
+               units: int, before_cache, started_tracemalloc: bool) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    memory = {"rss_mb": _rss_mb(), "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if started_tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        memory.update({"traced_current_mb": round(current / 1024 / 1024, 2), "traced_peak_mb": round(peak / 1024 / 1024, 2)})
+        tracemalloc.reset_peak()
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": units,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(units / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "cache_hit_rate": _hit_rates(before_cache, cache_counts()),
+        "memory": memory,
+    }
+
+def run_threaded(func: Callable, workload: Sequence[tuple], concurrency: int):
+    """Call func(*args) for each workload item on `concurrency` threads"""
+    def _timed(call_args):
+        start = time.perf_counter()
+        try:
+            result = func(*call_args)
+            return time.perf_counter() - start, _is_error(result)
+        except Exception:
+            return time.perf_counter() - start, True
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(_timed, workload))
+    return [latency for latency, _ in outcomes], sum(1 for _, error in outcomes if error), time.perf_counter() - start
+
+def run_async(func: Callable, workload: Sequence[tuple], concurrency: int):
+    """Await func(*args) for each workload item with at most `concurrency` in flight"""
+    async def _main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _timed(call_args):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await func(*call_args)
+                    return time.perf_counter() - start, _is_error(result)
+                except Exception:
+                    return time.perf_counter() - start, True
+
+        return await asyncio.gather(*(_timed(call_args) for call_args in workload))
+
+    start = time.perf_counter()
+    outcomes = asyncio.run(_main())
+    return [latency for latency, _ in outcomes], sum(1 for _, error in outcomes if error), time.perf_counter() - start
+
+def run_batches(queries: Sequence[str], batch_size: int):
+    """process_queries_batch over consecutive batches; latency is per batch"""
+    from src.query_engine import process_queries_batch
+
+    async def _main():
+        latencies, errors = [], 0
+        for offset in range(0, len(queries), batch_size):
+            batch = list(queries[offset:offset + batch_size])
+            start = time.perf_counter()
+            results = await process_queries_batch(batch)
+            latencies.append(time.perf_counter() - start)
+            errors += sum(1 for result in results if _is_error(result))
+        return latencies, errors
+
+    start = time.perf_counter()
+    latencies, errors = asyncio.run(_main())
+    return latencies, errors, time.perf_counter() - start
+
+def build_scenarios(args) -> List[tuple]:
+    """(name, runner(concurrency) -> (latencies, errors, wall, units))"""
+    from src.query_engine import answer_query, answer_query_async
+    from src.chat_orchestrator import chat_orchestrator
+
+    queries = zipf_queries(args.unique_queries, args.requests, seed=args.seed)
+    scenarios = [
+        ("answer_query", lambda c: (*run_threaded(answer_query, [(q,) for q in queries], c), len(queries))),
+        ("answer_query_async", lambda c: (*run_async(answer_query_async, [(q,) for q in queries], c), len(queries))),
+        ("process_queries_batch", lambda c: (*run_batches(queries, c), len(queries))),
+        ("chat_turn", lambda c: (*run_async(chat_orchestrator.process_turn, [(q,) for q in queries], c), len(queries))),
+    ]
+
+    if args.with_db:
+        from src.agent import WebsiteAgent
+        agent = WebsiteAgent()
+        rng = random.Random(args.seed)
+        terms = [(rng.choice(_VOCABULARY),) for _ in range(args.db_requests)]
+        domains = [(rng.choice(_DOMAINS),) for _ in range(args.db_requests)]
+        scenarios += [
+            ("website_agent.search_websites", lambda c: (*run_threaded(agent.search_websites, terms, c), len(terms))),
+            ("website_agent.get_stats", lambda c: (*run_threaded(agent.get_stats, [()] * args.db_requests, c), args.db_requests)),
+            ("website_agent.search_by_domain", lambda c: (*run_threaded(agent.search_by_domain, domains, c), len(domains))),
+            ("website_agent.search_by_link_domain", lambda c: (*run_threaded(agent.search_by_link_domain, domains, c), len(domains))),
+        ]
+
+    if args.scenario:
+        scenarios = [scenario for scenario in scenarios if scenario[0] in args.scenario]
+    return scenarios
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, max_regression: float) -> List[str]:
+    """Regressions of p99 latency or throughput beyond max_regression (a fraction) vs a baseline run"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["scenario"], result["concurrency"]))
+        if not previous:
+            continue
+        label = f"{result['scenario']}@{result['concurrency']}"
+        old_p99, new_p99 = previous["latency_ms"]["p99"], result["latency_ms"]["p99"]
+        if old_p99 and new_p99 > old_p99 * (1 + max_regression):
+            regressions.append(f"{label}: p99 {old_p99}ms -> {new_p99}ms")
+        old_rps, new_rps = previous["throughput_rps"], result["throughput_rps"]
+        if old_rps and new_rps < old_rps * (1 - max_regression):
+            regressions.append(f"{label}: throughput {old_rps} -> {new_rps} rps")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="Knowledge base queries per scenario")
+    parser.add_argument("--unique-queries", type=int, default=50)
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--scenario", action="append", help="Only run these scenarios (repeatable)")
+    parser.add_argument("--redis", choices=("fake", "memory", "url"), default="fake")
+    parser.add_argument("--retrieve-latency", type=float, default=0.15, help="Fake retrieve latency (s)")
+    parser.add_argument("--generate-latency", type=float, default=0.4, help="Fake time to first token (s)")
+    parser.add_argument("--per-token-latency", type=float, default=0.002)
+    parser.add_argument("--output-tokens", type=int, default=250)
+    parser.add_argument("--with-db", action="store_true", help="Benchmark WebsiteAgent against the BENCH_DB_* Postgres")
+    parser.add_argument("--rows", type=int, default=0, help="Seed this many synthetic websites rows first")
+    parser.add_argument("--allow-drop", action="store_true",
+                        help="Allow --rows to drop and recreate public.websites in the (local) benchmark database")
+    parser.add_argument("--db-requests", type=int, default=100)
+    parser.add_argument("--keep-cache", action="store_true", help="Don't clear the cache between runs")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc peaks (slower)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.with_db:
+        use_benchmark_database()
+        if args.rows:
+            seed_websites(args.rows, seed=args.seed, allow_drop=args.allow_drop)
+
+    fakes = install_fakes(args)
+    from src.cache_manager import cache_manager
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    results = []
+    for name, runner in build_scenarios(args):
+        for concurrency in [int(level) for level in args.concurrency.split(",") if level]:
+            if not args.keep_cache:
+                cache_manager.clear_all()
+            before = cache_counts()
+            latencies, errors, wall, units = runner(concurrency)
+            results.append(_summarize(name, concurrency, latencies, errors, wall, units, before, args.trace_memory))
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "bedrock_calls": {name: fake.calls for name, fake in fakes.items()},
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.compare:
+        report["regressions"] = compare(results, args.compare, args.max_regression)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Startup (import-time) benchmark
+
+Imports a module in a fresh interpreter under ``python -X importtime`` and checks
+the cumulative import time against a budget, so a change that reintroduces
+connect-at-import work fails loudly.
+
+Usage (from the directory that contains ``src``):
+
+    python -m src.benchmarks.startup_benchmark --module src.query_engine --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+def _parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse ``-X importtime`` lines: 'import time: self [us] | cumulative | imported package'"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|", 2)
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        try:
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        entries.append({
+            "module": name.strip(),
+            "self_ms": self_us / 1000.0,
+            "cumulative_ms": cumulative_us / 1000.0,
+        })
+    return entries
+
+def measure_import(module: str, runs: int = 3) -> Dict[str, Any]:
+    """Import `module` in `runs` fresh interpreters and report the best run"""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=dict(os.environ),
+        )
+        wall_ms = (time.perf_counter() - start) * 1000.0
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+        entries = _parse_importtime(completed.stderr)
+        target = next((e for e in reversed(entries) if e["module"] == module), None)
+        result = {
+            "module": module,
+            "wall_ms": round(wall_ms, 1),
+            "import_ms": round(target["cumulative_ms"], 1) if target else None,
+            "slowest_self": sorted(entries, key=lambda e: -e["self_ms"])[:10],
+        }
+        if best is None or (result["import_ms"] or wall_ms) < (best["import_ms"] or best["wall_ms"]):
+            best = result
+    return best
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time startup benchmark")
+    parser.add_argument("--module", action="append", default=None,
+                        help="Module to import (repeatable, default: src.query_engine and src.agent)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    modules = args.module or ["src.query_engine", "src.agent"]
+    results = [measure_import(module, runs=args.runs) for module in modules]
+    over_budget = [r for r in results if (r["import_ms"] or r["wall_ms"]) > args.budget_ms]
+
+    print(json.dumps({"budget_ms": args.budget_ms, "results": results,
+                      "passed": not over_budget}, indent=2))
+    return 1 if over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
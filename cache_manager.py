@@ -1,22 +1,175 @@
 import redis
 import redis.asyncio as aioredis
+import base64
 import json
 import pickle
 import hashlib
 import os
+import sqlite3
+import threading
+import atexit
 from typing import Any, Optional, Dict, List
 from functools import wraps
 import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from src.compression_dictionary import dictionary_registry
+from src.connection_pool import BackgroundConnector, CircuitOpenError, circuit_breakers, connection_pool
 from src.logging_config import app_logger
+from src.metrics import registry
+from src.tracing import traced
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are only merged safely with a single worker process
+    fcntl = None
+
+cache_requests = registry.counter("cache_requests_total", "Cache lookups by result", ["cache_type", "result"])
+cache_errors = registry.counter("cache_errors_total", "Cache operation errors", ["cache_type", "operation"])
+cache_circuit_fallbacks = registry.counter(
+    "cache_circuit_fallbacks_total", "Operations served by the memory fallback while the Redis circuit was open", ["cache_type"]
+)
+cache_operation_seconds = registry.histogram("cache_operation_seconds", "Cache get/set latency", ["cache_type", "operation"])
+cache_miss_compute_seconds = registry.histogram(
+    "cache_miss_compute_seconds", "Time to compute a value after a cache miss", ["cache_type"]
+)
+
+# Redis values compressed with a trained zstd dictionary: prefix + base64(zstd frame).
+# JSON never starts with this and pickle starts with \x80, so plain values are unaffected.
+_COMPRESSED_PREFIX = "zstd:"
+
+# Set by CacheManager.force_refresh(): the next lookup in this context reports a miss
+_force_refresh = contextvars.ContextVar("cache_force_refresh", default=None)
+
+def _timed(operation: str):
+    """Record a CacheManager method's latency, labelled by its cache_type argument"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(self, cache_type, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(self, cache_type, *args, **kwargs)
+                finally:
+                    cache_operation_seconds.labels(cache_type, operation).observe(time.perf_counter() - start)
+            return async_wrapper
+        
+        @wraps(func)
+        def wrapper(self, cache_type, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, cache_type, *args, **kwargs)
+            finally:
+                cache_operation_seconds.labels(cache_type, operation).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+class CacheSnapshot:
+    """
+    The in-memory fallback cache persisted as a SQLite file
+    
+    Each save writes a complete snapshot to a temporary file and renames it
+    over the previous one, so readers (including other workers sharing the
+    path) always see a consistent file. Workers sharing the path save under
+    an exclusive lock on <path>.lock and merge in the unexpired entries of the
+    previous snapshot, so one worker's save doesn't drop the others' entries.
+    Expiry times are stored as wall-clock timestamps, so restored entries keep
+    their remaining TTL.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    @contextmanager
+    def _exclusive(self):
+        """Serialize saves across processes sharing the snapshot path"""
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+    
+    def save(self, entries: Dict[str, Dict[str, Any]]) -> int:
+        """Write all unexpired entries merged with the previous snapshot; returns how many were written"""
+        now = time.time()
+        rows = []
+        for key, entry in entries.items():
+            expires = entry["expires"].timestamp()
+            if expires <= now:
+                continue
+            try:
+                rows.append((key, pickle.dumps(entry["data"], protocol=pickle.HIGHEST_PROTOCOL), expires))
+            except Exception as e:
+                app_logger.debug(f"Skipping unpicklable cache entry {key}: {str(e)}")
+        
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._exclusive():
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            conn = sqlite3.connect(temp_path)
+            try:
+                # Durability comes from the atomic rename, not the journal
+                conn.execute("PRAGMA journal_mode=OFF")
+                conn.execute("PRAGMA synchronous=OFF")
+                conn.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+                conn.executemany("INSERT INTO entries VALUES (?, ?, ?)", rows)
+                if os.path.exists(self.path):
+                    # Keep other workers' entries; ours win for keys both have
+                    conn.execute("ATTACH DATABASE ? AS previous", (self.path,))
+                    conn.execute("INSERT OR IGNORE INTO entries SELECT key, value, expires FROM previous.entries "
+                                 "WHERE expires > ?", (now,))
+                conn.commit()
+                written = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            finally:
+                conn.close()
+            os.replace(temp_path, self.path)
+        return written
+    
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Unexpired entries from the last snapshot (empty if there is none)"""
+        if not os.path.exists(self.path):
+            return {}
+        
+        entries = {}
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT key, value, expires FROM entries WHERE expires > ?", (time.time(),))
+            for key, value, expires in rows:
+                try:
+                    entries[key] = {"data": pickle.loads(value), "expires": datetime.fromtimestamp(expires)}
+                except Exception as e:
+                    app_logger.debug(f"Skipping unreadable snapshot entry {key}: {str(e)}")
+        finally:
+            conn.close()
+        return entries
 
 class CacheManager:    
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        self.redis_client = None
+        self._redis_client = None
         self.async_redis_client = None
+        self._async_redis_retry_at = 0.0
+        self._async_redis_retry_interval = float(os.getenv("REDIS_RETRY_INTERVAL_SECONDS", "30"))
+        # Redis connects in the background on first use; callers wait at most this long
+        self._redis_connect_wait = float(os.getenv("REDIS_LAZY_CONNECT_WAIT_SECONDS", "0.5"))
+        self._redis_connector = BackgroundConnector("redis", self._initialize_redis)
         self.fallback_cache = {}  # In-memory fallback
-        self.cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+        self._redis_breaker = circuit_breakers["redis"]
+        
+        # The fallback cache is snapshotted so restarted workers start warm;
+        # the snapshot is restored on first use of the fallback cache
+        snapshot_path = os.getenv("CACHE_SNAPSHOT_FILE", "cache_snapshot.db")
+        self._snapshot = CacheSnapshot(snapshot_path) if snapshot_path else None
+        self._snapshot_interval = float(os.getenv("CACHE_SNAPSHOT_INTERVAL_SECONDS", "60"))
+        self._snapshot_restored = False
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_stop = threading.Event()
+        self._memory_version = 0     # bumped on every fallback cache change
+        self._snapshot_version = 0   # version last written to the snapshot
+        connection_pool.register_health_probe("redis", self.ping)
+        # Values at least this long are compressed when a zstd dictionary is shipped ("0" disables)
+        self._compress_min_size = int(os.getenv("CACHE_COMPRESSION_MIN_SIZE", "256"))
         
         # Cache TTL settings (in seconds)
         self.ttl_settings = {
@@ -26,13 +179,29 @@ class CacheManager:
             "responses": 21600,         # 6 hours for formatted responses
             "stats": 1800,              # 30 minutes for stats
         }
-        
-        self._initialize_redis()
     
-    def _initialize_redis(self):
+    @property
+    def redis_client(self):
+        """Redis client, or None while unavailable (the in-memory fallback is used meanwhile)"""
+        if self._redis_client is None:
+            self._redis_connector.wait(self._redis_connect_wait)
+        return self._redis_client
+    
+    @redis_client.setter
+    def redis_client(self, client):
+        self._redis_client = client
+    
+    def ping(self) -> bool:
+        """PING Redis (used by the background health prober)"""
+        client = self.redis_client
+        if client is None:
+            raise ConnectionError("Redis not connected")
+        return bool(client.ping())
+    
+    def _initialize_redis(self) -> bool:
         """Initialize Redis connection with fallback to in-memory cache"""
         try:
-            self.redis_client = redis.from_url(
+            client = redis.from_url(
                 self.redis_url, 
                 decode_responses=True,
                 socket_connect_timeout=5,
@@ -41,15 +210,19 @@ class CacheManager:
                 health_check_interval=30
             )
             # Test connection
-            self.redis_client.ping()
+            client.ping()
+            self._redis_client = client
             app_logger.info("Redis cache initialized successfully")
+            return True
         except Exception as e:
             app_logger.warning(f"Redis not available, using in-memory fallback: {str(e)}")
-            self.redis_client = None
+            self._redis_client = None
+            return False
     
     async def _initialize_async_redis(self):
         """Initialize async Redis connection"""
-        if not self.async_redis_client:
+        # Don't pay the connect timeout on every call while Redis is down
+        if not self.async_redis_client and time.monotonic() >= self._async_redis_retry_at:
             try:
                 self.async_redis_client = await aioredis.from_url(
                     self.redis_url,
@@ -63,6 +236,7 @@ class CacheManager:
             except Exception as e:
                 app_logger.warning(f"Async Redis not available: {str(e)}")
                 self.async_redis_client = None
+                self._async_redis_retry_at = time.monotonic() + self._async_redis_retry_interval
     
     def _generate_cache_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate a consistent cache key from arguments"""
@@ -71,17 +245,46 @@ class CacheManager:
         # Hash to create a consistent key
         return f"doi_chat:{hashlib.md5(key_data.encode()).hexdigest()}"
     
-    def _serialize_data(self, data: Any) -> str:
-        """Serialize data for storage"""
+    @traced("cache.serialize")
+    def _serialize_data(self, data: Any, compress: bool = True) -> str:
+        """Serialize data for storage (dictionary-compressed when that makes it smaller)"""
         try:
             # Try JSON first (faster)
-            return json.dumps(data, default=str)
+            text = json.dumps(data, default=str)
+            raw = None
         except (TypeError, ValueError):
             # Fall back to pickle for complex objects
-            return pickle.dumps(data).decode('latin1')
+            raw = pickle.dumps(data)
+            text = raw.decode('latin1')
+        
+        if compress and self._compress_min_size and len(text) >= self._compress_min_size \
+                and dictionary_registry.active() is not None:
+            try:
+                frame = dictionary_registry.compress(raw if raw is not None else text.encode('utf-8'))
+                encoded = _COMPRESSED_PREFIX + base64.b64encode(frame).decode('ascii')
+                if len(encoded) < len(text):
+                    return encoded
+            except Exception as e:
+                app_logger.debug(f"Cache compression failed, storing uncompressed: {str(e)}")
+        return text
+    
+    @staticmethod
+    def _payload_bytes(data: str) -> bytes:
+        """The uncompressed serialized bytes of a stored value"""
+        if data.startswith(_COMPRESSED_PREFIX):
+            return dictionary_registry.decompress(base64.b64decode(data[len(_COMPRESSED_PREFIX):]))
+        if data.startswith("\x80"):
+            return data.encode('latin1')
+        return data.encode('utf-8')
     
+    @traced("cache.deserialize")
     def _deserialize_data(self, data: str) -> Any:
         """Deserialize data from storage"""
+        if data.startswith(_COMPRESSED_PREFIX):
+            # The frame header names the dictionary, so values from older dictionaries still decode
+            raw = self._payload_bytes(data)
+            return pickle.loads(raw) if raw[:1] == b"\x80" else json.loads(raw)
+        
         try:
             # Try JSON first
             return json.loads(data)
@@ -89,62 +292,204 @@ class CacheManager:
             # Fall back to pickle
             return pickle.loads(data.encode('latin1'))
     
+    def _restore_snapshot(self):
+        """Load the last snapshot into the fallback cache (once) and start periodic snapshots"""
+        with self._snapshot_lock:
+            if self._snapshot_restored:
+                return
+            self._snapshot_restored = True
+            if self._snapshot is None:
+                return
+            
+            try:
+                start = time.perf_counter()
+                restored = self._snapshot.load()
+                for key, entry in restored.items():
+                    self.fallback_cache.setdefault(key, entry)
+                if restored:
+                    app_logger.info(f"Restored {len(restored)} cache entries from {self._snapshot.path} "
+                                    f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+            except Exception as e:
+                app_logger.warning(f"Could not restore cache snapshot {self._snapshot.path}: {str(e)}")
+            
+            threading.Thread(target=self._snapshot_loop, name="cache-snapshot", daemon=True).start()
+            atexit.register(self.save_snapshot)
+    
+    def _snapshot_loop(self):
+        while not self._snapshot_stop.wait(self._snapshot_interval):
+            self.save_snapshot()
+    
+    def save_snapshot(self) -> bool:
+        """Write the fallback cache to the snapshot file if it changed since the last write"""
+        # Never overwrite a snapshot that hasn't been restored yet
+        if self._snapshot is None or not self._snapshot_restored:
+            return False
+        # The snapshot thread and atexit can both get here; only one writes at a time
+        with self._snapshot_lock:
+            version = self._memory_version
+            if version == self._snapshot_version:
+                return False
+            try:
+                written = self._snapshot.save(dict(self.fallback_cache))
+                self._snapshot_version = version
+                app_logger.debug(f"Saved {written} cache entries to {self._snapshot.path}")
+                return True
+            except Exception as e:
+                app_logger.warning(f"Could not save cache snapshot {self._snapshot.path}: {str(e)}")
+                return False
+    
+    def _memory_get(self, cache_type: str, cache_key: str, default=None) -> Any:
+        """Read from the in-memory fallback cache"""
+        if not self._snapshot_restored:
+            self._restore_snapshot()
+        entry = self.fallback_cache.get(cache_key)
+        if entry is not None:
+            if entry["expires"] > datetime.now():
+                cache_requests.labels(cache_type, "hit").inc()
+                return entry["data"]
+            self.fallback_cache.pop(cache_key, None)
+        
+        cache_requests.labels(cache_type, "miss").inc()
+        return default
+    
+    def _memory_set(self, cache_key: str, value: Any, ttl: int) -> bool:
+        """Write to the in-memory fallback cache"""
+        if not self._snapshot_restored:
+            self._restore_snapshot()
+        self._memory_version += 1
+        self.fallback_cache[cache_key] = {
+            "data": value,
+            "expires": datetime.now() + timedelta(seconds=ttl)
+        }
+        # Simple cleanup of expired entries
+        self._cleanup_memory_cache()
+        return True
+    
+    @staticmethod
+    @contextmanager
+    def force_refresh():
+        """
+        Treat the next lookup in this block as a miss
+        
+        Wrapping a cached call recomputes and rewrites its own entry while
+        nested lookups (e.g. the retrieval inside answer_query) still read
+        the cache. Used by the warmer to refresh entries before they expire.
+        """
+        token = _force_refresh.set([True])
+        try:
+            yield
+        finally:
+            _force_refresh.reset(token)
+    
+    @staticmethod
+    def _refresh_requested(cache_type: str) -> bool:
+        pending = _force_refresh.get()
+        if pending:
+            pending.clear()
+            cache_requests.labels(cache_type, "refresh").inc()
+            return True
+        return False
+    
+    def ttl_remaining(self, cache_type: str, key: str) -> Optional[float]:
+        """Seconds until an entry expires (inf if it never does), or None if it isn't cached"""
+        cache_key = f"{cache_type}:{key}"
+        
+        try:
+            if self.redis_client:
+                try:
+                    with self._redis_breaker.protect():
+                        ttl = self.redis_client.ttl(cache_key)
+                    # -2: no such key, -1: no expiry
+                    if ttl is None or ttl == -2:
+                        return None
+                    return float("inf") if ttl == -1 else float(ttl)
+                except CircuitOpenError:
+                    pass
+            
+            if not self._snapshot_restored:
+                self._restore_snapshot()
+            entry = self.fallback_cache.get(cache_key)
+            if entry is None:
+                return None
+            remaining = (entry["expires"] - datetime.now()).total_seconds()
+            return remaining if remaining > 0 else None
+            
+        except Exception as e:
+            app_logger.error(f"Cache ttl error: {str(e)}")
+            cache_errors.labels(cache_type, "ttl").inc()
+            return None
+    
+    @traced("cache.get")
+    @_timed("get")
     def get(self, cache_type: str, key: str, default=None) -> Any:
-        """Get item from cache"""
+        """
+        Get item from cache
+        
+        While the Redis circuit is open this serves from the in-memory fallback
+        instead of waiting on socket timeouts.
+        """
         cache_key = f"{cache_type}:{key}"
+        if self._refresh_requested(cache_type):
+            return default
         
         try:
             if self.redis_client:
-                result = self.redis_client.get(cache_key)
+                try:
+                    with self._redis_breaker.protect():
+                        result = self.redis_client.get(cache_key)
+                except CircuitOpenError:
+                    cache_circuit_fallbacks.labels(cache_type).inc()
+                    return self._memory_get(cache_type, cache_key, default)
+                
                 if result is not None:
-                    self.cache_stats["hits"] += 1
+                    cache_requests.labels(cache_type, "hit").inc()
                     return self._deserialize_data(result)
             else:
                 # Fallback to in-memory cache
-                if cache_key in self.fallback_cache:
-                    entry = self.fallback_cache[cache_key]
-                    if entry["expires"] > datetime.now():
-                        self.cache_stats["hits"] += 1
-                        return entry["data"]
-                    else:
-                        del self.fallback_cache[cache_key]
+                return self._memory_get(cache_type, cache_key, default)
             
-            self.cache_stats["misses"] += 1
+            cache_requests.labels(cache_type, "miss").inc()
             return default
             
         except Exception as e:
             app_logger.error(f"Cache get error: {str(e)}")
-            self.cache_stats["errors"] += 1
+            cache_errors.labels(cache_type, "get").inc()
             return default
     
+    @traced("cache.set")
+    @_timed("set")
     def set(self, cache_type: str, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Set item in cache"""
         cache_key = f"{cache_type}:{key}"
         ttl = ttl or self.ttl_settings.get(cache_type, 3600)
         
         try:
-            serialized_value = self._serialize_data(value)
-            
             if self.redis_client:
-                self.redis_client.setex(cache_key, ttl, serialized_value)
+                serialized_value = self._serialize_data(value)
+                try:
+                    with self._redis_breaker.protect():
+                        self.redis_client.setex(cache_key, ttl, serialized_value)
+                except CircuitOpenError:
+                    cache_circuit_fallbacks.labels(cache_type).inc()
+                    return self._memory_set(cache_key, value, ttl)
             else:
                 # Fallback to in-memory cache
-                self.fallback_cache[cache_key] = {
-                    "data": value,
-                    "expires": datetime.now() + timedelta(seconds=ttl)
-                }
-                # Simple cleanup of expired entries
-                self._cleanup_memory_cache()
+                self._memory_set(cache_key, value, ttl)
             
             return True
             
         except Exception as e:
             app_logger.error(f"Cache set error: {str(e)}")
-            self.cache_stats["errors"] += 1
+            cache_errors.labels(cache_type, "set").inc()
             return False
     
+    @traced("cache.get")
+    @_timed("get")
     async def get_async(self, cache_type: str, key: str, default=None) -> Any:
         """Async get item from cache"""
+        if self._refresh_requested(cache_type):
+            return default
+        
         if not self.async_redis_client:
             await self._initialize_async_redis()
         
@@ -152,19 +497,27 @@ class CacheManager:
         
         try:
             if self.async_redis_client:
-                result = await self.async_redis_client.get(cache_key)
+                try:
+                    with self._redis_breaker.protect():
+                        result = await self.async_redis_client.get(cache_key)
+                except CircuitOpenError:
+                    cache_circuit_fallbacks.labels(cache_type).inc()
+                    return self._memory_get(cache_type, cache_key, default)
+                
                 if result is not None:
-                    self.cache_stats["hits"] += 1
+                    cache_requests.labels(cache_type, "hit").inc()
                     return self._deserialize_data(result)
             
-            self.cache_stats["misses"] += 1
+            cache_requests.labels(cache_type, "miss").inc()
             return default
             
         except Exception as e:
             app_logger.error(f"Async cache get error: {str(e)}")
-            self.cache_stats["errors"] += 1
+            cache_errors.labels(cache_type, "get").inc()
             return default
     
+    @traced("cache.set")
+    @_timed("set")
     async def set_async(self, cache_type: str, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Async set item in cache"""
         if not self.async_redis_client:
@@ -176,14 +529,19 @@ class CacheManager:
         try:
             if self.async_redis_client:
                 serialized_value = self._serialize_data(value)
-                await self.async_redis_client.setex(cache_key, ttl, serialized_value)
+                try:
+                    with self._redis_breaker.protect():
+                        await self.async_redis_client.setex(cache_key, ttl, serialized_value)
+                except CircuitOpenError:
+                    cache_circuit_fallbacks.labels(cache_type).inc()
+                    return self._memory_set(cache_key, value, ttl)
                 return True
             
             return False
             
         except Exception as e:
             app_logger.error(f"Async cache set error: {str(e)}")
-            self.cache_stats["errors"] += 1
+            cache_errors.labels(cache_type, "set").inc()
             return False
     
     def invalidate_pattern(self, pattern: str) -> int:
@@ -198,6 +556,7 @@ class CacheManager:
                 keys_to_delete = [k for k in self.fallback_cache.keys() if pattern in k]
                 for key in keys_to_delete:
                     del self.fallback_cache[key]
+                self._memory_version += 1
                 return len(keys_to_delete)
             
             return 0
@@ -218,21 +577,33 @@ class CacheManager:
                 del self.fallback_cache[key]
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        total_requests = self.cache_stats["hits"] + self.cache_stats["misses"]
-        hit_rate = (self.cache_stats["hits"] / total_requests * 100) if total_requests > 0 else 0
+        """Get cache statistics (process lifetime totals from the metrics registry)"""
+        hits = int(cache_requests.total(result="hit"))
+        misses = int(cache_requests.total(result="miss"))
+        total_requests = hits + misses
+        hit_rate = (hits / total_requests * 100) if total_requests > 0 else 0
         
         stats = {
-            "hits": self.cache_stats["hits"],
-            "misses": self.cache_stats["misses"],
-            "errors": self.cache_stats["errors"],
+            "hits": hits,
+            "misses": misses,
+            "errors": int(cache_errors.total()),
             "hit_rate": f"{hit_rate:.1f}%",
-            "backend": "redis" if self.redis_client else "memory",
-            "total_requests": total_requests
+            "backend": "redis" if self._redis_client else "memory",
+            "total_requests": total_requests,
+            "circuit_state": self._redis_breaker.state,
+            "circuit_open_fallbacks": int(cache_circuit_fallbacks.total()),
+            "hit_rate_by_type": {
+                cache_type: f"{cache_requests.total(cache_type=cache_type, result='hit') / total * 100:.1f}%"
+                for cache_type, total in self._requests_by_type().items() if total
+            },
+            "latency_seconds": {
+                f"{labels['cache_type']}.{labels['operation']}": histogram.snapshot()
+                for labels, histogram in cache_operation_seconds.children()
+            }
         }
         
         # Add Redis-specific stats if available
-        if self.redis_client:
+        if self.redis_client and stats["circuit_state"] != "open":
             try:
                 redis_info = self.redis_client.info("memory")
                 stats["redis_memory_mb"] = round(redis_info.get("used_memory", 0) / 1024 / 1024, 2)
@@ -244,17 +615,28 @@ class CacheManager:
         
         return stats
     
+    @staticmethod
+    def _requests_by_type() -> Dict[str, float]:
+        totals = {}
+        for labels, counter in cache_requests.children():
+            if labels["result"] not in ("hit", "miss"):
+                continue
+            totals[labels["cache_type"]] = totals.get(labels["cache_type"], 0) + counter.get()
+        return totals
+    
     def clear_all(self) -> bool:
-        """Clear all cache entries"""
+        """Clear all cache entries (every "<cache_type>:" key this manager writes)"""
         try:
             if self.redis_client:
-                keys = self.redis_client.keys("doi_chat:*")
-                if keys:
-                    self.redis_client.delete(*keys)
-            else:
-                self.fallback_cache.clear()
+                for cache_type in self.ttl_settings:
+                    keys = list(self.redis_client.scan_iter(match=f"{cache_type}:*", count=1000))
+                    if keys:
+                        self.redis_client.delete(*keys)
+            # Entries written while Redis was unavailable or its circuit was open
+            self.fallback_cache.clear()
+            self._memory_version += 1
             
-            self.cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+            # Metrics are monotonic counters and are deliberately not reset here
             app_logger.info("Cache cleared successfully")
             return True
             
@@ -265,8 +647,8 @@ class CacheManager:
 # Global cache instance
 cache_manager = CacheManager()
 
-def cached(cache_type: str, ttl: Optional[int] = None, key_func=None):
-    """Decorator for caching function results"""
+def cached(cache_type: str, ttl: Optional[int] = None, key_func=None, cache_if=None):
+    """Decorator for caching function results (only those passing `cache_if`, if given)"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -282,15 +664,18 @@ def cached(cache_type: str, ttl: Optional[int] = None, key_func=None):
                 return result
             
             # Execute function and cache result
+            start = time.perf_counter()
             result = func(*args, **kwargs)
-            cache_manager.set(cache_type, cache_key, result, ttl)
+            cache_miss_compute_seconds.labels(cache_type).observe(time.perf_counter() - start)
+            if cache_if is None or cache_if(result):
+                cache_manager.set(cache_type, cache_key, result, ttl)
             return result
         
         return wrapper
     return decorator
 
-def async_cached(cache_type: str, ttl: Optional[int] = None, key_func=None):
-    """Decorator for caching async function results"""
+def async_cached(cache_type: str, ttl: Optional[int] = None, key_func=None, cache_if=None):
+    """Decorator for caching async function results (only those passing `cache_if`, if given)"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -306,8 +691,11 @@ def async_cached(cache_type: str, ttl: Optional[int] = None, key_func=None):
                 return result
             
             # Execute function and cache result
+            start = time.perf_counter()
             result = await func(*args, **kwargs)
-            await cache_manager.set_async(cache_type, cache_key, result, ttl)
+            cache_miss_compute_seconds.labels(cache_type).observe(time.perf_counter() - start)
+            if cache_if is None or cache_if(result):
+                await cache_manager.set_async(cache_type, cache_key, result, ttl)
             return result
         
         return wrapper
@@ -1,26 +1,166 @@
 import asyncio
+import heapq
+import itertools
+import threading
 import time
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-import json
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
 import os
-from src.cache_manager import cache_manager
-from src.query_engine import get_contexts, answer_query
-from src.agent import cached_detect_database_intent, cached_execute_database_intent, detect_database_intent, execute_database_intent
+from src.cache_manager import cache_manager, cache_miss_compute_seconds
+from src.connection_pool import CircuitBreaker
+from src.query_engine import get_contexts, contexts_cache_key, answer_query, answer_cache_key, bedrock_breaker, bedrock_in_flight
+from src.agent import cached_detect_database_intent, cached_database_response, query_cache_key, intent_cache_key
 from src.logging_config import app_logger
+from src.metrics import registry
+from src.query_log import DecayedTopK, QueryLogReader, query_log
+
+# Traffic-driven warming:
+#   WARMING_TOP_K               how many of the most frequent logged queries to warm
+#   WARMING_BEDROCK_BUDGET      Bedrock calls (retrieves + generations) the warmer may spend per budget window
+#   WARMING_BUDGET_WINDOW_SECONDS  window over which the budget refills
+#   WARMING_WARM_ANSWERS        also pre-generate answers, not just retrievals (costs one more call each)
+#   WARMING_DECAY_HALF_LIFE_HOURS  how quickly old traffic stops counting
+#   WARMING_TRACKED_QUERIES     distinct queries the frequency sketch keeps
+#   WARMING_CONCURRENCY         warm operations in flight at once
+#   WARMING_REFRESH_AHEAD_FRACTION  refresh an entry once less than this fraction of its TTL is left
+#   WARMING_MIN_INTERVAL_SECONDS    shortest sleep between scheduler passes
+#   BEDROCK_MAX_CONCURRENCY     concurrent Bedrock calls the account allows; warming backs off once live
+#                               traffic uses WARMING_SATURATION_THRESHOLD of it (or the circuit isn't closed)
+#   WARMING_MAX_BACKOFF_SECONDS longest a pass waits for Bedrock headroom before deferring to the next pass
+WARMING_TOP_K = int(os.getenv("WARMING_TOP_K", "20"))
+WARMING_BEDROCK_BUDGET = int(os.getenv("WARMING_BEDROCK_BUDGET", "20"))
+WARMING_BUDGET_WINDOW_SECONDS = float(os.getenv("WARMING_BUDGET_WINDOW_SECONDS", "3600"))
+WARMING_WARM_ANSWERS = os.getenv("WARMING_WARM_ANSWERS", "false").lower() == "true"
+WARMING_DECAY_HALF_LIFE_HOURS = float(os.getenv("WARMING_DECAY_HALF_LIFE_HOURS", "24"))
+WARMING_TRACKED_QUERIES = int(os.getenv("WARMING_TRACKED_QUERIES", "1000"))
+WARMING_CONCURRENCY = int(os.getenv("WARMING_CONCURRENCY", "2"))
+WARMING_REFRESH_AHEAD_FRACTION = float(os.getenv("WARMING_REFRESH_AHEAD_FRACTION", "0.1"))
+WARMING_MIN_INTERVAL_SECONDS = float(os.getenv("WARMING_MIN_INTERVAL_SECONDS", "60"))
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "10"))
+WARMING_SATURATION_THRESHOLD = float(os.getenv("WARMING_SATURATION_THRESHOLD", "0.7"))
+WARMING_MAX_BACKOFF_SECONDS = float(os.getenv("WARMING_MAX_BACKOFF_SECONDS", "60"))
+
+# Seconds to recompute an entry, until cache_miss_compute_seconds has enough observations
+DEFAULT_MISS_COST = {
+    "responses": 8.0,
+    "knowledge_base": 1.5,
+    "database_queries": 0.5,
+    "intent_detection": 0.01,
+}
+
+warming_sessions = registry.counter("cache_warming_sessions_total", "Cache warming sessions started")
+warming_items = registry.counter("cache_warming_items_total", "Cache entries filled by the warmer", ["cache_type"])
+warming_session_seconds = registry.histogram("cache_warming_session_seconds", "Duration of a warming session")
+warming_last_completed = registry.gauge("cache_warming_last_completed_timestamp", "Unix time the last warming session finished")
+warming_bedrock_calls = registry.counter("cache_warming_bedrock_calls_total", "Bedrock calls spent on warming", ["cache_type"])
+warming_deferred = registry.counter("cache_warming_deferred_total", "Warm items postponed to a later pass", ["reason"])
+
+def _replay(func, *args):
+    """Call func without the call being captured as user traffic"""
+    with query_log.suppressed():
+        return func(*args)
+
+def _refresh(func, *args):
+    """Recompute a cached call and overwrite its entry, even if it is still cached"""
+    with query_log.suppressed(), cache_manager.force_refresh():
+        return func(*args)
+
+def _miss_cost(cache_type: str) -> float:
+    """Average seconds to recompute an entry of this cache type"""
+    snapshot = cache_miss_compute_seconds.labels(cache_type).snapshot()
+    if snapshot["count"] >= 5:
+        return snapshot["avg"]
+    return DEFAULT_MISS_COST.get(cache_type, 1.0)
+
+class WarmItem:
+    """One cache entry the scheduler can fill or refresh"""
+    
+    def __init__(self, cache_type: str, key: str, func, args: Tuple, bedrock_calls: int, frequency: float):
+        self.cache_type = cache_type
+        self.key = key
+        self.func = func
+        self.args = args
+        self.bedrock_calls = bedrock_calls
+        self.frequency = frequency
+        self.ttl_remaining: Optional[float] = None
+    
+    @property
+    def refresh_ahead(self) -> float:
+        return WARMING_REFRESH_AHEAD_FRACTION * cache_manager.ttl_settings.get(self.cache_type, 3600)
+    
+    @property
+    def due(self) -> bool:
+        return self.ttl_remaining is None or self.ttl_remaining <= self.refresh_ahead
+    
+    @property
+    def priority(self) -> float:
+        """Expected benefit: hit frequency x miss cost / time to expiry (missing entries expire "now")"""
+        return self.frequency * _miss_cost(self.cache_type) / max(self.ttl_remaining or 0.0, 1.0)
+
+class BedrockBudget:
+    """Token bucket of Bedrock calls the warmer may spend, refilled evenly over a window"""
+    
+    def __init__(self, capacity: int, window_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / window_seconds if window_seconds > 0 else float("inf")
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+    
+    def try_spend(self, calls: int) -> bool:
+        with self._lock:
+            self._refill()
+            if calls > self._tokens:
+                return False
+            self._tokens -= calls
+            return True
 
 class CacheWarmer:
-    """Intelligent cache warming system to preload frequently accessed data"""
+    """
+    Traffic-driven cache warming
     
-    def __init__(self):
-        self.warming_stats = {
-            "sessions_started": 0,
-            "items_warmed": 0,
-            "total_time": 0,
-            "last_warming": None
-        }
+    Each pass ranks the most frequently asked queries (from the query log)
+    and the entries they depend on by expected benefit, then fills missing
+    entries and refreshes ones close to expiry, highest priority first,
+    within a concurrency cap and a Bedrock call budget. Passes back off while
+    live traffic is using most of the Bedrock capacity, and the scheduler
+    sleeps until the next entry is due rather than a fixed interval.
+    """
+    
+    def __init__(self, top_k: int = WARMING_TOP_K, bedrock_budget: int = WARMING_BEDROCK_BUDGET,
+                 warm_answers: bool = WARMING_WARM_ANSWERS, concurrency: int = WARMING_CONCURRENCY):
+        self.top_k = top_k
+        self.budget = BedrockBudget(bedrock_budget, WARMING_BUDGET_WINDOW_SECONDS)
+        self.warm_answers = warm_answers
+        self.concurrency = max(concurrency, 1)
+        
+        # Decayed frequencies of logged user queries, fed incrementally from the query log
+        self.query_tracker = DecayedTopK(WARMING_TRACKED_QUERIES, WARMING_DECAY_HALF_LIFE_HOURS * 3600)
+        self._query_reader = QueryLogReader(query_log.path)
+        
+        # Related queries from warm_user_query_pattern, picked up by the next pass
+        self._pending: Dict[str, float] = {}
+        self._pending_lock = threading.Lock()
         
-        # Common queries that should be pre-cached
+        # Set while the scheduler runs
+        self._scheduler_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopped = False
+        self._bedrock_warming = 0
+        self.last_pass: Dict[str, Any] = {}
+        
+        # Seed queries, used only until the query log has traffic
         self.common_queries = [
             "What are the main causes of wildfires?",
             "How does climate change affect oil production?",
@@ -33,134 +173,256 @@ class CacheWarmer:
             "Find pages about environmental protection"
         ]
         
-        # Common database intents to warm
+        # Common database intents to warm (same schema detect_database_intent produces)
         self.common_db_intents = [
             {"type": "website_stats"},
-            {"type": "website_count", "search_term": "oil"},
-            {"type": "website_count", "search_term": "climate"},
-            {"type": "website_count", "search_term": "energy"},
-            {"type": "domain_search", "search_term": "usgs.gov"},
-            {"type": "domain_search", "search_term": "doi.gov"}
+            {"type": "count_websites", "search_term": "oil"},
+            {"type": "count_websites", "search_term": "climate"},
+            {"type": "count_websites", "search_term": "energy"},
+            {"type": "search_content", "search_term": "usgs.gov"},
+            {"type": "search_content", "search_term": "doi.gov"}
         ]
     
-    async def warm_cache_startup(self):
-        """Warm cache during application startup"""
+    async def warm_cache_startup(self) -> float:
+        """Warm cache during application startup (one scheduler pass); returns seconds until the next entry is due"""
         start_time = time.time()
-        self.warming_stats["sessions_started"] += 1
+        warming_sessions.inc()
         
         app_logger.info("Starting cache warming process...")
         
         try:
-            # Warm knowledge base queries
-            await self._warm_knowledge_base_cache()
-            
-            # Warm database intent detection
-            await self._warm_database_intent_cache()
-            
-            # Warm database queries
-            await self._warm_database_query_cache()
+            next_due = await self.run_pass()
             
             total_time = time.time() - start_time
-            self.warming_stats["total_time"] += total_time
-            self.warming_stats["last_warming"] = datetime.now().isoformat()
+            warming_session_seconds.observe(total_time)
+            warming_last_completed.set(time.time())
             
             app_logger.info(f"Cache warming completed in {total_time:.2f}s. "
-                          f"Warmed {self.warming_stats['items_warmed']} items.")
+                          f"Warmed {self.last_pass.get('warmed', 0)} items, "
+                          f"{self.last_pass.get('bedrock_calls', 0)} Bedrock calls.")
+            return next_due
             
         except Exception as e:
             app_logger.error(f"Error during cache warming: {str(e)}")
+            return WARMING_MIN_INTERVAL_SECONDS
+    
+    def refresh_query_patterns(self) -> int:
+        """Feed queries appended to the query log since the last call into the frequency tracker"""
+        added = 0
+        try:
+            for timestamp, normalized, raw in self._query_reader.read_new():
+                self.query_tracker.add(normalized, timestamp, raw)
+                added += 1
+        except OSError as e:
+            app_logger.warning(f"Failed to read query log {self._query_reader.path}: {str(e)}")
+        if added:
+            app_logger.info(f"Loaded {added} queries from the query log ({len(self.query_tracker)} tracked)")
+        return added
+    
+    def top_queries(self, n: Optional[int] = None) -> List[str]:
+        """Queries most likely to be asked next, falling back to the seed list without traffic"""
+        return [query for query, _ in self._ranked_queries(n)]
+    
+    def _ranked_queries(self, n: Optional[int] = None) -> List[Tuple[str, float]]:
+        n = n or self.top_k
+        ranked = [(entry["query"], entry["score"]) for entry in self.query_tracker.top(n)]
+        return ranked or [(query, 1.0) for query in self.common_queries[:n]]
+    
+    def _collect_items(self) -> List[WarmItem]:
+        """Every entry worth keeping warm, with its current time to expiry (blocking cache lookups)"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        
+        queries: Dict[str, float] = {}
+        for query, frequency in self._ranked_queries() + list(pending.items()):
+            queries[query] = max(frequency, queries.get(query, 0.0))
+        
+        items: Dict[Tuple[str, str], WarmItem] = {}
+        
+        def add(item: WarmItem):
+            existing = items.get((item.cache_type, item.key))
+            if existing is None or existing.frequency < item.frequency:
+                items[(item.cache_type, item.key)] = item
+        
+        for query, frequency in queries.items():
+            add(WarmItem("intent_detection", query_cache_key(query), cached_detect_database_intent, (query,), 0, frequency))
+            
+            # Database questions are answered from Postgres, not Bedrock
+            intent = _replay(cached_detect_database_intent, query)
+            if intent:
+                cache_key = intent_cache_key(intent)
+                if cache_key:
+                    add(WarmItem("database_queries", cache_key, cached_database_response, (intent,), 0, frequency))
+                continue
+            
+            # Same keys the @cached decorators build for get_contexts(query) / answer_query(query)
+            add(WarmItem("knowledge_base", contexts_cache_key(query),
+                         get_contexts, (query,), 1, frequency))
+            if self.warm_answers:
+                add(WarmItem("responses", answer_cache_key(query),
+                             answer_query, (query,), 1, frequency))
+        
+        # Seed intents count as one recent ask each
+        for intent in self.common_db_intents:
+            cache_key = intent_cache_key(intent)
+            if cache_key:
+                add(WarmItem("database_queries", cache_key, cached_database_response, (intent,), 0, 1.0))
+        
+        for item in items.values():
+            item.ttl_remaining = cache_manager.ttl_remaining(item.cache_type, item.key)
+        
+        # An answer computed without a cached retrieval also fills the retrieval:
+        # charge it for both and drop the separate retrieval item
+        for item in list(items.values()):
+            if item.cache_type != "responses":
+                continue
+            contexts_key = ("knowledge_base", contexts_cache_key(*item.args))
+            contexts = items.get(contexts_key)
+            if contexts is not None and contexts.ttl_remaining is None and item.due:
+                item.bedrock_calls += 1
+                del items[contexts_key]
+        
+        return list(items.values())
+    
+    def _bedrock_saturated(self) -> bool:
+        """Live traffic is using most of the Bedrock capacity, or Bedrock is failing"""
+        if bedrock_breaker.state != CircuitBreaker.CLOSED:
+            return True
+        live = bedrock_in_flight.total() - self._bedrock_warming
+        return live >= WARMING_SATURATION_THRESHOLD * BEDROCK_MAX_CONCURRENCY
     
-    async def _warm_knowledge_base_cache(self):
-        """Warm knowledge base query cache"""
-        app_logger.info("Warming knowledge base cache...")
+    async def _wait_for_bedrock_headroom(self) -> bool:
+        """Exponential backoff while saturated; False if there was no headroom within the max backoff"""
+        delay, waited = 1.0, 0.0
+        while self._bedrock_saturated():
+            if waited >= WARMING_MAX_BACKOFF_SECONDS:
+                return False
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = min(delay * 2, WARMING_MAX_BACKOFF_SECONDS)
+        return True
+    
+    async def run_pass(self) -> float:
+        """
+        Fill and refresh due entries in priority order
+        
+        :return: Seconds until the next entry that was skipped as fresh is due
+        """
+        self.refresh_query_patterns()
+        loop = asyncio.get_event_loop()
+        items = await loop.run_in_executor(None, self._collect_items)
         
+        sequence = itertools.count()
+        queue = [(-item.priority, next(sequence), item) for item in items if item.due]
+        heapq.heapify(queue)
+        
+        summary = {"candidates": len(items), "due": len(queue), "warmed": 0, "failed": 0,
+                   "bedrock_calls": 0, "over_budget": 0, "saturated": 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
         tasks = []
-        for query in self.common_queries[:5]:  # Limit to avoid overloading
-            if not query.startswith("How many") and not query.startswith("Show me"):
-                tasks.append(self._warm_knowledge_query(query))
+        bedrock_available = True
+        
+        while queue:
+            _, _, item = heapq.heappop(queue)
+            if item.bedrock_calls:
+                if bedrock_available:
+                    bedrock_available = await self._wait_for_bedrock_headroom()
+                if not bedrock_available:
+                    summary["saturated"] += 1
+                    warming_deferred.labels("saturated").inc()
+                    continue
+                # Lower-priority items may still be cheap enough, so keep going
+                if not self.budget.try_spend(item.bedrock_calls):
+                    summary["over_budget"] += 1
+                    warming_deferred.labels("budget").inc()
+                    continue
+            
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(self._warm_item(item, semaphore, summary)))
         
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Sleep until the earliest fresh entry enters its refresh window
+        fresh = [item.ttl_remaining - item.refresh_ahead for item in items
+                 if not item.due and item.ttl_remaining != float("inf")]
+        next_due = max(min(fresh), 0.0) if fresh else float("inf")
+        summary["next_due_seconds"] = next_due
+        self.last_pass = summary
+        app_logger.info(f"Warming pass: {summary}")
+        return next_due
     
-    async def _warm_knowledge_query(self, query: str):
-        """Warm a single knowledge base query"""
+    async def _warm_item(self, item: WarmItem, semaphore: asyncio.Semaphore, summary: Dict[str, Any]):
+        """Recompute one entry on the default executor"""
+        if item.bedrock_calls:
+            self._bedrock_warming += 1
         try:
-            # Check if already cached
-            cache_key = cache_manager._generate_cache_key("get_contexts", query, None, 5)
-            cached_result = cache_manager.get("knowledge_base", cache_key)
-            
-            if cached_result is None:
-                # Not cached, so warm it
-                await asyncio.get_event_loop().run_in_executor(
-                    None, get_contexts, query
-                )
-                self.warming_stats["items_warmed"] += 1
-                app_logger.debug(f"Warmed knowledge base query: {query[:30]}...")
-            else:
-                app_logger.debug(f"Knowledge base query already cached: {query[:30]}...")
-                
+            await asyncio.get_event_loop().run_in_executor(None, _refresh, item.func, *item.args)
+            warming_items.labels(item.cache_type).inc()
+            summary["warmed"] += 1
+            if item.bedrock_calls:
+                warming_bedrock_calls.labels(item.cache_type).inc(item.bedrock_calls)
+                summary["bedrock_calls"] += item.bedrock_calls
+            app_logger.debug(f"Warmed {item.cache_type} entry for {str(item.args[0])[:30]}...")
         except Exception as e:
-            app_logger.warning(f"Failed to warm knowledge query '{query[:30]}...': {str(e)}")
+            summary["failed"] += 1
+            app_logger.warning(f"Failed to warm {item.cache_type} entry for {str(item.args[0])[:30]}...: {str(e)}")
+        finally:
+            if item.bedrock_calls:
+                self._bedrock_warming -= 1
+            semaphore.release()
     
-    async def _warm_database_intent_cache(self):
-        """Warm database intent detection cache"""
-        app_logger.info("Warming database intent cache...")
-        
-        for query in self.common_queries:
+    async def _run_scheduler(self, max_interval: float, next_due: float):
+        self._scheduler_loop = asyncio.get_event_loop()
+        self._wakeup = asyncio.Event()
+        while not self._stopped:
+            delay = min(max(next_due, WARMING_MIN_INTERVAL_SECONDS), max_interval)
             try:
-                # Check if already cached
-                cache_key = cache_manager._generate_cache_key("detect_database_intent", query)
-                cached_result = cache_manager.get("intent_detection", cache_key)
-                
-                if cached_result is None:
-                    # Not cached, so warm it
-                    await asyncio.get_event_loop().run_in_executor(
-                        None, detect_database_intent, query
-                    )
-                    self.warming_stats["items_warmed"] += 1
-                    app_logger.debug(f"Warmed intent detection: {query[:30]}...")
-                    
-            except Exception as e:
-                app_logger.warning(f"Failed to warm intent detection '{query[:30]}...': {str(e)}")
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            next_due = await self.warm_cache_startup()
+        self._scheduler_loop = None
     
-    async def _warm_database_query_cache(self):
-        """Warm database query cache"""
-        app_logger.info("Warming database query cache...")
+    def schedule_periodic_warming(self, interval_hours: int = 6, first_pass_in: float = 0.0):
+        """
+        Keep the cache warm in the background
         
-        for intent in self.common_db_intents:
-            try:
-                # Check if already cached
-                cache_key = cache_manager._generate_cache_key("execute_database_intent", intent)
-                cached_result = cache_manager.get("database_queries", cache_key)
-                
-                if cached_result is None:
-                    # Not cached, so warm it
-                    await asyncio.get_event_loop().run_in_executor(
-                        None, execute_database_intent, intent
-                    )
-                    self.warming_stats["items_warmed"] += 1
-                    app_logger.debug(f"Warmed database query: {intent}")
-                    
-            except Exception as e:
-                app_logger.warning(f"Failed to warm database query {intent}: {str(e)}")
-    
-    def schedule_periodic_warming(self, interval_hours: int = 6):
-        """Schedule periodic cache warming"""
-        async def periodic_warmer():
-            while True:
-                try:
-                    await asyncio.sleep(interval_hours * 3600)  # Convert hours to seconds
-                    app_logger.info("Starting scheduled cache warming...")
-                    await self.warm_cache_startup()
-                except Exception as e:
-                    app_logger.error(f"Error in periodic cache warming: {str(e)}")
+        Runs on the current event loop if there is one, otherwise on a
+        daemon thread. Each pass sleeps until the next entry is due for
+        refresh, but never longer than interval_hours.
         
-        # Start the periodic warming task
-        asyncio.create_task(periodic_warmer())
-        app_logger.info(f"Scheduled periodic cache warming every {interval_hours} hours")
+        :param interval_hours: Longest sleep between passes
+        :param first_pass_in: Seconds until the first pass (e.g. what warm_cache_startup returned)
+        """
+        self._stopped = False
+        scheduler = self._run_scheduler(interval_hours * 3600, first_pass_in)
+        try:
+            asyncio.get_running_loop().create_task(scheduler)
+        except RuntimeError:
+            threading.Thread(target=asyncio.run, args=(scheduler,), name="cache-warmer", daemon=True).start()
+        app_logger.info(f"Scheduled cache warming (refresh-ahead, at least every {interval_hours} hours)")
+    
+    def stop_scheduler(self):
+        self._stopped = True
+        self._wake()
+    
+    def _wake(self):
+        """Start the next scheduler pass now (safe from any thread)"""
+        loop, wakeup = self._scheduler_loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            loop.call_soon_threadsafe(wakeup.set)
     
     def warm_user_query_pattern(self, query: str):
-        """Warm cache based on user query patterns"""
+        """
+        Queue queries related to a user query for warming
+        
+        Safe to call from sync code: the queries are handed to the scheduler
+        (woken if it is running), or wait for the next warming pass.
+        """
         try:
             # Extract keywords from the query
             keywords = self._extract_keywords(query)
@@ -168,8 +430,10 @@ class CacheWarmer:
             # Generate related queries to warm
             related_queries = self._generate_related_queries(keywords)
             
-            # Warm related queries in background
-            asyncio.create_task(self._warm_related_queries(related_queries))
+            with self._pending_lock:
+                for related in related_queries:
+                    self._pending[related] = max(self._pending.get(related, 0.0), 1.0)
+            self._wake()
             
         except Exception as e:
             app_logger.warning(f"Failed to warm related queries for '{query}': {str(e)}")
@@ -200,63 +464,53 @@ class CacheWarmer:
             
         return related_queries[:3]  # Limit to avoid overloading
     
-    async def _warm_related_queries(self, queries: List[str]):
-        """Warm related queries in background"""
-        for query in queries:
-            try:
-                # Detect intent and warm if needed
-                intent = detect_database_intent(query)
-                if intent:
-                    cache_key = cache_manager._generate_cache_key("execute_database_intent", intent)
-                    cached_result = cache_manager.get("database_queries", cache_key)
-                    
-                    if cached_result is None:
-                        await asyncio.get_event_loop().run_in_executor(
-                            None, execute_database_intent, intent
-                        )
-                        app_logger.debug(f"Warmed related query: {query[:30]}...")
-                        
-            except Exception as e:
-                app_logger.debug(f"Failed to warm related query '{query}': {str(e)}")
+    @property
+    def warming_stats(self) -> Dict[str, Any]:
+        """Lifetime warming counters (from the metrics registry)"""
+        durations = warming_session_seconds.labels().snapshot()
+        last_completed = warming_last_completed.labels().get()
+        return {
+            "sessions_started": int(warming_sessions.total()),
+            "items_warmed": int(warming_items.total()),
+            "total_time": durations["sum"],
+            "last_warming": datetime.fromtimestamp(last_completed).isoformat() if last_completed else None
+        }
     
     def get_warming_stats(self) -> Dict[str, Any]:
         """Get cache warming statistics"""
+        stats = self.warming_stats
         return {
-            **self.warming_stats,
+            **stats,
             "avg_warming_time": (
-                self.warming_stats["total_time"] / 
-                max(self.warming_stats["sessions_started"], 1)
+                stats["total_time"] / 
+                max(stats["sessions_started"], 1)
             ),
+            "session_seconds": warming_session_seconds.labels().snapshot(),
+            "bedrock_calls": int(warming_bedrock_calls.total()),
+            "bedrock_budget_available": round(self.budget.available, 1),
+            "deferred": {labels["reason"]: int(counter.get()) for labels, counter in warming_deferred.children()},
+            "last_pass": self.last_pass,
+            "tracked_queries": len(self.query_tracker),
+            "top_queries": self.query_tracker.top(5),
             "cache_stats": cache_manager.get_stats()
         }
     
     def load_query_patterns_from_logs(self, log_file: Optional[str] = None) -> List[str]:
-        """Load common query patterns from application logs"""
-        if not log_file or not os.path.exists(log_file):
-            return []
+        """
+        Most frequent queries from the query log
         
-        queries = []
-        try:
-            with open(log_file, 'r') as f:
-                lines = f.readlines()
-                
-            # Extract queries from log lines (simplified pattern matching)
-            for line in lines[-1000:]:  # Last 1000 lines
-                if "Query processed" in line or "query:" in line.lower():
-                    # Extract query from log line (this would need customization based on log format)
-                    # This is a simplified example
-                    parts = line.split("query:")
-                    if len(parts) > 1:
-                        query = parts[1].strip().split()[0]  # First word after query:
-                        if len(query) > 10:  # Filter out very short queries
-                            queries.append(query)
-            
-            # Return unique queries, most recent first
-            return list(dict.fromkeys(queries))[:20]
-            
-        except Exception as e:
-            app_logger.warning(f"Failed to load query patterns from logs: {str(e)}")
-            return []
+        Reads only what was appended since the last call (tail-reading, not
+        the whole file) and ranks by decayed frequency.
+        
+        :param log_file: Query log to read instead of the configured one
+        :return: Up to top_k queries, most likely to be asked next first
+        """
+        if log_file and log_file != self._query_reader.path:
+            self._query_reader = QueryLogReader(log_file)
+            self.query_tracker.clear()
+        
+        self.refresh_query_patterns()
+        return [entry["query"] for entry in self.query_tracker.top(self.top_k)]
 
 # Global cache warmer instance
 cache_warmer = CacheWarmer()
@@ -264,11 +518,11 @@ cache_warmer = CacheWarmer()
 async def initialize_cache_warming():
     """Initialize cache warming on application startup"""
     try:
-        await cache_warmer.warm_cache_startup()
+        next_due = await cache_warmer.warm_cache_startup()
         
-        # Schedule periodic warming if in production
+        # Keep refreshing ahead of expiry if in production
         if os.getenv("ENVIRONMENT", "development") == "production":
-            cache_warmer.schedule_periodic_warming(interval_hours=6)
+            cache_warmer.schedule_periodic_warming(interval_hours=6, first_pass_in=next_due)
             
     except Exception as e:
         app_logger.error(f"Failed to initialize cache warming: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,152 @@
+import asyncio
+import concurrent.futures
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+from src.agent import cached_detect_database_intent, cached_database_response
+from src.cache_manager import cache_manager
+from src.connection_pool import CircuitOpenError
+from src.query_log import query_log
+from src.query_engine import (
+    get_contexts, generate_answer_async, answer_cache_key, is_cacheable_answer,
+    ERROR_RESPONSE_PREFIX, UNAVAILABLE_RESPONSE,
+)
+from src.tracing import traced, with_current_context
+from src.logging_config import app_logger
+
+# How long the database branch may run before the turn falls back to the knowledge base
+DB_BRANCH_TIMEOUT = float(os.getenv("ORCHESTRATOR_DB_TIMEOUT", "10"))
+ORCHESTRATOR_WORKERS = int(os.getenv("ORCHESTRATOR_WORKERS", "16"))
+
+class ChatOrchestrator:
+    """Runs knowledge base retrieval, intent detection and database queries speculatively in parallel"""
+
+    def __init__(self, db_timeout: float = DB_BRANCH_TIMEOUT, max_workers: int = ORCHESTRATOR_WORKERS):
+        self.db_timeout = db_timeout
+        # Dedicated pool so branches outlive the event loop of a single turn
+        # (asyncio.run would otherwise block on the default executor at shutdown)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chat-orchestrator"
+        )
+        # Losing branches keep running so their results still land in the cache
+        self._background_tasks: Set[asyncio.Future] = set()
+
+    def _detach(self, task: asyncio.Future, name: str):
+        """Let a losing branch finish in the background instead of awaiting it"""
+        if task.done():
+            return
+        self._background_tasks.add(task)
+
+        def _on_done(finished: asyncio.Future):
+            self._background_tasks.discard(finished)
+            if not finished.cancelled() and finished.exception():
+                app_logger.debug(f"Background {name} branch failed: {str(finished.exception())}")
+
+        task.add_done_callback(_on_done)
+
+    @staticmethod
+    def _db_result_usable(db_result: Any) -> bool:
+        """A database branch wins only if it produced an answer (it returns None for no rows or errors)"""
+        return isinstance(db_result, str) and bool(db_result)
+
+    @traced("chat_turn")
+    async def process_turn(self, query: str, conversation_history: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """
+        Answer a chat turn, racing the database and knowledge base paths
+
+        :param query: The user's question
+        :param conversation_history: List of previous {role, content} message pairs
+        :return: dict with response, references, source, intent and per-stage timings
+        """
+        start_time = time.time()
+        loop = asyncio.get_event_loop()
+        timings = {}
+        query_log.record(query)
+
+        # Start the knowledge base retrieve and intent detection at the same time
+        # Branches run in worker threads; carry the trace context into them
+        kb_task = loop.run_in_executor(self._executor, with_current_context(get_contexts), query)
+        intent_task = loop.run_in_executor(self._executor, with_current_context(cached_detect_database_intent), query)
+
+        intent = None
+        try:
+            intent = await intent_task
+        except Exception as e:
+            app_logger.warning(f"Intent detection failed, using knowledge base: {str(e)}")
+        timings["intent_detection"] = time.time() - start_time
+
+        if intent:
+            db_start = time.time()
+            db_task = loop.run_in_executor(self._executor, with_current_context(cached_database_response), intent)
+            try:
+                db_result = await asyncio.wait_for(asyncio.shield(db_task), timeout=self.db_timeout)
+                timings["database"] = time.time() - db_start
+
+                if self._db_result_usable(db_result):
+                    # Database path wins; the knowledge base retrieve keeps filling the cache
+                    self._detach(kb_task, "knowledge_base")
+                    timings["total"] = time.time() - start_time
+                    app_logger.info(f"Chat turn answered from database in {timings['total']:.2f}s")
+                    return {
+                        "response": db_result,
+                        "references": [],
+                        "source": "database",
+                        "intent": intent,
+                        "timings": timings,
+                    }
+                app_logger.info("Database branch returned no usable rows, falling back to knowledge base")
+
+            except asyncio.TimeoutError:
+                timings["database"] = time.time() - db_start
+                app_logger.warning(f"Database branch exceeded {self.db_timeout}s, falling back to knowledge base")
+                self._detach(db_task, "database")
+            except Exception as e:
+                app_logger.error(f"Database branch failed: {str(e)}")
+
+        # Knowledge base path wins; answers share the responses cache with answer_query
+        answer_key = answer_cache_key(query, conversation_history)
+        try:
+            cached_answer = await cache_manager.get_async("responses", answer_key)
+            if cached_answer is not None:
+                self._detach(kb_task, "knowledge_base")
+                response_text, references = cached_answer
+            else:
+                retrieved_contexts = await kb_task
+                timings["retrieval"] = time.time() - start_time
+
+                generation_start = time.time()
+                response_text, references = await generate_answer_async(query, retrieved_contexts, conversation_history)
+                timings["generation"] = time.time() - generation_start
+
+                if is_cacheable_answer((response_text, references)):
+                    await cache_manager.set_async("responses", answer_key, (response_text, references))
+
+        except CircuitOpenError as e:
+            app_logger.warning(f"Knowledge base branch rejected: {str(e)}")
+            response_text = UNAVAILABLE_RESPONSE
+            references = []
+        except Exception as e:
+            app_logger.error(f"Error in knowledge base branch: {str(e)}")
+            response_text = f"{ERROR_RESPONSE_PREFIX} processing your request: {str(e)}"
+            references = []
+
+        timings["total"] = time.time() - start_time
+        app_logger.info(f"Chat turn answered from knowledge base in {timings['total']:.2f}s")
+        return {
+            "response": response_text,
+            "references": references,
+            "source": "knowledge_base",
+            "intent": intent,
+            "timings": timings,
+        }
+
+    def process_turn_sync(self, query: str, conversation_history: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Synchronous entry point for callers without a running event loop (e.g. Streamlit)"""
+        return asyncio.run(self.process_turn(query, conversation_history))
+
+    def shutdown(self):
+        """Stop accepting work and let in-flight branches finish"""
+        self._executor.shutdown(wait=False)
+
+# Global orchestrator instance
+chat_orchestrator = ChatOrchestrator()
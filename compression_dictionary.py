@@ -0,0 +1,226 @@
+"""
+Trained zstd dictionaries for small, repetitive payloads
+
+Chat answers and cached contexts are mostly sub-2KB documents sharing a lot
+of boilerplate, which plain zstd/brotli can't exploit at that size. A
+dictionary trained on sampled cache payloads can.
+
+Dictionaries are versioned files (dictionaries/zstd-v<N>.dict) shipped with
+the code. Every dictionary carries its own ID (32768 + N, outside the range
+zstd reserves), which zstd writes into each frame header; decompression
+looks the ID up, so values written with an older dictionary stay readable as
+long as its file is kept.
+
+Training (offline, against a populated Redis):
+
+    python -m src.compression_dictionary train --samples 5000 --size 16384
+    python -m src.compression_dictionary evaluate
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import threading
+from typing import Dict, List, Optional
+import zstandard as zstd
+from src.logging_config import app_logger
+
+ZSTD_DICTIONARY_DIR = os.getenv("ZSTD_DICTIONARY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries"))
+# Pin the dictionary new values are written with ("" = newest available, "0" = none)
+ZSTD_DICTIONARY_VERSION = os.getenv("ZSTD_DICTIONARY_VERSION", "")
+ZSTD_DICTIONARY_LEVEL = int(os.getenv("ZSTD_DICTIONARY_LEVEL", "3"))
+
+# zstd reserves dictionary IDs below 32768 for a public registry
+DICTIONARY_ID_BASE = 32768
+_FILENAME_PATTERN = re.compile(r"zstd-v(\d+)\.dict$")
+
+class DictionaryRegistry:
+    """Loads the shipped dictionaries and compresses/decompresses with them"""
+
+    def __init__(self, directory: str = ZSTD_DICTIONARY_DIR, pinned_version: str = ZSTD_DICTIONARY_VERSION):
+        self.directory = directory
+        self.pinned_version = pinned_version
+        self._dictionaries: Dict[int, zstd.ZstdCompressionDict] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        # Compressor/decompressor contexts aren't thread-safe; keep one per thread
+        self._local = threading.local()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            for path in sorted(glob.glob(os.path.join(self.directory, "zstd-v*.dict"))):
+                try:
+                    with open(path, "rb") as f:
+                        dictionary = zstd.ZstdCompressionDict(f.read())
+                    self._dictionaries[dictionary.dict_id()] = dictionary
+                except (OSError, zstd.ZstdError) as e:
+                    app_logger.warning(f"Could not load zstd dictionary {path}: {str(e)}")
+            if self._dictionaries:
+                app_logger.info(f"Loaded zstd dictionaries {sorted(self._dictionaries)} from {self.directory}")
+            self._loaded = True
+
+    def reload(self):
+        with self._lock:
+            self._dictionaries = {}
+            self._loaded = False
+            self._local = threading.local()
+        self._load()
+
+    def get(self, dict_id: int) -> Optional[zstd.ZstdCompressionDict]:
+        if not self._loaded:
+            self._load()
+        return self._dictionaries.get(dict_id)
+
+    def active(self) -> Optional[zstd.ZstdCompressionDict]:
+        """Dictionary new values are compressed with"""
+        if not self._loaded:
+            self._load()
+        if self.pinned_version:
+            version = int(self.pinned_version)
+            return self._dictionaries.get(DICTIONARY_ID_BASE + version) if version else None
+        return self._dictionaries[max(self._dictionaries)] if self._dictionaries else None
+
+    def versions(self) -> List[int]:
+        if not self._loaded:
+            self._load()
+        return sorted(dict_id - DICTIONARY_ID_BASE for dict_id in self._dictionaries)
+
+    def _contexts(self, kind: str) -> dict:
+        contexts = getattr(self._local, kind, None)
+        if contexts is None:
+            contexts = {}
+            setattr(self._local, kind, contexts)
+        return contexts
+
+    def compressor(self, level: int = ZSTD_DICTIONARY_LEVEL) -> zstd.ZstdCompressor:
+        """This thread's compressor for the active dictionary (plain zstd if there is none)"""
+        dictionary = self.active()
+        dict_id = dictionary.dict_id() if dictionary else 0
+        contexts = self._contexts("compressors")
+        compressor = contexts.get((level, dict_id))
+        if compressor is None:
+            compressor = contexts[(level, dict_id)] = zstd.ZstdCompressor(
+                level=level, dict_data=dictionary, write_dict_id=True
+            )
+        return compressor
+
+    def compress(self, data: bytes, level: int = ZSTD_DICTIONARY_LEVEL) -> bytes:
+        return self.compressor(level).compress(data)
+
+    def decompress(self, frame: bytes) -> bytes:
+        """Decompress a frame with whichever dictionary its header names"""
+        dict_id = zstd.get_frame_parameters(frame).dict_id
+        dictionary = None
+        if dict_id:
+            dictionary = self.get(dict_id)
+            if dictionary is None:
+                raise ValueError(f"zstd dictionary {dict_id} (v{dict_id - DICTIONARY_ID_BASE}) is not available")
+        contexts = self._contexts("decompressors")
+        decompressor = contexts.get(dict_id)
+        if decompressor is None:
+            decompressor = contexts[dict_id] = zstd.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(frame)
+
+    def save(self, dictionary: zstd.ZstdCompressionDict) -> str:
+        """Write a trained dictionary under its version's filename"""
+        os.makedirs(self.directory, exist_ok=True)
+        version = dictionary.dict_id() - DICTIONARY_ID_BASE
+        path = os.path.join(self.directory, f"zstd-v{version}.dict")
+        with open(path, "wb") as f:
+            f.write(dictionary.as_bytes())
+        return path
+
+    def next_version(self) -> int:
+        versions = [int(match.group(1)) for match in
+                    (_FILENAME_PATTERN.search(path) for path in glob.glob(os.path.join(self.directory, "zstd-v*.dict")))
+                    if match]
+        return max(versions, default=0) + 1
+
+# Global dictionary registry
+dictionary_registry = DictionaryRegistry()
+
+def train_dictionary(samples: List[bytes], version: int, dict_size: int = 16 * 1024) -> zstd.ZstdCompressionDict:
+    """Train a dictionary for `version` from sample payloads"""
+    if len(samples) < 10:
+        raise ValueError(f"Need at least 10 samples to train a dictionary, got {len(samples)}")
+    return zstd.train_dictionary(dict_size, samples, dict_id=DICTIONARY_ID_BASE + version, level=ZSTD_DICTIONARY_LEVEL)
+
+def sample_cache_payloads(limit: int = 5000, max_size: int = 64 * 1024) -> List[bytes]:
+    """Uncompressed payloads of cached values (Redis, then the in-memory fallback)"""
+    from src.cache_manager import cache_manager
+
+    samples = []
+    client = cache_manager.redis_client
+    if client is not None:
+        for key in client.scan_iter(match="*doi_chat:*", count=500):
+            value = client.get(key)
+            if value is None:
+                continue
+            payload = cache_manager._payload_bytes(value)
+            if payload and len(payload) <= max_size:
+                samples.append(payload)
+            if len(samples) >= limit:
+                return samples
+
+    for entry in list(cache_manager.fallback_cache.values()):
+        payload = cache_manager._payload_bytes(cache_manager._serialize_data(entry["data"], compress=False))
+        if payload and len(payload) <= max_size:
+            samples.append(payload)
+        if len(samples) >= limit:
+            break
+    return samples
+
+def evaluate(samples: List[bytes], dictionary: Optional[zstd.ZstdCompressionDict],
+             level: int = ZSTD_DICTIONARY_LEVEL, small_size: int = 2048) -> Dict[str, float]:
+    """Compression ratios (original / compressed) with and without the dictionary"""
+    plain = zstd.ZstdCompressor(level=level)
+    trained = zstd.ZstdCompressor(level=level, dict_data=dictionary) if dictionary else plain
+    result = {}
+    for label, subset in (("all", samples), (f"under_{small_size}_bytes", [s for s in samples if len(s) < small_size])):
+        original = sum(len(s) for s in subset)
+        if not original:
+            continue
+        result[f"{label}_samples"] = len(subset)
+        result[f"{label}_plain_ratio"] = round(original / sum(len(plain.compress(s)) for s in subset), 2)
+        result[f"{label}_dictionary_ratio"] = round(original / sum(len(trained.compress(s)) for s in subset), 2)
+    return result
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train and evaluate zstd dictionaries from cached payloads")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    train_parser = subcommands.add_parser("train", help="Train the next dictionary version")
+    train_parser.add_argument("--samples", type=int, default=5000)
+    train_parser.add_argument("--size", type=int, default=16 * 1024, help="Dictionary size in bytes")
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of samples kept for evaluation")
+    evaluate_parser = subcommands.add_parser("evaluate", help="Evaluate the active dictionary on current payloads")
+    evaluate_parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    samples = sample_cache_payloads(args.samples)
+    if args.command == "evaluate":
+        report = {"version": dictionary_registry.versions()[-1:] or None,
+                  **evaluate(samples, dictionary_registry.active())}
+        print(json.dumps(report, indent=2))
+        return 0
+
+    split = int(len(samples) * (1 - args.holdout))
+    training, holdout = samples[:split], samples[split:]
+    version = dictionary_registry.next_version()
+    try:
+        dictionary = train_dictionary(training, version, args.size)
+    except (ValueError, zstd.ZstdError) as e:
+        print(f"Training failed: {str(e)}", file=sys.stderr)
+        return 1
+
+    path = dictionary_registry.save(dictionary)
+    report = {"version": version, "path": path, "training_samples": len(training),
+              **evaluate(holdout or training, dictionary)}
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
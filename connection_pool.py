@@ -1,58 +1,822 @@
 import boto3
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
 import psycopg2
 from psycopg2 import pool
+from psycopg2 import extensions
 import os
+import random
 import threading
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from contextlib import contextmanager
 import time
 from src.logging_config import app_logger
+from src.metrics import registry
+from src.tracing import traced
+
+# Checkout wait buckets in seconds
+DEFAULT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+class BackgroundConnector:
+    """
+    Runs a connect callable on a daemon thread, retrying with exponential backoff
+    
+    Nothing happens until start() or wait() is first called, so constructing the
+    owner at import time is free. Callers wait at most once for the first attempt;
+    while a dependency stays down later callers fail fast and retries continue
+    in the background.
+    """
+    
+    def __init__(self, name: str, connect: Callable[[], bool],
+                 initial_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.name = name
+        self._connect = connect
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._thread = None
+        self._attempted = threading.Event()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+    
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+    
+    def start(self):
+        """Start the connect loop if it isn't running or finished"""
+        with self._lock:
+            if self._connected.is_set() or self._stop.is_set():
+                return
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-connector", daemon=True)
+            self._thread.start()
+    
+    def wait(self, timeout: float) -> bool:
+        """Start if needed and wait up to timeout for the first attempt; returns connected state"""
+        if not self._connected.is_set():
+            self.start()
+            self._attempted.wait(timeout)
+        return self._connected.is_set()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        backoff = self.initial_backoff
+        while not self._stop.is_set():
+            try:
+                connected = bool(self._connect())
+            except Exception as e:
+                app_logger.warning(f"{self.name} connect attempt failed: {str(e)}")
+                connected = False
+            
+            if connected:
+                self._connected.set()
+                self._attempted.set()
+                return
+            
+            self._attempted.set()
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, self.max_backoff)
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its dependency's circuit is open"""
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker over a rolling time window
+    
+    The window is split into buckets of call, failure and slow-call counts so
+    recording and checking are O(1). The circuit opens when, with at least
+    `min_calls` in the window, the failure rate or slow-call rate crosses its
+    threshold. After `open_seconds` a limited number of trial calls are let
+    through (half-open); if they succeed the circuit closes, otherwise it reopens.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5, slow_call_threshold: float = 1.0,
+                 slow_call_rate_threshold: float = 0.8, min_calls: int = 10, window_seconds: float = 30.0,
+                 window_buckets: int = 10, open_seconds: float = 15.0, half_open_max_calls: int = 3):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._bucket_seconds = window_seconds / window_buckets
+        self._buckets = [[0, 0, 0, -1] for _ in range(window_buckets)]  # calls, failures, slow, epoch
+        self._lock = threading.Lock()
+        self._state_gauge = registry.gauge(
+            "circuit_breaker_state", "Circuit state: 0 closed, 1 half-open, 2 open", ["dependency"]
+        ).labels(dependency=name)
+        self._set_state(self.CLOSED)
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self._counters = {"rejected": 0, "opened": 0, "successes": 0, "failures": 0}
+        self._last_failure: Optional[str] = None
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+    
+    def _set_state(self, state: str):
+        self._state = state
+        self._state_gauge.set(self._STATE_VALUES[state])
+    
+    def _maybe_half_open(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._set_state(self.HALF_OPEN)
+            self._half_open_in_flight = 0
+            self._half_open_successes = 0
+    
+    def _bucket(self, now: float) -> List[int]:
+        epoch = int(now / self._bucket_seconds)
+        bucket = self._buckets[epoch % len(self._buckets)]
+        if bucket[3] != epoch:
+            bucket[0] = bucket[1] = bucket[2] = 0
+            bucket[3] = epoch
+        return bucket
+    
+    def _window_totals(self, now: float) -> Tuple[int, int, int]:
+        oldest = int(now / self._bucket_seconds) - len(self._buckets) + 1
+        calls = failures = slow = 0
+        for bucket_calls, bucket_failures, bucket_slow, epoch in self._buckets:
+            if epoch >= oldest:
+                calls += bucket_calls
+                failures += bucket_failures
+                slow += bucket_slow
+        return calls, failures, slow
+    
+    def _open(self, now: float):
+        self._set_state(self.OPEN)
+        self._opened_at = now
+        self._counters["opened"] += 1
+        for bucket in self._buckets:
+            bucket[0] = bucket[1] = bucket[2] = 0
+    
+    def allow_request(self) -> bool:
+        """Whether a call may proceed; every allowed call must be followed by a record_* call"""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+    
+    def release(self):
+        """Give back an allowed call without recording an outcome (e.g. it was cancelled)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(self._half_open_in_flight - 1, 0)
+    
+    def record_success(self, latency: float = 0.0):
+        self._record(False, latency)
+    
+    def record_failure(self, latency: float = 0.0, error: Optional[BaseException] = None):
+        if error is not None:
+            self._last_failure = str(error)
+        self._record(True, latency)
+    
+    def _record(self, failed: bool, latency: float):
+        with self._lock:
+            now = time.monotonic()
+            self._counters["failures" if failed else "successes"] += 1
+            
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(self._half_open_in_flight - 1, 0)
+                if failed:
+                    self._open(now)
+                    app_logger.warning(f"Circuit '{self.name}' trial call failed - reopening")
+                else:
+                    self._half_open_successes += 1
+                    if self._half_open_successes >= self.half_open_max_calls:
+                        self._set_state(self.CLOSED)
+                        app_logger.info(f"Circuit '{self.name}' closed")
+                return
+            
+            if self._state == self.OPEN:
+                # A call that started before the circuit opened
+                return
+            
+            bucket = self._bucket(now)
+            bucket[0] += 1
+            if failed:
+                bucket[1] += 1
+            if latency >= self.slow_call_threshold:
+                bucket[2] += 1
+            
+            calls, failures, slow = self._window_totals(now)
+            if calls >= self.min_calls and (
+                failures / calls >= self.failure_rate_threshold
+                or slow / calls >= self.slow_call_rate_threshold
+            ):
+                self._open(now)
+                app_logger.warning(f"Circuit '{self.name}' opened: {failures}/{calls} failed, "
+                                   f"{slow}/{calls} slow in window")
+    
+    @contextmanager
+    def protect(self, is_failure: Optional[Callable[[BaseException], bool]] = None):
+        """
+        Guard a block of code; raises CircuitOpenError without running it when open
+        
+        Exceptions count as failures unless is_failure says otherwise (e.g. SQL
+        syntax errors prove the database is reachable). Cancellation and other
+        BaseExceptions aren't recorded at all.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                self.release()
+            elif is_failure is None or is_failure(e):
+                self.record_failure(time.monotonic() - start, e)
+            else:
+                self.record_success(time.monotonic() - start)
+            raise
+        else:
+            self.record_success(time.monotonic() - start)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            calls, failures, slow = self._window_totals(time.monotonic())
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failures": failures,
+                "window_slow_calls": slow,
+                "last_failure": self._last_failure,
+                **self._counters,
+            }
+
+def _breaker_from_env(name: str, **defaults) -> CircuitBreaker:
+    """Build a breaker whose settings can be overridden with CB_<NAME>_<SETTING> env vars"""
+    settings = dict(defaults)
+    for setting, default in defaults.items():
+        value = os.getenv(f"CB_{name.upper()}_{setting.upper()}")
+        if value is not None:
+            settings[setting] = type(default)(value)
+    return CircuitBreaker(name, **settings)
+
+# One breaker per external dependency, shared by every component that calls it
+circuit_breakers: Dict[str, CircuitBreaker] = {
+    "redis": _breaker_from_env("redis", slow_call_threshold=0.25, open_seconds=10.0),
+    "postgres": _breaker_from_env("postgres", slow_call_threshold=5.0, open_seconds=15.0),
+    "bedrock": _breaker_from_env("bedrock", slow_call_threshold=30.0, min_calls=5, open_seconds=30.0),
+}
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    return circuit_breakers[name]
+
+def is_connection_failure(error: BaseException) -> bool:
+    """Database errors that indicate an unreachable/unhealthy server rather than a bad query"""
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeoutError))
+
+# AWS error codes that mean the service is overloaded or failing, not that the request was bad
+_AWS_SERVICE_FAILURE_CODES = frozenset({
+    "ThrottlingException", "ThrottledException", "TooManyRequestsException", "ServiceUnavailableException",
+    "InternalServerException", "InternalFailure", "ModelNotReadyException", "ModelTimeoutException",
+})
+
+def is_aws_service_failure(error: BaseException) -> bool:
+    """AWS errors that indicate an unavailable/overloaded service rather than a bad request (e.g. ValidationException)"""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in _AWS_SERVICE_FAILURE_CODES or status == 429 or status >= 500
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError, ConnectionError, TimeoutError))
+
+class ValidatedConnectionPool:
+    """
+    psycopg2 ThreadedConnectionPool with liveness validation and metrics
+    
+    - checkout blocks (up to a timeout) instead of raising PoolError at maxconn
+    - connections idle longer than pre_ping_idle are validated with SELECT 1
+    - connections older than max_lifetime are closed and replaced
+    - broken connections are discarded with putconn(close=True)
+    """
+    
+    def __init__(self, name: str, minconn: int, maxconn: int, max_lifetime: float = 1800.0,
+                 pre_ping_idle: Optional[float] = 30.0, checkout_timeout: float = 10.0,
+                 read_only: bool = False, **db_config):
+        self.name = name
+        self.read_only = read_only
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.pre_ping_idle = pre_ping_idle
+        self.checkout_timeout = checkout_timeout
+        
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn=minconn, maxconn=maxconn, **db_config)
+        # Bounds outstanding checkouts so getconn never hits PoolError
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._meta_lock = threading.Lock()
+        self._connection_meta = {}  # id(connection) -> {"created": t, "last_used": t}
+        
+        self.wait_histogram = registry.histogram(
+            "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+            ["pool"], buckets=DEFAULT_WAIT_BUCKETS,
+        ).labels(pool=name)
+        self._counters = {
+            "checkouts": 0,
+            "in_use": 0,
+            "saturation_events": 0,
+            "checkout_timeouts": 0,
+            "connections_opened": 0,
+            "connections_discarded": 0,
+            "connections_recycled": 0,
+            "ping_failures": 0,
+        }
+    
+    def _incr(self, counter: str, amount: int = 1):
+        with self._meta_lock:
+            self._counters[counter] += amount
+    
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a validated connection, waiting up to timeout seconds for a free slot"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        
+        if not self._slots.acquire(blocking=False):
+            self._incr("saturation_events")
+            if not self._slots.acquire(timeout=timeout):
+                self._incr("checkout_timeouts")
+                self.wait_histogram.observe(time.monotonic() - start)
+                raise PoolTimeoutError(f"No connection available in pool '{self.name}' after {timeout:.1f}s")
+        
+        self.wait_histogram.observe(time.monotonic() - start)
+        
+        try:
+            # Each attempt either returns a live connection or discards a dead one
+            for _ in range(self.maxconn + 1):
+                connection = self._pool.getconn()
+                if self._is_usable(connection):
+                    with self._meta_lock:
+                        self._counters["checkouts"] += 1
+                        self._counters["in_use"] += 1
+                    return connection
+                self._discard(connection)
+            raise psycopg2.OperationalError(f"Could not obtain a live connection from pool '{self.name}'")
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def _is_usable(self, connection) -> bool:
+        """Check closed state, age and (when idle long enough) liveness"""
+        if connection.closed:
+            return False
+        
+        now = time.monotonic()
+        with self._meta_lock:
+            meta = self._connection_meta.get(id(connection))
+            if meta is None:
+                # Freshly opened connection
+                self._connection_meta[id(connection)] = {"created": now, "last_used": now}
+                self._counters["connections_opened"] += 1
+                fresh = True
+            else:
+                fresh = False
+        
+        if fresh:
+            if self.read_only:
+                # Replica sessions reject writes instead of failing later in recovery mode
+                try:
+                    connection.set_session(readonly=True)
+                except Exception as e:
+                    app_logger.warning(f"Could not mark connection read-only in pool '{self.name}': {str(e)}")
+            return True
+        
+        if self.max_lifetime and now - meta["created"] > self.max_lifetime:
+            self._incr("connections_recycled")
+            return False
+        
+        if self.pre_ping_idle is not None and now - meta["last_used"] >= self.pre_ping_idle:
+            try:
+                cursor = connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+                connection.rollback()
+            except Exception as e:
+                self._incr("ping_failures")
+                app_logger.warning(f"Discarding dead connection from pool '{self.name}': {str(e)}")
+                return False
+        
+        return True
+    
+    def _discard(self, connection):
+        """Close a connection and drop it from the pool"""
+        with self._meta_lock:
+            self._connection_meta.pop(id(connection), None)
+            self._counters["connections_discarded"] += 1
+        try:
+            self._pool.putconn(connection, close=True)
+        except Exception as e:
+            app_logger.error(f"Error discarding connection from pool '{self.name}': {str(e)}")
+    
+    def putconn(self, connection, close: bool = False):
+        """Return a connection; broken or explicitly closed connections are discarded"""
+        try:
+            if not close and not connection.closed:
+                status = connection.info.transaction_status
+                close = status == extensions.TRANSACTION_STATUS_UNKNOWN
+            
+            if close or connection.closed:
+                self._discard(connection)
+            else:
+                with self._meta_lock:
+                    meta = self._connection_meta.get(id(connection))
+                    if meta is not None:
+                        meta["last_used"] = time.monotonic()
+                self._pool.putconn(connection)
+                if connection.closed:
+                    # ThreadedConnectionPool closes returned connections beyond minconn idle;
+                    # forget it so a new connection reusing its id() starts fresh
+                    with self._meta_lock:
+                        self._connection_meta.pop(id(connection), None)
+        finally:
+            self._incr("in_use", -1)
+            self._slots.release()
+    
+    def closeall(self):
+        self._pool.closeall()
+        with self._meta_lock:
+            self._connection_meta.clear()
+    
+    @property
+    def in_use(self) -> int:
+        """Connections currently checked out"""
+        return self._counters["in_use"]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """In-use/idle counts, lifecycle counters and checkout wait histogram"""
+        with self._meta_lock:
+            counters = dict(self._counters)
+            open_connections = len(self._connection_meta)
+        
+        # ThreadedConnectionPool keeps idle connections in _pool
+        idle = len(getattr(self._pool, "_pool", []))
+        
+        return {
+            "name": self.name,
+            "max_connections": self.maxconn,
+            "open_connections": open_connections,
+            "idle": idle,
+            "utilization": round(counters["in_use"] / self.maxconn, 3) if self.maxconn else 0.0,
+            **counters,
+            "checkout_wait_seconds": self.wait_histogram.snapshot(),
+        }
+
+class ReplicaState:
+    """Routing state for one read replica"""
+    
+    def __init__(self, name: str, pool: ValidatedConnectionPool):
+        self.name = name
+        self.pool = pool
+        self.lag_seconds: Optional[float] = None
+        self.healthy = True
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+            "pool": self.pool.get_stats(),
+        }
+
+# Replication lag in seconds; 0 when fully caught up (idle primaries don't count as lag)
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+class HealthProber:
+    """
+    Runs dependency health probes on a background thread and caches the results
+    
+    Readers never touch a dependency: results() returns the latest cached
+    outcome of every probe with its latency and last-success timestamp.
+    Until its first probe completes a dependency is "unknown" (healthy is None).
+    """
+    
+    def __init__(self, interval: float = 15.0):
+        self.interval = interval
+        self._probes: Dict[str, Callable[[], bool]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def register(self, name: str, probe: Callable[[], bool]):
+        """Add a probe; it must return truthy when healthy (or raise)"""
+        with self._lock:
+            self._probes[name] = probe
+            self._results.setdefault(name, {
+                "healthy": None,
+                "status": "unknown",
+                "latency_ms": None,
+                "last_checked": None,
+                "last_success": None,
+                "error": None,
+            })
+    
+    def start(self):
+        """Start the probe thread if it is not already running"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+    
+    def run_once(self):
+        """Run every probe once, sequentially"""
+        with self._lock:
+            probes = list(self._probes.items())
+        for name, probe in probes:
+            self._run_probe(name, probe)
+    
+    def _run_probe(self, name: str, probe: Callable[[], bool]):
+        start = time.perf_counter()
+        error = None
+        try:
+            healthy = bool(probe())
+        except Exception as e:
+            healthy = False
+            error = str(e)
+        latency_ms = round((time.perf_counter() - start) * 1000.0, 2)
+        now = time.time()
+        
+        with self._lock:
+            previous = self._results.get(name, {})
+            # Replace rather than mutate so readers always see a consistent entry
+            self._results[name] = {
+                "healthy": healthy,
+                "status": "healthy" if healthy else "unhealthy",
+                "latency_ms": latency_ms,
+                "last_checked": now,
+                "last_success": now if healthy else previous.get("last_success"),
+                "error": error,
+            }
+        if not healthy and previous.get("healthy") is not False:
+            app_logger.warning(f"Health probe '{name}' failed: {error or 'unhealthy'}")
+    
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Latest cached result per probe (starts the prober on first use)"""
+        self.start()
+        with self._lock:
+            return dict(self._results)
+    
+    def stop(self):
+        self._stop.set()
 
 class ConnectionPoolManager:
     """Manages connection pools for databases and AWS services"""
     
     def __init__(self):
-        self._db_pool = None
+        # Nothing connects here: pools are created on first use (or by
+        # start_background_init) so importing this module stays cheap
+        self._primary_pool = None
+        self._closed = False
+        self._replicas_initialized = False
+        self._db_connect_wait = float(os.getenv("DB_LAZY_CONNECT_WAIT_SECONDS", "5"))
+        self._db_connector = BackgroundConnector("database", self._connect_databases)
+        self._replicas: List[ReplicaState] = []
+        # Configured replicas not connected yet; the lag monitor keeps retrying them
+        self._pending_replicas: List[Tuple[str, str, int]] = []
+        self._replica_lock = threading.Lock()
+        self._lag_monitor_stop = threading.Event()
+        self._lag_monitor_thread = None
+        # All current callers only read; writers pass read_only=False explicitly
+        self._default_read_only = os.getenv("DB_DEFAULT_READ_ONLY", "true").lower() == "true"
+        self._max_replica_lag = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30"))
+        self._replica_checkout_timeout = float(os.getenv("DB_REPLICA_CHECKOUT_TIMEOUT_SECONDS", "1"))
         self._boto3_session = None
         self._bedrock_client = None
         self._bedrock_agent_client = None
-        self._pool_lock = threading.Lock()
         self._client_lock = threading.Lock()
-        self._initialize_pools()
+        
+        # Health is probed in the background so health_check never uses a pool slot
+        self._probe_conn = None
+        self._probe_clients: Dict[str, Any] = {}
+        self._health_prober = HealthProber(float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "15")))
+        self._health_prober.register("database", self._probe_database)
+        self._health_prober.register("bedrock", self._probe_bedrock)
+        self._health_prober.register("bedrock_agent", self._probe_bedrock_agent)
+    
+    @property
+    def _db_pool(self) -> Optional[ValidatedConnectionPool]:
+        """Primary pool, connecting lazily on first access"""
+        if self._primary_pool is None and not self._closed:
+            self._db_connector.wait(self._db_connect_wait)
+        return self._primary_pool
+    
+    def _connect_databases(self) -> bool:
+        """Connect attempt run by the background connector"""
+        if self._primary_pool is None:
+            self._initialize_db_pool()
+        if not self._replicas_initialized:
+            self._replicas_initialized = True
+            self._initialize_replica_pools()
+        return self._primary_pool is not None
     
-    def _initialize_pools(self):
-        """Initialize all connection pools"""
-        self._initialize_db_pool()
-        self._initialize_aws_clients()
+    def start_background_init(self):
+        """Begin connecting to all dependencies without blocking the caller"""
+        self._db_connector.start()
+        threading.Thread(target=self.get_bedrock_client, name="aws-client-init", daemon=True).start()
+        self._health_prober.start()
+    
+    @staticmethod
+    def _db_config(host: str, port: int) -> Dict[str, Any]:
+        """Connection settings shared by the primary and replicas"""
+        return {
+            "host": host,
+            "port": port,
+            "database": os.getenv("DB_NAME", "websites"),
+            "user": os.getenv("DB_USER", "postgres"),
+            "password": os.getenv("DB_PASSWORD", ""),
+            "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5")),
+        }
+    
+    @staticmethod
+    def _pool_settings() -> Dict[str, Any]:
+        """Pool sizing and validation settings from the environment"""
+        pre_ping_idle = os.getenv("DB_POOL_PRE_PING_IDLE_SECONDS", "30")
+        return {
+            "minconn": int(os.getenv("DB_POOL_MIN_CONNECTIONS", "2")),
+            "maxconn": int(os.getenv("DB_POOL_MAX_CONNECTIONS", "10")),
+            "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "1800")),
+            "pre_ping_idle": float(pre_ping_idle) if pre_ping_idle != "" else None,
+            "checkout_timeout": float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT_SECONDS", "10")),
+        }
     
     def _initialize_db_pool(self):
         """Initialize PostgreSQL connection pool"""
         try:
-            db_config = {
-                "host": os.getenv("DB_HOST", "localhost"),
-                "port": int(os.getenv("DB_PORT", "5432")),
-                "database": os.getenv("DB_NAME", "websites"),
-                "user": os.getenv("DB_USER", "postgres"),
-                "password": os.getenv("DB_PASSWORD", ""),
-            }
+            db_config = self._db_config(os.getenv("DB_HOST", "localhost"), int(os.getenv("DB_PORT", "5432")))
             
             # Try to create connection pool even with default localhost settings
             # This allows for local development scenarios
             try:
-                self._db_pool = psycopg2.pool.ThreadedConnectionPool(
-                    minconn=int(os.getenv("DB_POOL_MIN_CONNECTIONS", "2")),
-                    maxconn=int(os.getenv("DB_POOL_MAX_CONNECTIONS", "10")),
+                self._primary_pool = ValidatedConnectionPool(
+                    name="primary",
+                    **self._pool_settings(),
                     **db_config
                 )
                 app_logger.info("Database connection pool initialized successfully")
             except psycopg2.OperationalError as e:
                 app_logger.warning(f"Database pool initialization failed: {str(e)}")
                 app_logger.info("Database pool not available - continuing without database functionality")
-                self._db_pool = None
+                self._primary_pool = None
                 
         except Exception as e:
             app_logger.error(f"Failed to initialize database pool: {str(e)}")
-            self._db_pool = None
+            self._primary_pool = None
+    
+    def _initialize_replica_pools(self):
+        """Initialize read replica pools from DB_REPLICA_HOSTS (comma-separated host[:port])"""
+        replica_hosts = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+        default_port = int(os.getenv("DB_PORT", "5432"))
+        
+        for index, replica_host in enumerate(replica_hosts):
+            host, _, port = replica_host.partition(":")
+            self._pending_replicas.append((f"replica-{index}", host, int(port) if port else default_port))
+        
+        if self._pending_replicas:
+            self._connect_pending_replicas()
+            self._check_replica_lag()
+            self._lag_monitor_thread = threading.Thread(
+                target=self._lag_monitor_loop, name="replica-lag-monitor", daemon=True
+            )
+            self._lag_monitor_thread.start()
+    
+    def _connect_pending_replicas(self):
+        """Try to open a pool for each replica that isn't connected yet (e.g. unreachable at startup)"""
+        for name, host, port in list(self._pending_replicas):
+            if self._closed:
+                return
+            try:
+                replica_pool = ValidatedConnectionPool(
+                    name=name,
+                    read_only=True,
+                    **self._pool_settings(),
+                    **self._db_config(host, port)
+                )
+            except Exception as e:
+                app_logger.warning(f"Read replica {host} unavailable, will retry: {str(e)}")
+                continue
+            with self._replica_lock:
+                self._replicas.append(ReplicaState(name, replica_pool))
+            self._pending_replicas.remove((name, host, port))
+            app_logger.info(f"Read replica pool '{name}' initialized for {host}")
+    
+    def _lag_monitor_loop(self):
+        """Periodically retry unconnected replicas and refresh replica lag and health"""
+        interval = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS", "5"))
+        while not self._lag_monitor_stop.wait(interval):
+            if self._pending_replicas:
+                self._connect_pending_replicas()
+            self._check_replica_lag()
+    
+    def _check_replica_lag(self):
+        """Measure lag on every replica and exclude stale or unreachable ones"""
+        for replica in self._replicas:
+            try:
+                connection = replica.pool.getconn(timeout=self._replica_checkout_timeout)
+                broken = False
+                try:
+                    cursor = connection.cursor()
+                    cursor.execute(REPLICA_LAG_QUERY)
+                    lag = float(cursor.fetchone()[0] or 0)
+                    cursor.close()
+                    connection.rollback()
+                except Exception:
+                    broken = True
+                    raise
+                finally:
+                    replica.pool.putconn(connection, close=broken)
+                
+                with self._replica_lock:
+                    replica.lag_seconds = lag
+                    replica.last_checked = time.time()
+                    replica.last_error = None
+                    was_healthy = replica.healthy
+                    replica.healthy = lag <= self._max_replica_lag
+                if was_healthy and not replica.healthy:
+                    app_logger.warning(f"Replica '{replica.name}' lag {lag:.1f}s exceeds "
+                                       f"{self._max_replica_lag:.1f}s - routing reads elsewhere")
+                    
+            except Exception as e:
+                with self._replica_lock:
+                    replica.healthy = False
+                    replica.last_checked = time.time()
+                    replica.last_error = str(e)
+                app_logger.warning(f"Replica '{replica.name}' lag check failed: {str(e)}")
+    
+    def _pick_replica(self) -> Optional[ReplicaState]:
+        """Least-outstanding-requests choice among healthy replicas"""
+        with self._replica_lock:
+            candidates = [replica for replica in self._replicas if replica.healthy]
+        if not candidates:
+            return None
+        # Normalize by pool size; random tie-break spreads load across idle replicas
+        return min(candidates, key=lambda r: (r.pool.in_use / max(r.pool.maxconn, 1), random.random()))
+    
+    def _mark_replica_unhealthy(self, replica: ReplicaState, error: Exception):
+        with self._replica_lock:
+            replica.healthy = False
+            replica.last_error = str(error)
+        app_logger.warning(f"Replica '{replica.name}' failed, failing over to primary: {str(error)}")
+    
+    @traced("db.checkout")
+    def _checkout(self, read_only: bool, timeout: Optional[float]) -> Tuple[ValidatedConnectionPool, Any]:
+        """Route a checkout to a replica (reads) or the primary, failing over to the primary"""
+        if read_only:
+            replica = self._pick_replica()
+            if replica is not None:
+                replica_timeout = self._replica_checkout_timeout if timeout is None else min(timeout, self._replica_checkout_timeout)
+                try:
+                    return replica.pool, replica.pool.getconn(timeout=replica_timeout)
+                except (PoolTimeoutError, psycopg2.Error) as e:
+                    if not isinstance(e, PoolTimeoutError):
+                        self._mark_replica_unhealthy(replica, e)
+                    if not self._db_pool:
+                        raise
+        
+        if not self._db_pool:
+            raise Exception("Database pool not available")
+        return self._db_pool, self._db_pool.getconn(timeout=timeout)
     
     def _initialize_aws_clients(self):
         """Initialize AWS clients with connection pooling"""
@@ -91,42 +855,73 @@ class ConnectionPoolManager:
             self._bedrock_agent_client = None
     
     @contextmanager
-    def get_db_connection(self):
-        """Get a database connection from the pool"""
-        if not self._db_pool:
-            raise Exception("Database pool not available")
+    def get_db_connection(self, timeout: Optional[float] = None, read_only: Optional[bool] = None):
+        """
+        Get a validated database connection from the pool
         
-        connection = None
+        Read-only checkouts (the default, see DB_DEFAULT_READ_ONLY) go to the
+        least-loaded healthy replica and fail over to the primary; pass
+        read_only=False for writes. Blocks up to `timeout` (default
+        DB_POOL_CHECKOUT_TIMEOUT_SECONDS) when the pool is saturated.
+        Connections that fail mid-use are closed, not reused.
+        
+        Checkouts go through the "postgres" circuit breaker: while it is open
+        this raises CircuitOpenError immediately instead of waiting on a
+        database that is known to be down.
+        """
+        breaker = circuit_breakers["postgres"]
+        if not breaker.allow_request():
+            raise CircuitOpenError("Database circuit is open")
+        
+        start = time.monotonic()
         try:
-            with self._pool_lock:
-                connection = self._db_pool.getconn()
+            if not self._db_pool and not self._replicas:
+                raise Exception("Database pool not available")
             
-            if connection:
-                # Test the connection
-                if connection.closed:
-                    raise psycopg2.OperationalError("Connection is closed")
-                
-                yield connection
-            else:
-                raise Exception("Could not get connection from pool")
-                
+            if read_only is None:
+                read_only = self._default_read_only
+            
+            db_pool, connection = self._checkout(read_only, timeout)
+        except Exception as e:
+            breaker.record_failure(time.monotonic() - start, e)
+            raise
+        # Slow-call accounting uses checkout latency; callers may hold the connection while streaming
+        checkout_latency = time.monotonic() - start
+        
+        broken = False
+        try:
+            yield connection
+            
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            app_logger.error(f"Database connection error: {str(e)}")
+            broken = True
+            breaker.record_failure(checkout_latency, e)
+            raise
         except Exception as e:
             app_logger.error(f"Database connection error: {str(e)}")
             # Try to rollback if there's an active transaction
-            if connection and not connection.closed:
+            if not connection.closed:
                 try:
                     connection.rollback()
-                except:
-                    pass
+                except Exception:
+                    broken = True
+            if broken:
+                breaker.record_failure(checkout_latency, e)
+            else:
+                breaker.record_success(checkout_latency)
+            raise
+        except BaseException:
+            # GeneratorExit from an abandoned streaming consumer
+            breaker.record_success(checkout_latency)
             raise
+        else:
+            breaker.record_success(checkout_latency)
         finally:
-            # Return connection to pool
-            if connection and self._db_pool:
-                try:
-                    with self._pool_lock:
-                        self._db_pool.putconn(connection)
-                except Exception as e:
-                    app_logger.error(f"Error returning connection to pool: {str(e)}")
+            # Return connection to pool (discarding it if it is no longer usable)
+            try:
+                db_pool.putconn(connection, close=broken or connection.closed)
+            except Exception as e:
+                app_logger.error(f"Error returning connection to pool: {str(e)}")
     
     def get_bedrock_client(self):
         """Get Bedrock client"""
@@ -152,12 +947,15 @@ class ConnectionPoolManager:
         
         try:
             if self._db_pool:
-                # Note: ThreadedConnectionPool doesn't expose detailed stats
-                # but we can check if it's functioning
                 stats["db_pool_available"] = True
                 stats["db_pool_status"] = "healthy"
+                stats["db_pool"] = self._db_pool.get_stats()
             else:
                 stats["db_pool_status"] = "not_initialized"
+            
+            if self._replicas:
+                with self._replica_lock:
+                    stats["db_replicas"] = [replica.to_dict() for replica in self._replicas]
                 
         except Exception as e:
             stats["db_pool_status"] = f"error: {str(e)}"
@@ -172,53 +970,127 @@ class ConnectionPoolManager:
         except Exception as e:
             stats["aws_clients_status"] = f"error: {str(e)}"
         
+        stats["circuit_breakers"] = {name: breaker.get_stats() for name, breaker in circuit_breakers.items()}
+        
         return stats
     
+    def register_health_probe(self, name: str, probe: Callable[[], bool]):
+        """Let other components (e.g. the cache) add their dependency to health_check"""
+        self._health_prober.register(name, probe)
+    
+    def _probe_database(self) -> bool:
+        """SELECT 1 over a dedicated connection, outside the pools"""
+        try:
+            if self._probe_conn is None or self._probe_conn.closed:
+                self._probe_conn = psycopg2.connect(
+                    **self._db_config(os.getenv("DB_HOST", "localhost"), int(os.getenv("DB_PORT", "5432")))
+                )
+                self._probe_conn.autocommit = True
+            cursor = self._probe_conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                return cursor.fetchone() is not None
+            finally:
+                cursor.close()
+        except Exception:
+            if self._probe_conn is not None:
+                try:
+                    self._probe_conn.close()
+                except Exception:
+                    pass
+                self._probe_conn = None
+            raise
+    
+    def _probe_client(self, service: str):
+        """Control-plane client with short timeouts and no retries, used only for probing"""
+        if service not in self._probe_clients:
+            self.get_bedrock_client()  # ensures the shared session exists
+            config = boto3.session.Config(
+                region_name=os.getenv("AWS_REGION", "us-east-1"),
+                connect_timeout=2,
+                read_timeout=5,
+                retries={'max_attempts': 1},
+            )
+            self._probe_clients[service] = self._boto3_session.client(service, config=config)
+        return self._probe_clients[service]
+    
+    @staticmethod
+    def _bedrock_probe_mode() -> str:
+        """Bedrock probe mode: control_plane (cheap metadata call) or stub (client exists)"""
+        return os.getenv("HEALTH_PROBE_BEDROCK_MODE", "control_plane").lower()
+    
+    def _probe_bedrock(self) -> bool:
+        """Bedrock runtime health via a control-plane model lookup (no inference)"""
+        if self._bedrock_probe_mode() == "stub":
+            return self.get_bedrock_client() is not None
+        
+        client = self._probe_client("bedrock")
+        model_id = os.getenv("BEDROCK_MODEL_ID")
+        if model_id:
+            client.get_foundation_model(modelIdentifier=model_id)
+        else:
+            client.list_foundation_models(byProvider="anthropic")
+        return True
+    
+    def _probe_bedrock_agent(self) -> bool:
+        """Knowledge base health via the bedrock-agent control plane"""
+        knowledge_base_id = os.getenv("KNOWLEDGE_BASE_ID")
+        if self._bedrock_probe_mode() == "stub" or not knowledge_base_id:
+            return self.get_bedrock_agent_client() is not None
+        
+        response = self._probe_client("bedrock-agent").get_knowledge_base(knowledgeBaseId=knowledge_base_id)
+        return response.get("knowledgeBase", {}).get("status") == "ACTIVE"
+    
     def health_check(self) -> Dict[str, bool]:
-        """Perform health checks on all pools"""
-        health = {
-            "database": False,
-            "bedrock": False,
-            "bedrock_agent": False
-        }
+        """
+        Health of all dependencies, served from the background prober's cache
         
-        # Test database pool
-        if self._db_pool:
-            try:
-                with self.get_db_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT 1")
-                    cursor.fetchone()
-                    cursor.close()
-                    health["database"] = True
-            except Exception as e:
-                app_logger.error(f"Database health check failed: {str(e)}")
+        This never performs I/O, so load balancer probes are O(1) and don't
+        consume pool slots; see health_details() for latencies and timestamps.
+        Dependencies not probed yet (at startup) are not reported as down.
+        """
+        health = {name: result["healthy"] is not False for name, result in self._health_prober.results().items()}
         
-        # Test Bedrock clients
-        try:
-            if self._bedrock_client:
-                # This is a simple check - you might want to make an actual API call
-                health["bedrock"] = True
-        except Exception as e:
-            app_logger.error(f"Bedrock health check failed: {str(e)}")
+        # Replica health comes from the lag monitor
+        with self._replica_lock:
+            for replica in self._replicas:
+                health[f"database_{replica.name}"] = replica.healthy
         
-        try:
-            if self._bedrock_agent_client:
-                health["bedrock_agent"] = True
-        except Exception as e:
-            app_logger.error(f"Bedrock Agent health check failed: {str(e)}")
+        # A dependency with an open circuit is reported unhealthy
+        for name, breaker in circuit_breakers.items():
+            health[f"circuit_{name}_closed"] = breaker.state != CircuitBreaker.OPEN
         
         return health
     
+    def health_details(self) -> Dict[str, Dict[str, Any]]:
+        """Cached probe results with last latency, last check and last success timestamps"""
+        return self._health_prober.results()
+    
     def close_all_pools(self):
         """Close all connection pools"""
+        self._closed = True
+        self._db_connector.stop()
+        self._health_prober.stop()
+        if self._probe_conn is not None:
+            try:
+                self._probe_conn.close()
+            except Exception:
+                pass
+            self._probe_conn = None
         try:
-            if self._db_pool:
-                self._db_pool.closeall()
+            if self._primary_pool:
+                self._primary_pool.closeall()
                 app_logger.info("Database pool closed")
         except Exception as e:
             app_logger.error(f"Error closing database pool: {str(e)}")
         
+        self._lag_monitor_stop.set()
+        for replica in self._replicas:
+            try:
+                replica.pool.closeall()
+            except Exception as e:
+                app_logger.error(f"Error closing replica pool '{replica.name}': {str(e)}")
+        
         # AWS clients don't need explicit closing, but we can reset them
         self._bedrock_client = None
         self._bedrock_agent_client = None
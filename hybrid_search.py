@@ -0,0 +1,230 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from src.logging_config import app_logger
+from src.tracing import traced
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'it', 'its', 'this', 'that', 'these', 'those', 'as', 'from', 'what',
+    'how', 'when', 'where', 'why', 'who', 'do', 'does', 'did'
+})
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into BM25 terms, dropping stop words"""
+    if not text:
+        return []
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOP_WORDS]
+
+def document_id(reference: str, text: str) -> str:
+    """Stable id for a chunk: its source reference plus a digest of its text (same in every process)"""
+    return f"{reference}#{hashlib.sha1((text or '').encode('utf-8')).hexdigest()[:16]}"
+
+class BM25Index:
+    """Incremental in-process Okapi BM25 index over knowledge base chunks"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_documents: int = 50000, corpus_path: str = ""):
+        """
+        :param corpus_path: Local corpus loaded on first use (see load_corpus)
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_documents = max_documents
+        self.corpus_path = corpus_path
+        self._corpus_loaded = not corpus_path
+        self._corpus_lock = threading.Lock()
+        self._documents = OrderedDict()  # doc_id -> (term frequencies, length)
+        self._document_frequency = Counter()
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add_document(self, doc_id: str, text: str) -> None:
+        """Add (or refresh) a document, evicting the oldest once the index is full"""
+        term_frequencies = Counter(tokenize(text))
+        length = sum(term_frequencies.values())
+
+        with self._lock:
+            if doc_id in self._documents:
+                # Already indexed - just mark it as recently seen
+                self._documents.move_to_end(doc_id)
+                return
+
+            self._documents[doc_id] = (term_frequencies, length)
+            self._document_frequency.update(term_frequencies.keys())
+            self._total_length += length
+
+            while len(self._documents) > self.max_documents:
+                self._remove_oldest()
+
+    def add_documents(self, documents: Iterable[Tuple[str, str]]) -> int:
+        """Add many (doc_id, text) pairs, returning how many were processed"""
+        count = 0
+        for doc_id, text in documents:
+            self.add_document(doc_id, text)
+            count += 1
+        return count
+
+    def _remove_oldest(self) -> None:
+        """Drop the least recently added document (caller holds the lock)"""
+        _, (term_frequencies, length) = self._documents.popitem(last=False)
+        self._total_length -= length
+        for term in term_frequencies:
+            self._document_frequency[term] -= 1
+            if self._document_frequency[term] <= 0:
+                del self._document_frequency[term]
+
+    def score(self, query: str, doc_ids: Sequence[str]) -> Dict[str, float]:
+        """Score the given documents against a query"""
+        query_terms = set(tokenize(query))
+        scores = {doc_id: 0.0 for doc_id in doc_ids}
+        if not query_terms:
+            return scores
+
+        with self._lock:
+            total_documents = len(self._documents)
+            if total_documents == 0:
+                return scores
+            avg_length = self._total_length / total_documents or 1.0
+
+            idf = {}
+            for term in query_terms:
+                df = self._document_frequency.get(term, 0)
+                idf[term] = math.log(1 + (total_documents - df + 0.5) / (df + 0.5))
+
+            for doc_id in doc_ids:
+                entry = self._documents.get(doc_id)
+                if entry is None:
+                    continue
+                term_frequencies, length = entry
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                total = 0.0
+                for term in query_terms:
+                    tf = term_frequencies.get(term)
+                    if tf:
+                        total += idf[term] * tf * (self.k1 + 1) / (tf + norm)
+                scores[doc_id] = total
+
+        return scores
+
+    def ensure_corpus(self) -> None:
+        """Load corpus_path once, on first search rather than at import"""
+        if self._corpus_loaded:
+            return
+        with self._corpus_lock:
+            if not self._corpus_loaded:
+                self.load_corpus(self.corpus_path)
+                self._corpus_loaded = True
+
+    def load_corpus(self, path: str) -> int:
+        """
+        Seed the index from a local corpus
+
+        Accepts a JSONL file of {"document_reference" (or "id"), "text"} records or a
+        directory of .txt files (referenced by filename). Documents are keyed with
+        document_id, so retrieved chunks with the same reference and text match them.
+        """
+        if not path or not os.path.exists(path):
+            return 0
+
+        try:
+            if os.path.isdir(path):
+                loaded = 0
+                for name in sorted(os.listdir(path)):
+                    if name.endswith(".txt"):
+                        with open(os.path.join(path, name), "r", encoding="utf-8", errors="ignore") as f:
+                            text = f.read()
+                        self.add_document(document_id(name, text), text)
+                        loaded += 1
+            else:
+                def _records():
+                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                        for line in f:
+                            line = line.strip()
+                            if line:
+                                record = json.loads(line)
+                                text = record.get("text", "")
+                                reference = record.get("document_reference", record.get("id"))
+                                yield document_id(str(reference), text), text
+                loaded = self.add_documents(_records())
+
+            app_logger.info(f"Loaded {loaded} documents into BM25 index from {path}")
+            return loaded
+
+        except Exception as e:
+            app_logger.warning(f"Failed to load BM25 corpus from {path}: {str(e)}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        with self._lock:
+            total_documents = len(self._documents)
+            return {
+                "documents": total_documents,
+                "terms": len(self._document_frequency),
+                "avg_document_length": (self._total_length / total_documents) if total_documents else 0.0,
+            }
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """
+    Fuse several ranked lists of ids with reciprocal rank fusion
+
+    :param rankings: Ranked id lists, best first
+    :param k: RRF damping constant
+    :return: Ids ordered by fused score
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    # Stable for ties: earlier first appearance wins
+    return sorted(fused, key=lambda doc_id: -fused[doc_id])
+
+@traced("hybrid.rerank")
+def hybrid_rerank(query: str, candidates: List[Dict[str, Any]], limit: int,
+                  index: Optional[BM25Index] = None, rrf_k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Rerank vector search candidates with BM25 and RRF, truncating to limit
+
+    :param query: User query
+    :param candidates: Context dicts in vector-score order (must carry "text" and "document_reference")
+    :param limit: Number of contexts to keep
+    :return: Fused top-`limit` contexts
+    """
+    index = index or bm25_index
+    if not candidates:
+        return []
+    index.ensure_corpus()
+
+    keyed = {}
+    vector_ranking = []
+    for candidate in candidates:
+        doc_id = document_id(candidate.get("document_reference", ""), candidate.get("text", ""))
+        if doc_id in keyed:
+            continue
+        keyed[doc_id] = candidate
+        vector_ranking.append(doc_id)
+        index.add_document(doc_id, candidate.get("text", ""))
+
+    bm25_scores = index.score(query, vector_ranking)
+    lexical_ranking = [
+        doc_id for doc_id in sorted(vector_ranking, key=lambda d: -bm25_scores[d])
+        if bm25_scores[doc_id] > 0
+    ]
+
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=rrf_k)
+    return [keyed[doc_id] for doc_id in fused[:limit]]
+
+# Global BM25 index instance
+bm25_index = BM25Index(max_documents=int(os.getenv("BM25_MAX_DOCUMENTS", "50000")),
+                       corpus_path=os.getenv("BM25_CORPUS_PATH", ""))
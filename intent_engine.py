@@ -0,0 +1,347 @@
+import json
+import math
+import os
+import re
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from src.logging_config import app_logger
+
+# Intents whose handlers need a search term
+TERM_INTENTS = ("count_websites", "search_content", "find_links")
+NO_TERM_INTENTS = ("list_websites", "website_stats")
+INTENT_TYPES = TERM_INTENTS + NO_TERM_INTENTS
+
+# Legacy / alternate intent names mapped onto the types execute_database_intent handles
+INTENT_TYPE_ALIASES = {
+    "website_count": "count_websites",
+    "domain_search": "search_content",
+    "link_search": "find_links",
+    "stats": "website_stats",
+}
+
+# Words that must appear somewhere in a query for any database intent to match.
+# Checked with a set intersection so ordinary knowledge base questions skip the regex entirely.
+_TRIGGER_WORDS = frozenset({
+    "many", "count", "number", "find", "search", "show", "list", "get",
+    "statistics", "stats", "info", "information",
+})
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+# A term ends at ?, !, ; or a sentence-ending period; dots inside a term (usgs.gov) are kept
+_TERM_BODY = r"(?:[^?!.;]|\.(?=\S))+"
+_TERM = r"(?P<{name}>" + _TERM_BODY + ")"
+_QUALIFIER = r"(?:the\s+(?:word|term|keyword|phrase)\s+)?"
+
+# Order matters: at the same position the first alternative wins, so the more
+# specific find_links rule sits in front of the generic search_content rule.
+_INTENT_RULES = (
+    ("count_websites",
+     r"(?:how\s+many|count|number\s+of)\s+(?:websites?|pages?|sites?)\s+(?:that\s+)?"
+     r"(?:have|has|contain|contains|include|includes|are\s+about|about|mention|mentions|discuss|discusses)\s+"
+     + _QUALIFIER + _TERM.format(name="count_websites_term")),
+    ("find_links",
+     r"(?:find|show|list|get)\s+(?:me\s+)?(?:websites?|pages?|sites?)\s+(?:that\s+)?"
+     r"(?:have|contain|include|with)\s+(?:links?\s+to|hrefs?\s+to|references?\s+to)\s+"
+     + _TERM.format(name="find_links_term")),
+    ("search_content",
+     r"(?:find|search|show|list|get)\s+(?:me\s+)?(?:websites?|pages?|sites?|content)\s+(?:that\s+)?"
+     r"(?:contain|contains|include|includes|have|has|about|mention|mentions|discuss|discusses|with)\s+"
+     + _QUALIFIER + _TERM.format(name="search_content_term")),
+    ("list_websites",
+     r"(?:list|show|get)\s+(?:me\s+)?(?:all\s+)?(?:the\s+)?(?:websites?|domains?|sites?)\b"),
+    ("website_stats",
+     r"(?:statistics|stats|info|information)\s+(?:about|on|for)\s+(?:the\s+)?(?:websites?|pages?|database)\b"),
+)
+
+_COMBINED_PATTERN = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in _INTENT_RULES)
+)
+
+_ML_TERM_PATTERN = re.compile(
+    r"\b(?:about|mention(?:s|ing)?|contain(?:s|ing)?|with|to|regarding|referencing|for)\s+(?P<term>" + _TERM_BODY + ")"
+)
+
+def _clean_term(raw: str) -> str:
+    """Normalize an extracted search term (quotes, trailing punctuation, whitespace)"""
+    term = raw.strip()
+    if term[:1] in ("'", '"'):
+        closing = term.find(term[0], 1)
+        term = term[1:closing] if closing > 0 else term[1:]
+    term = term.strip().rstrip(".,;:'\"").strip()
+    return re.sub(r"\s+", " ", term)
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a user query for cache keys (case, whitespace, trailing punctuation)"""
+    if not query:
+        return ""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?!. ").strip()
+
+def canonical_intent(intent: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Reduce an intent to the fields that determine its database result
+
+    Resolves type aliases, normalizes the search term and drops scoring metadata
+    such as confidence, so equivalent intents share one cache entry.
+    """
+    if not intent or not intent.get("type"):
+        return None
+
+    intent_type = INTENT_TYPE_ALIASES.get(intent["type"], intent["type"])
+    canonical = {"type": intent_type}
+    if intent_type in TERM_INTENTS:
+        canonical["search_term"] = _clean_term(str(intent.get("search_term", ""))).lower()
+    return canonical
+
+class HashedNgramClassifier:
+    """Multinomial logistic regression over hashed word uni/bi-grams"""
+
+    def __init__(self, n_features: int = 2 ** 18, learning_rate: float = 0.5, l2: float = 1e-5):
+        self.n_features = n_features
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.labels: List[str] = []
+        self.weights: Dict[str, Dict[int, float]] = {}
+        self.bias: Dict[str, float] = {}
+
+    def _features(self, text: str) -> Dict[int, float]:
+        tokens = re.findall(r"[a-z0-9.]+", text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        features = defaultdict(float)
+        for gram in grams:
+            # crc32 keeps hashes stable across processes so saved models stay valid
+            features[zlib.crc32(gram.encode("utf-8")) % self.n_features] += 1.0
+        norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+        return {index: value / norm for index, value in features.items()}
+
+    def _scores(self, features: Dict[int, float]) -> Dict[str, float]:
+        logits = {}
+        for label in self.labels:
+            weights = self.weights[label]
+            logits[label] = self.bias[label] + sum(weights.get(i, 0.0) * v for i, v in features.items())
+        top = max(logits.values())
+        exp = {label: math.exp(logit - top) for label, logit in logits.items()}
+        total = sum(exp.values())
+        return {label: value / total for label, value in exp.items()}
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 20) -> "HashedNgramClassifier":
+        """Train with plain SGD; labels may include "none" for non-database queries"""
+        self.labels = sorted(set(labels))
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+        samples = [(self._features(text), label) for text, label in zip(texts, labels)]
+
+        for epoch in range(epochs):
+            rate = self.learning_rate / (1 + epoch * 0.1)
+            for features, target in samples:
+                probabilities = self._scores(features)
+                for label in self.labels:
+                    gradient = probabilities[label] - (1.0 if label == target else 0.0)
+                    weights = self.weights[label]
+                    for index, value in features.items():
+                        current = weights.get(index, 0.0)
+                        weights[index] = current - rate * (gradient * value + self.l2 * current)
+                    self.bias[label] -= rate * gradient
+        return self
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """Return (label, probability) for the most likely label"""
+        if not self.labels:
+            return None, 0.0
+        probabilities = self._scores(self._features(text))
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({
+                "n_features": self.n_features,
+                "labels": self.labels,
+                "bias": self.bias,
+                "weights": {label: {str(i): w for i, w in weights.items() if w} for label, weights in self.weights.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        with open(path, "r") as f:
+            data = json.load(f)
+        model = cls(n_features=data["n_features"])
+        model.labels = data["labels"]
+        model.bias = data["bias"]
+        model.weights = {label: {int(i): w for i, w in weights.items()} for label, weights in data["weights"].items()}
+        return model
+
+class IntentEngine:
+    """Single-pass database intent detection with an optional ML fallback for paraphrases"""
+
+    def __init__(self, classifier: Optional[HashedNgramClassifier] = None, classifier_threshold: float = 0.6):
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+
+    def set_classifier(self, classifier: Optional[HashedNgramClassifier]):
+        """Plug in (or remove) the ML stage used when no rule matches"""
+        self.classifier = classifier
+
+    def detect(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Detect a database intent in a user query
+
+        :param query: The user's question
+        :return: None, or a dict with type, optional search_term and confidence
+        """
+        if not query:
+            return None
+        text = query.lower().strip()
+
+        intent = self._detect_rules(text)
+        if intent is None and self.classifier is not None:
+            intent = self._detect_classifier(text)
+        return intent
+
+    def _detect_rules(self, text: str) -> Optional[Dict[str, Any]]:
+        if _TRIGGER_WORDS.isdisjoint(_WORD_PATTERN.findall(text)):
+            return None
+
+        match = _COMBINED_PATTERN.search(text)
+        if not match:
+            return None
+
+        intent_type = match.lastgroup
+        # Matches at the start of the query are unambiguous commands
+        confidence = 1.0 if match.start() == 0 else 0.85
+
+        if intent_type in TERM_INTENTS:
+            search_term = _clean_term(match.group(f"{intent_type}_term") or "")
+            if not search_term:
+                return None
+            return {"type": intent_type, "search_term": search_term, "confidence": confidence}
+
+        return {"type": intent_type, "confidence": confidence}
+
+    def _detect_classifier(self, text: str) -> Optional[Dict[str, Any]]:
+        label, probability = self.classifier.predict(text)
+        if not label or label == "none" or probability < self.classifier_threshold:
+            return None
+
+        if label in TERM_INTENTS:
+            term_match = _ML_TERM_PATTERN.search(text)
+            search_term = _clean_term(term_match.group("term")) if term_match else ""
+            if not search_term:
+                return None
+            return {"type": label, "search_term": search_term, "confidence": round(probability, 3)}
+
+        return {"type": label, "confidence": round(probability, 3)}
+
+# Labelled queries used for bootstrapping the classifier
+LABELLED_QUERIES: List[Tuple[str, Optional[str], Optional[str]]] = [
+    ("How many websites mention climate change?", "count_websites", "climate change"),
+    ("how many pages contain the word 'oil'", "count_websites", "oil"),
+    ("Count websites about renewable energy", "count_websites", "renewable energy"),
+    ("number of sites that discuss wildfires", "count_websites", "wildfires"),
+    ("Number of pages mention endangered species", "count_websites", "endangered species"),
+    ("Show me websites about oil drilling", "search_content", "oil drilling"),
+    ("Find pages about environmental protection", "search_content", "environmental protection"),
+    ("search content with the phrase \"land management\"", "search_content", "land management"),
+    ("list sites that mention national parks.", "search_content", "national parks"),
+    ("Find websites that have links to usgs.gov", "find_links", "usgs.gov"),
+    ("show pages with references to doi.gov", "find_links", "doi.gov"),
+    ("get sites that contain hrefs to nps.gov?", "find_links", "nps.gov"),
+    ("List all websites", "list_websites", None),
+    ("show me the domains", "list_websites", None),
+    ("What are the statistics about the database?", "website_stats", None),
+    ("give me info on the websites", "website_stats", None),
+    ("What are the main causes of wildfires?", None, None),
+    ("How does climate change affect oil production?", None, None),
+    ("What is the Bureau of Land Management?", None, None),
+    ("Tell me about renewable energy on federal lands", None, None),
+    ("What are DOI environmental regulations?", None, None),
+    ("How many acres of federal land are leased for drilling?", None, None),
+]
+
+# Held-out queries for benchmark(); keep them out of LABELLED_QUERIES so a classifier
+# trained on that set is scored on phrasings it has not seen
+HELD_OUT_QUERIES: List[Tuple[str, Optional[str], Optional[str]]] = [
+    ("how many sites discuss groundwater contamination?", "count_websites", "groundwater contamination"),
+    ("Count pages that mention the term \"offshore wind\"", "count_websites", "offshore wind"),
+    ("number of websites that include grazing permits. thanks", "count_websites", "grazing permits"),
+    ("Find content with oil. Also what is BLM?", "search_content", "oil"),
+    ("search pages that discuss tribal consultation", "search_content", "tribal consultation"),
+    ("get me sites about mining claims; sorted by date", "search_content", "mining claims"),
+    ("show websites with links to blm.gov", "find_links", "blm.gov"),
+    ("list pages that include references to fws.gov.", "find_links", "fws.gov"),
+    ("show me all the sites", "list_websites", None),
+    ("get the websites", "list_websites", None),
+    ("any stats on the pages?", "website_stats", None),
+    ("Information about the database, please", "website_stats", None),
+    ("Why are wildfire seasons getting longer?", None, None),
+    ("Who manages the national wildlife refuges?", None, None),
+    ("Explain how oil and gas leases are awarded", None, None),
+    ("What does the Fish and Wildlife Service do?", None, None),
+]
+
+def benchmark(engine: Optional[IntentEngine] = None,
+              labelled: Sequence[Tuple[str, Optional[str], Optional[str]]] = HELD_OUT_QUERIES,
+              iterations: int = 2000) -> Dict[str, Any]:
+    """
+    Measure throughput and accuracy of an intent engine over a labelled query set
+
+    :return: dict with queries_per_second, mean latency, intent accuracy and term accuracy
+    """
+    engine = engine or intent_engine
+
+    correct_type = 0
+    correct_term = 0
+    term_total = 0
+    misclassified = []
+    for query, expected_type, expected_term in labelled:
+        intent = engine.detect(query)
+        predicted_type = intent["type"] if intent else None
+        if predicted_type == expected_type:
+            correct_type += 1
+        else:
+            misclassified.append({"query": query, "expected": expected_type, "predicted": predicted_type})
+        if expected_term is not None:
+            term_total += 1
+            if intent and intent.get("search_term") == expected_term:
+                correct_term += 1
+
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        for query, _, _ in labelled:
+            engine.detect(query)
+    elapsed = time.perf_counter() - start_time
+    total_queries = iterations * len(labelled)
+
+    return {
+        "queries": total_queries,
+        "total_seconds": round(elapsed, 4),
+        "queries_per_second": round(total_queries / elapsed, 1) if elapsed else 0.0,
+        "mean_latency_us": round(elapsed / total_queries * 1e6, 2) if total_queries else 0.0,
+        "intent_accuracy": round(correct_type / len(labelled), 4) if labelled else 0.0,
+        "term_accuracy": round(correct_term / term_total, 4) if term_total else 0.0,
+        "misclassified": misclassified,
+    }
+
+def _load_default_classifier() -> Optional[HashedNgramClassifier]:
+    """Load the optional paraphrase classifier named by INTENT_CLASSIFIER_PATH"""
+    path = os.getenv("INTENT_CLASSIFIER_PATH")
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        classifier = HashedNgramClassifier.load(path)
+        app_logger.info(f"Loaded intent classifier from {path}")
+        return classifier
+    except Exception as e:
+        app_logger.warning(f"Failed to load intent classifier from {path}: {str(e)}")
+        return None
+
+# Global intent engine instance
+intent_engine = IntentEngine(
+    classifier=_load_default_classifier(),
+    classifier_threshold=float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.6")),
+)
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
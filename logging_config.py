@@ -1,27 +1,177 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+from datetime import datetime, timezone
 
-# Configure root logger to output to console
+# Logging is configured from the environment:
+#   LOG_LEVEL              default level (INFO)
+#   LOG_LEVELS             per-logger/per-module overrides, e.g. "agent=DEBUG,botocore=WARNING"
+#   LOG_FORMAT             json (default) or text
+#   LOG_FILE               log file path ("" disables file logging)
+#   LOG_ROTATION           size (default) or time
+#   LOG_MAX_BYTES / LOG_BACKUP_COUNT / LOG_ROTATE_WHEN   rotation settings
+#   LOG_DEBUG_SAMPLE_RATE  fraction of DEBUG records kept (1.0 keeps all)
+#   LOG_QUEUE_SIZE         records buffered before new ones are dropped
+LOG_LEVEL = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else was passed via extra= and is emitted as a field
+_STANDARD_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "trace_id"}
+
+def _parse_levels(spec: str) -> dict:
+    """Parse "name=LEVEL,other=LEVEL" into {name: levelno}"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levelno = logging.getLevelName(level.strip().upper())
+        if isinstance(levelno, int):
+            levels[name.strip()] = levelno
+    return levels
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the standard fields plus any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class RequestContextFilter(logging.Filter):
+    """
+    Per-module levels, DEBUG sampling and trace correlation
+
+    Runs in the calling thread (before the record is queued), so dropped
+    records never reach the queue and the trace ID is read from the
+    caller's context.
+    """
+
+    def __init__(self, default_level: int, module_levels: dict, debug_sample_rate: float):
+        super().__init__()
+        self.default_level = default_level
+        self.module_levels = module_levels
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        threshold = self.module_levels.get(record.module, self.module_levels.get(record.name, self.default_level))
+        if record.levelno < threshold:
+            return False
+        if record.levelno < logging.INFO and self.debug_sample_rate < 1.0 and random.random() >= self.debug_sample_rate:
+            return False
+
+        # Imported lazily: src.tracing itself logs through this module
+        tracing = sys.modules.get("src.tracing")
+        record.trace_id = tracing.current_trace_id() if tracing else None
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render tracebacks now (they may not be picklable or
+        # valid later) but keep the message and exception as separate fields
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _build_output_handlers() -> list:
+    """Console and (rotating) file handlers, run on the listener thread"""
+    if LOG_FORMAT == "text":
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    else:
+        formatter = JsonFormatter()
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    handlers = [console_handler]
+
+    if LOG_FILE:
+        if LOG_ROTATION == "time":
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+            )
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(
+                LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+            )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    return handlers
+
+module_levels = _parse_levels(os.getenv("LOG_LEVELS", ""))
+# Loggers must let through the most verbose level any module asks for; the filter enforces the rest
+effective_level = min([LOG_LEVEL] + list(module_levels.values()))
+
+# Configure root logger: callers only enqueue, a listener thread does the I/O
 root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
+root_logger.setLevel(effective_level)
 
 # Clear any existing handlers to avoid duplicates
 if root_logger.handlers:
     root_logger.handlers.clear()
 
-# Create console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-root_logger.addHandler(console_handler)
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(RequestContextFilter(LOG_LEVEL, module_levels, LOG_DEBUG_SAMPLE_RATE))
+root_logger.addHandler(queue_handler)
+
+log_listener = logging.handlers.QueueListener(log_queue, *_build_output_handlers(), respect_handler_level=True)
+log_listener.start()
+# Flush whatever is still queued on interpreter shutdown
+atexit.register(log_listener.stop)
 
-# Add file handler
-file_handler = logging.FileHandler('app.log')
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-root_logger.addHandler(file_handler)
+# Named loggers in LOG_LEVELS (e.g. botocore, urllib3) get their level directly
+for logger_name, level in module_levels.items():
+    logging.getLogger(logger_name).setLevel(level)
 
 # Create a logger specifically for the application
 app_logger = logging.getLogger('streamlit_app')
-app_logger.setLevel(logging.INFO)
+app_logger.setLevel(effective_level)
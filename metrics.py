@@ -0,0 +1,313 @@
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from src.logging_config import app_logger
+
+# Latency buckets in seconds, from cache lookups up to LLM generation
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                           0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _CounterChild:
+    """Monotonic counter for one label set"""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+class _GaugeChild:
+    """Value that can go up and down for one label set"""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def get(self) -> float:
+        return self._value
+
+class _HistogramChild:
+    """Fixed-bucket histogram for one label set"""
+
+    __slots__ = ("buckets", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _read(self) -> Tuple[List[int], int, float]:
+        with self._lock:
+            return list(self._counts), self._count, self._sum
+
+    def _quantile(self, counts: List[int], total: int, q: float) -> float:
+        """Upper bound of the bucket containing the q-th quantile"""
+        if total == 0:
+            return 0.0
+        threshold = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return self.buckets[index] if index < len(self.buckets) else math.inf
+        return math.inf
+
+    def snapshot(self) -> Dict[str, Any]:
+        counts, total, total_sum = self._read()
+
+        cumulative = 0
+        bucket_counts = {}
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            bucket_counts[_format_value(bound)] = cumulative
+
+        return {
+            "count": total,
+            "sum": round(total_sum, 6),
+            "avg": round(total_sum / total, 6) if total else 0.0,
+            "p50": self._quantile(counts, total, 0.50),
+            "p95": self._quantile(counts, total, 0.95),
+            "p99": self._quantile(counts, total, 0.99),
+            "buckets": bucket_counts,
+        }
+
+class _Metric:
+    """A named metric family; each distinct label set gets its own child"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str = "", labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        """Child for a label set, e.g. cache_requests.labels(cache_type="responses", result="hit")"""
+        if labels:
+            values = tuple(str(labels[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+    def total(self, **match) -> float:
+        """Sum of counter/gauge children whose labels match the given subset"""
+        return sum(
+            child.get() for labels, child in self.children()
+            if all(labels.get(key) == str(value) for key, value in match.items())
+        )
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str = "", labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+class MetricsRegistry:
+    """Thread-safe collection of metric families with Prometheus text exposition"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = cls(name, documentation, labelnames, **kwargs)
+                    self._metrics[name] = metric
+        if not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} already registered with a different type or labels")
+        return metric
+
+    def counter(self, name: str, documentation: str = "", labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str = "", labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str = "", labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def exposition(self) -> str:
+        """Render all metrics in the Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            if metric.documentation:
+                lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, child in metric.children():
+                label_pairs = [f'{key}="{_escape_label(value)}"' for key, value in labels.items()]
+                if metric.kind != "histogram":
+                    label_text = "{" + ",".join(label_pairs) + "}" if label_pairs else ""
+                    lines.append(f"{metric.name}{label_text} {_format_value(child.get())}")
+                    continue
+
+                counts, total, total_sum = child._read()
+                cumulative = 0
+                for bound, count in zip(child.buckets + (math.inf,), counts):
+                    cumulative += count
+                    bucket_labels = ",".join(label_pairs + [f'le="{_format_value(bound)}"'])
+                    lines.append(f"{metric.name}_bucket{{{bucket_labels}}} {cumulative}")
+                label_text = "{" + ",".join(label_pairs) + "}" if label_pairs else ""
+                lines.append(f"{metric.name}_sum{label_text} {_format_value(total_sum)}")
+                lines.append(f"{metric.name}_count{label_text} {total}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """JSON-friendly view: values for counters/gauges, p50/p95/p99 for histograms"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: [
+                {"labels": labels, "value": child.snapshot() if metric.kind == "histogram" else child.get()}
+                for labels, child in metric.children()
+            ]
+            for metric in metrics
+        }
+
+    def dump(self, path: str):
+        """Atomically write the exposition to a file (e.g. for a node_exporter textfile collector)"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.exposition())
+        os.replace(temp_path, path)
+
+def start_metrics_server(port: int = int(os.getenv("METRICS_PORT", "9100")), host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread"""
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    app_logger.info(f"Metrics endpoint listening on {host}:{port}/metrics")
+    return server
+
+# Global metrics registry
+registry = MetricsRegistry()
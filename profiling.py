@@ -0,0 +1,226 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import itertools
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Optional
+from src.logging_config import app_logger
+
+try:
+    import yappi
+except ImportError:
+    yappi = None
+
+# Opt-in profiling of individual requests:
+#   PROFILE_MODE     off (default) | cprofile | yappi | sampler
+#   PROFILE_EVERY_N  profile one request in N
+#   PROFILE_DIR      where .pstats / .collapsed files are written
+#   PROFILE_SIGNAL   signal that toggles profiling at runtime (e.g. SIGUSR2)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").lower()
+PROFILE_EVERY_N = max(int(os.getenv("PROFILE_EVERY_N", "100")), 1)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SIGNAL = os.getenv("PROFILE_SIGNAL", "")
+PROFILE_SAMPLER_INTERVAL = float(os.getenv("PROFILE_SAMPLER_INTERVAL_MS", "5")) / 1000.0
+
+# Set for the duration of the outermost profiled call, so nested profiled calls
+# (e.g. get_contexts inside answer_query) neither count as requests nor start a profile
+_profiling_request = contextvars.ContextVar("profiling_request", default=None)
+_NOT_SAMPLED = "not-sampled"
+
+class StackSampler:
+    """Wall-clock sampler of one thread's stack, aggregated as collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLER_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        """Write in the collapsed format consumed by flamegraph.pl / speedscope"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class RequestProfiler:
+    """Profiles every Nth request with cProfile, yappi or the stack sampler"""
+
+    MODES = ("cprofile", "yappi", "sampler")
+
+    def __init__(self, mode: str = PROFILE_MODE, every_n: int = PROFILE_EVERY_N, output_dir: str = PROFILE_DIR):
+        self.mode = mode if mode in self.MODES else "cprofile"
+        self.every_n = every_n
+        self.output_dir = output_dir
+        self.active = mode in self.MODES
+        self._counter = itertools.count(1)
+        # cProfile and yappi are process-wide, so only one request is profiled at a time
+        self._busy = threading.Lock()
+
+    def enable(self, mode: Optional[str] = None, every_n: Optional[int] = None):
+        if mode:
+            if mode not in self.MODES:
+                raise ValueError(f"Unknown profiling mode: {mode}")
+            self.mode = mode
+        if every_n:
+            self.every_n = max(every_n, 1)
+        self.active = True
+        app_logger.info(f"Request profiling enabled ({self.mode}, every {self.every_n} requests)")
+
+    def disable(self):
+        self.active = False
+        app_logger.info("Request profiling disabled")
+
+    def toggle(self, *_):
+        """Signal handler: flip profiling on/off"""
+        if self.active:
+            self.disable()
+        else:
+            self.enable()
+
+    def _output_path(self, name: str, request_id: str, extension: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{name}-{request_id}.{extension}"
+        return os.path.join(self.output_dir, filename)
+
+    @staticmethod
+    def _request_id() -> str:
+        tracing = sys.modules.get("src.tracing")
+        trace_id = tracing.current_trace_id() if tracing else None
+        return trace_id or uuid.uuid4().hex[:16]
+
+    def _start(self):
+        if self.mode == "yappi":
+            if yappi is None:
+                raise RuntimeError("PROFILE_MODE=yappi but yappi is not installed")
+            yappi.set_clock_type("wall")
+            yappi.start()
+            return None
+        if self.mode == "sampler":
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            return sampler
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _finish(self, handle, name: str, request_id: str, elapsed: float):
+        if self.mode == "yappi":
+            yappi.stop()
+            path = self._output_path(name, request_id, "pstats")
+            yappi.get_func_stats().save(path, type="pstat")
+            yappi.clear_stats()
+        elif self.mode == "sampler":
+            handle.stop()
+            path = self._output_path(name, request_id, "collapsed")
+            handle.write(path)
+        else:
+            handle.disable()
+            path = self._output_path(name, request_id, "pstats")
+            handle.dump_stats(path)
+        app_logger.info(f"Profiled {name} ({elapsed * 1000:.1f}ms) -> {path}")
+
+    def _begin(self, name: str):
+        """Mark the outermost call as a request and start profiling it if sampled"""
+        sampled = next(self._counter) % self.every_n == 0 and self._busy.acquire(blocking=False)
+        if not sampled:
+            return None, _profiling_request.set(_NOT_SAMPLED), None, 0.0
+        request_id = self._request_id()
+        token = _profiling_request.set(request_id)
+        try:
+            return self._start(), token, request_id, time.perf_counter()
+        except Exception as e:
+            self._busy.release()
+            app_logger.warning(f"Could not start profiler for {name}: {str(e)}")
+            return None, token, None, 0.0
+
+    def _end(self, state, name: str):
+        handle, token, request_id, start = state
+        _profiling_request.reset(token)
+        if request_id is None:
+            return
+        try:
+            self._finish(handle, name, request_id, time.perf_counter() - start)
+        except Exception as e:
+            app_logger.warning(f"Could not write profile for {name}: {str(e)}")
+        finally:
+            self._busy.release()
+
+    def wrap(self, func: Callable, name: str) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not self.active or _profiling_request.get() is not None:
+                    return await func(*args, **kwargs)
+                state = self._begin(name)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self._end(state, name)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.active or _profiling_request.get() is not None:
+                return func(*args, **kwargs)
+            state = self._begin(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._end(state, name)
+        return wrapper
+
+def _install_signal_handler(profiler: RequestProfiler) -> bool:
+    """Toggle profiling on PROFILE_SIGNAL (only possible from the main thread)"""
+    if not PROFILE_SIGNAL:
+        return False
+    try:
+        signal.signal(getattr(signal, PROFILE_SIGNAL.upper()), profiler.toggle)
+        app_logger.info(f"Send {PROFILE_SIGNAL.upper()} to toggle request profiling")
+        return True
+    except (AttributeError, ValueError, OSError) as e:
+        app_logger.warning(f"Cannot install profiling signal handler {PROFILE_SIGNAL}: {str(e)}")
+        return False
+
+# Global request profiler instance
+request_profiler = RequestProfiler()
+_signal_installed = _install_signal_handler(request_profiler)
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """
+    Decorator making a function eligible for per-request profiling
+
+    Unless PROFILE_MODE or PROFILE_SIGNAL is set the function is returned
+    unchanged, so there is no overhead when profiling is off.
+    """
+    def decorator(func: Callable) -> Callable:
+        if not (request_profiler.active or _signal_installed):
+            return func
+        return request_profiler.wrap(func, name or func.__name__)
+    return decorator
@@ -9,10 +9,16 @@ from functools import lru_cache
 from typing import List, Dict, Any, Tuple
 import hashlib
 import time
+from contextlib import contextmanager
 
 from src.cache_manager import cache_manager, cached, async_cached
-from src.connection_pool import connection_pool
+from src.connection_pool import connection_pool, circuit_breakers, CircuitOpenError, is_aws_service_failure
+from src.hybrid_search import hybrid_rerank
 from src.logging_config import app_logger
+from src.metrics import registry
+from src.profiling import profiled
+from src.query_log import logs_query
+from src.tracing import get_tracer, traced
 
 load_dotenv()
 
@@ -23,11 +29,58 @@ MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-5-sonnet-20240620-v
 DEFAULT_RESULTS_LIMIT = 5
 MAX_CONTEXT_LENGTH = 1500
 
+# Hybrid (vector + BM25) retrieval options
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "false").lower() == "true"
+HYBRID_OVERFETCH_FACTOR = int(os.getenv("HYBRID_OVERFETCH_FACTOR", "4"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+tracer = get_tracer(__name__)
+
+# Bedrock calls fail fast while this circuit is open; cached answers are still served
+bedrock_breaker = circuit_breakers["bedrock"]
+
+bedrock_requests = registry.counter("bedrock_requests_total", "Bedrock calls by outcome", ["operation", "resource", "status"])
+bedrock_request_seconds = registry.histogram("bedrock_request_seconds", "Bedrock call latency", ["operation", "resource"])
+bedrock_in_flight = registry.gauge("bedrock_in_flight_requests", "Bedrock calls currently in progress", ["operation"])
+
+@contextmanager
+def _bedrock_call(operation: str, resource: str):
+    """
+    Guard a Bedrock call with the circuit breaker, a tracing span and latency metrics
+    
+    :param operation: "retrieve" or "generate"
+    :param resource: Knowledge base ID (retrieve) or model ID (generate)
+    """
+    with bedrock_breaker.protect(is_failure=is_aws_service_failure), tracer.start_as_current_span(f"bedrock.{operation}", attributes={"bedrock.resource": resource}):
+        start = time.perf_counter()
+        status = "error"
+        in_flight = bedrock_in_flight.labels(operation)
+        in_flight.inc()
+        try:
+            yield
+            status = "ok"
+        finally:
+            in_flight.dec()
+            bedrock_requests.labels(operation, resource, status).inc()
+            bedrock_request_seconds.labels(operation, resource).observe(time.perf_counter() - start)
+
+ERROR_RESPONSE_PREFIX = "I'm sorry, I encountered an error"
+UNAVAILABLE_RESPONSE = "I'm sorry, the assistant is temporarily unavailable. Please try again in a moment."
+
+def is_cacheable_answer(result: Tuple[str, List]) -> bool:
+    """Don't cache error or degraded answers"""
+    response_text = result[0] if result else ""
+    return not response_text.startswith((ERROR_RESPONSE_PREFIX, UNAVAILABLE_RESPONSE))
+
 def _generate_query_hash(query: str, limit: int) -> str:
     """Generate a consistent hash for query caching"""
     query_string = f"{query}:{limit}:{KNOWLEDGE_BASE_ID}"
     return hashlib.md5(query_string.encode()).hexdigest()
 
+def answer_cache_key(query, conversation_history=None) -> str:
+    """Responses cache key shared by answer_query, answer_query_async and the chat orchestrator"""
+    return cache_manager._generate_cache_key("answer_query", query, conversation_history)
+
 def _clean_text(text: str) -> str:
     """Clean text by removing invalid UTF-8 characters and surrogates"""
     if not isinstance(text, str):
@@ -50,8 +103,85 @@ def _clean_text(text: str) -> str:
     
     return text
 
-@cached("knowledge_base", ttl=86400)  # Cache for 24 hours
-def get_contexts(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT):
+def _build_context(retrieved_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a single knowledge base retrieval result into a context dict"""
+    text = _clean_text(retrieved_result["content"]["text"])
+    
+    # Extract top 3 lines from the document
+    top_lines = _clean_text("\n".join(text.strip().split('\n')[:3]))
+    
+    # Extract a snippet for relevant text (around 150 chars for display)
+    snippet = _clean_text(text[:150] + "..." if len(text) > 150 else text)
+    
+    return {
+        "text": text,
+        "snippet": snippet,
+        "top_lines": top_lines,
+        "document_reference": _clean_text(retrieved_result["location"]["s3Location"]["uri"]),
+    }
+
+def _build_generation_request(query, retrieved_contexts, conversation_history=None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Build the Bedrock request body and references for an answer (shared by the sync and async paths)
+    
+    :return: tuple containing (JSON request body, references_list)
+    """
+    # Extract just the text and references
+    context_texts = [context["text"] for context in retrieved_contexts]
+    
+    # Create references with source, top lines, and snippet information
+    references = [
+        {
+            "source": context["document_reference"],
+            "top_lines": context["top_lines"],
+            "snippet": context["snippet"] 
+        } 
+        for context in retrieved_contexts
+    ]
+    
+    # Join contexts into a single string
+    context_string = "\n\n".join(context_texts)
+    
+    # Initialize messages
+    messages = []
+    
+    # Add conversation history if provided (limit to recent messages)
+    if conversation_history:
+        # Limit conversation history to prevent token overflow
+        recent_history = conversation_history[-6:]  # Last 6 messages
+        messages.extend(recent_history)
+    
+    # Add current query with context
+    messages.append({
+        "role": "user",
+        "content": [
+            {
+                "type": "text",
+                "text": f"Based on the following documents, please provide a detailed and accurate answer to this question: {query}\n\n{context_string}\n\nAnswer the question based only on the information provided above. If you're unsure or the information isn't in the provided documents, say so."
+            }
+        ]
+    })
+    
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 1000,
+        "messages": messages,
+        "temperature": 0.7
+    })
+    return body, references
+
+def _candidate_count(limit: int, hybrid: bool) -> int:
+    """Number of vector results to request (over-fetched when reranking)"""
+    return limit * max(HYBRID_OVERFETCH_FACTOR, 1) if hybrid else limit
+
+def contexts_cache_key(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT, hybrid=HYBRID_SEARCH_ENABLED):
+    """Cache key for a retrieval, including the defaults so toggling hybrid search doesn't serve stale contexts"""
+    return cache_manager._generate_cache_key("get_contexts", query, kbase_id, limit, hybrid)
+
+@profiled("get_contexts")
+@traced("get_contexts")
+@cached("knowledge_base", ttl=86400, key_func=contexts_cache_key, cache_if=bool)  # Cache for 24 hours (not empty/failed retrievals)
+def get_contexts(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT, hybrid=HYBRID_SEARCH_ENABLED):
     """
     This function takes a query, knowledge base id, and number of results as input, 
     and returns the contexts for the query.
@@ -60,6 +190,7 @@ def get_contexts(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT)
     :param query: Natural language query from the user
     :param kbase_id: Knowledge base ID from .env file
     :param limit: Number of results to return (reduced default)
+    :param hybrid: Over-fetch vector candidates and rerank them with BM25 + reciprocal rank fusion
     :return: The contexts for the query
     """
     start_time = time.time()
@@ -69,49 +200,33 @@ def get_contexts(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT)
         bedrock_agent_client = connection_pool.get_bedrock_agent_client()
         
         # Getting the contexts for the query from the knowledge base
-        results = bedrock_agent_client.retrieve(
-            retrievalQuery={"text": query},
-            knowledgeBaseId=kbase_id,
-            retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": limit}},
-        )
+        with _bedrock_call("retrieve", kbase_id):
+            results = bedrock_agent_client.retrieve(
+                retrievalQuery={"text": query},
+                knowledgeBaseId=kbase_id,
+                retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": _candidate_count(limit, hybrid)}},
+            )
         
         app_logger.info(f"Knowledge base query completed in {time.time() - start_time:.2f}s")
         
+    except CircuitOpenError as e:
+        app_logger.warning(f"Skipping knowledge base retrieval: {str(e)}")
+        return []
     except Exception as e:
         app_logger.error(f"Knowledge base retrieval error: {str(e)}")
         return []
     
-    contexts = []
-    for retrieved_result in results["retrievalResults"]:
-        # Limit the length of each context to reduce token count
-        # Extract text content for the main context
-        text = _clean_text(retrieved_result["content"]["text"])
-        
-        # Debugging - uncomment to print full structure of retrieved_result
-        # print(f"Retrieved result structure: {json.dumps(retrieved_result, indent=2)}")
-        
-        # Access other potentially useful fields (if needed)
-        # - Score represents the relevance of this result
-        score = retrieved_result.get("score", 0)
-        # - Metadata may contain additional document properties
-        metadata = retrieved_result.get("metadata", {})
-        
-        # Extract top 3 lines from the document
-        top_lines = _clean_text("\n".join(text.strip().split('\n')[:3]))
-        
-        # Extract a snippet for relevant text (around 150 chars for display)
-        snippet = _clean_text(text[:150] + "..." if len(text) > 150 else text)
-            
-        contexts.append({
-            "text": text,
-            "snippet": snippet,
-            "top_lines": top_lines,
-            "document_reference": _clean_text(retrieved_result["location"]["s3Location"]["uri"]),
-        })
+    contexts = [_build_context(retrieved_result) for retrieved_result in results["retrievalResults"]]
+    
+    if hybrid:
+        contexts = hybrid_rerank(query, contexts, limit, rrf_k=HYBRID_RRF_K)
     
     return contexts
 
-@cached("responses", ttl=21600)  # Cache responses for 6 hours
+@logs_query
+@profiled("answer_query")
+@traced("answer_query")
+@cached("responses", ttl=21600, key_func=answer_cache_key, cache_if=is_cacheable_answer)  # Cache responses for 6 hours
 def answer_query(query, conversation_history=None):
     """
     Takes a user query, retrieves relevant context from the knowledge base,
@@ -127,56 +242,18 @@ def answer_query(query, conversation_history=None):
         # Get contexts from knowledge base (this is already cached)
         retrieved_contexts = get_contexts(query)
         
-        # Extract just the text and references
-        context_texts = [context["text"] for context in retrieved_contexts]
-        
-        # Create references with source, top lines, and snippet information
-        references = [
-            {
-                "source": context["document_reference"],
-                "top_lines": context["top_lines"],
-                "snippet": context["snippet"] 
-            } 
-            for context in retrieved_contexts
-        ]
-        
-        # Join contexts into a single string
-        context_string = "\n\n".join(context_texts)
-        
-        # Initialize messages with system prompt (optional)
-        messages = []
-        
-        # Add conversation history if provided (limit to recent messages)
-        if conversation_history:
-            # Limit conversation history to prevent token overflow
-            recent_history = conversation_history[-6:]  # Last 6 messages
-            messages.extend(recent_history)
-        
-        # Add current query with context
-        messages.append({
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": f"Based on the following documents, please provide a detailed and accurate answer to this question: {query}\n\n{context_string}\n\nAnswer the question based only on the information provided above. If you're unsure or the information isn't in the provided documents, say so."
-                }
-            ]
-        })
+        body, references = _build_generation_request(query, retrieved_contexts, conversation_history)
         
         # Use connection pool for Bedrock client
         bedrock_client = connection_pool.get_bedrock_client()
         
         # Call the Bedrock model using Messages API format
-        response = bedrock_client.invoke_model(
-            modelId=MODEL_ID,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
-                "messages": messages,
-                "temperature": 0.7
-            }),
-            contentType="application/json",
-        )
+        with _bedrock_call("generate", MODEL_ID):
+            response = bedrock_client.invoke_model(
+                modelId=MODEL_ID,
+                body=body,
+                contentType="application/json",
+            )
         
         # Extract the generated text from the response
         response_body = json.loads(response["body"].read())
@@ -187,12 +264,17 @@ def answer_query(query, conversation_history=None):
         
         return response_text, references
         
+    except CircuitOpenError as e:
+        app_logger.warning(f"Answer query rejected: {str(e)}")
+        return UNAVAILABLE_RESPONSE, []
     except Exception as e:
         app_logger.error(f"Error in answer_query: {str(e)}")
-        return f"I'm sorry, I encountered an error processing your request: {str(e)}", []
+        return f"{ERROR_RESPONSE_PREFIX} processing your request: {str(e)}", []
 
-@async_cached("knowledge_base", ttl=86400)
-async def get_contexts_async(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT):
+@profiled("get_contexts_async")
+@traced("get_contexts_async")
+@async_cached("knowledge_base", ttl=86400, key_func=contexts_cache_key, cache_if=bool)
+async def get_contexts_async(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RESULTS_LIMIT, hybrid=HYBRID_SEARCH_ENABLED):
     """
     Async version of get_contexts with improved caching
     """
@@ -206,122 +288,98 @@ async def get_contexts_async(query, kbase_id=KNOWLEDGE_BASE_ID, limit=DEFAULT_RE
             bedrock_agent_client = connection_pool.get_bedrock_agent_client()
             
             # Execute the retrieval in a thread
-            results = await loop.run_in_executor(
-                executor, 
-                lambda: bedrock_agent_client.retrieve(
-                    retrievalQuery={"text": query},
-                    knowledgeBaseId=kbase_id,
-                    retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": limit}},
+            with _bedrock_call("retrieve", kbase_id):
+                results = await loop.run_in_executor(
+                    executor, 
+                    lambda: bedrock_agent_client.retrieve(
+                        retrievalQuery={"text": query},
+                        knowledgeBaseId=kbase_id,
+                        retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": _candidate_count(limit, hybrid)}},
+                    )
                 )
-            )
             
         app_logger.info(f"Async knowledge base query completed in {time.time() - start_time:.2f}s")
         
-        contexts = []
-        for retrieved_result in results["retrievalResults"]:
-            text = _clean_text(retrieved_result["content"]["text"])
-            score = retrieved_result.get("score", 0)
-            metadata = retrieved_result.get("metadata", {})
-            
-            top_lines = _clean_text("\n".join(text.strip().split('\n')[:3]))
-            snippet = _clean_text(text[:150] + "..." if len(text) > 150 else text)
-                
-            contexts.append({
-                "text": text,
-                "snippet": snippet,
-                "top_lines": top_lines,
-                "document_reference": _clean_text(retrieved_result["location"]["s3Location"]["uri"]),
-            })
+        contexts = [_build_context(retrieved_result) for retrieved_result in results["retrievalResults"]]
+        
+        if hybrid:
+            contexts = hybrid_rerank(query, contexts, limit, rrf_k=HYBRID_RRF_K)
         
         return contexts
         
+    except CircuitOpenError as e:
+        app_logger.warning(f"Skipping async knowledge base retrieval: {str(e)}")
+        return []
     except Exception as e:
         app_logger.error(f"Async knowledge base retrieval error: {str(e)}")
         return []
 
-@async_cached("responses", ttl=21600)
-async def answer_query_async(query, conversation_history=None):
+async def generate_answer_async(query, retrieved_contexts, conversation_history=None):
     """
-    Fully asynchronous version of answer_query function with advanced caching
+    Generate an answer from already-retrieved contexts
     
     :param query: The user's question
+    :param retrieved_contexts: Contexts returned by get_contexts / get_contexts_async
     :param conversation_history: List of previous message pairs
     :return: tuple containing (response_text, references_list)
     """
-    start_time = time.time()
+    body, references = _build_generation_request(query, retrieved_contexts, conversation_history)
     
-    try:
-        # Get contexts from knowledge base asynchronously
-        retrieved_contexts = await get_contexts_async(query)
-        
-        # Extract just the text and references
-        context_texts = [context["text"] for context in retrieved_contexts]
-        
-        # Create references with source, top lines, and snippet information
-        references = [
-            {
-                "source": context["document_reference"],
-                "top_lines": context["top_lines"],
-                "snippet": context["snippet"] 
-            } 
-            for context in retrieved_contexts
-        ]
-        
-        # Join contexts into a single string
-        context_string = "\n\n".join(context_texts)
-        
-        # Initialize messages
-        messages = []
-        
-        # Add conversation history if provided (limit to recent messages)
-        if conversation_history:
-            recent_history = conversation_history[-6:]  # Last 6 messages
-            messages.extend(recent_history)
-        
-        # Add current query with context
-        messages.append({
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": f"Based on the following documents, please provide a detailed and accurate answer to this question: {query}\n\n{context_string}\n\nAnswer the question based only on the information provided above. If you're unsure or the information isn't in the provided documents, say so."
-                }
-            ]
-        })
+    # Run the Bedrock call in a thread pool
+    loop = asyncio.get_event_loop()
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        bedrock_client = connection_pool.get_bedrock_client()
         
-        # Run the Bedrock call in a thread pool
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            bedrock_client = connection_pool.get_bedrock_client()
-            
+        with _bedrock_call("generate", MODEL_ID):
             response = await loop.run_in_executor(
                 executor,
                 lambda: bedrock_client.invoke_model(
                     modelId=MODEL_ID,
-                    body=json.dumps({
-                        "anthropic_version": "bedrock-2023-05-31",
-                        "max_tokens": 1000,
-                        "messages": messages,
-                        "temperature": 0.7
-                    }),
+                    body=body,
                     contentType="application/json",
                 )
             )
+    
+    # Extract the generated text from the response
+    response_body = json.loads(response["body"].read())
+    response_text = _clean_text(response_body["content"][0]["text"])
+    
+    return response_text, references
+
+@logs_query
+@profiled("answer_query_async")
+@traced("answer_query_async")
+@async_cached("responses", ttl=21600, key_func=answer_cache_key, cache_if=is_cacheable_answer)
+async def answer_query_async(query, conversation_history=None):
+    """
+    Fully asynchronous version of answer_query function with advanced caching
+    
+    :param query: The user's question
+    :param conversation_history: List of previous message pairs
+    :return: tuple containing (response_text, references_list)
+    """
+    start_time = time.time()
+    
+    try:
+        # Get contexts from knowledge base asynchronously
+        retrieved_contexts = await get_contexts_async(query)
         
-        # Extract the generated text from the response
-        response_body = json.loads(response["body"].read())
-        response_text = _clean_text(response_body["content"][0]["text"])
+        response_text, references = await generate_answer_async(query, retrieved_contexts, conversation_history)
         
         processing_time = time.time() - start_time
         app_logger.info(f"Async answer query completed in {processing_time:.2f}s")
         
         return response_text, references
         
+    except CircuitOpenError as e:
+        app_logger.warning(f"Async answer query rejected: {str(e)}")
+        return UNAVAILABLE_RESPONSE, []
     except Exception as e:
         app_logger.error(f"Error in async answer_query: {str(e)}")
-        return f"I'm sorry, I encountered an error processing your request: {str(e)}", []
+        return f"{ERROR_RESPONSE_PREFIX} processing your request: {str(e)}", []
 
 # Batch processing functions for multiple queries
+@traced("process_queries_batch")
 async def process_queries_batch(queries: List[str], conversation_history=None) -> List[Tuple[str, List]]:
     """
     Process multiple queries concurrently for improved performance
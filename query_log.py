@@ -0,0 +1,305 @@
+import contextvars
+import functools
+import heapq
+import inspect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from src.intent_engine import normalize_query
+from src.logging_config import app_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is only safe with a single writer process
+    fcntl = None
+
+# Append-only log of user queries, one "timestamp<TAB>normalized[<TAB>raw]" line each.
+# It holds user text, so capture is opt-in:
+#   QUERY_LOG_FILE            path, e.g. /var/lib/doi_chat/query_log.tsv ("" disables capture)
+#   QUERY_LOG_MAX_BYTES       size at which the log is rotated to <file>.1 (under <file>.lock,
+#                             so several worker processes can share one log)
+#   QUERY_LOG_BOOTSTRAP_BYTES how much of an existing log a new reader starts with
+QUERY_LOG_FILE = os.getenv("QUERY_LOG_FILE", "")
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+QUERY_LOG_BOOTSTRAP_BYTES = int(os.getenv("QUERY_LOG_BOOTSTRAP_BYTES", str(4 * 1024 * 1024)))
+
+QueryRecord = Tuple[float, str, str]  # (timestamp, normalized, raw)
+
+# Set while the cache warmer replays queries, so warming doesn't count as traffic
+_capture_suppressed = contextvars.ContextVar("query_capture_suppressed", default=False)
+
+def _single_line(text: str) -> str:
+    return text.replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+class QueryLog:
+    """Thread-safe appender for the query log"""
+
+    def __init__(self, path: str = QUERY_LOG_FILE, max_bytes: int = QUERY_LOG_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _open(self):
+        if self._file is not None and not self._is_current():
+            # Another process rotated the log; stop appending to <file>.1
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            # Line buffered: each record reaches the file in one write, so readers never see half a line
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        return self._file
+
+    def _is_current(self) -> bool:
+        """Whether our open file is still the one at self.path"""
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            return False
+
+    def _rotate_if_needed(self):
+        if self._file is None or self._file.tell() < self.max_bytes:
+            return
+        self._file.close()
+        self._file = None
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have rotated it while we waited for the lock
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+
+    def record(self, query: str, timestamp: Optional[float] = None):
+        """Append a query; never raises, capture must not fail a request"""
+        if not self.enabled or _capture_suppressed.get() or not query or not isinstance(query, str):
+            return
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        raw = _single_line(query.strip())
+        # The raw text is only kept when it differs, because it is what cache keys are built from
+        fields = [str(int(timestamp if timestamp is not None else time.time())), _single_line(normalized)]
+        if raw != fields[1]:
+            fields.append(raw)
+        try:
+            with self._lock:
+                self._open().write("\t".join(fields) + "\n")
+                self._rotate_if_needed()
+        except OSError as e:
+            app_logger.debug(f"Could not write query log {self.path}: {str(e)}")
+
+    @staticmethod
+    @contextmanager
+    def suppressed():
+        """Don't record queries made inside this block (in this thread / task)"""
+        token = _capture_suppressed.set(True)
+        try:
+            yield
+        finally:
+            _capture_suppressed.reset(token)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class QueryLogReader:
+    """
+    Incremental tail reader for the query log
+
+    Each read_new() call returns only the lines appended since the previous
+    call; rotation or truncation is detected and reading restarts at the top
+    of the new file. A fresh reader starts at the last `bootstrap_bytes` of an
+    existing log instead of reading all of it.
+    """
+
+    def __init__(self, path: str = QUERY_LOG_FILE, bootstrap_bytes: int = QUERY_LOG_BOOTSTRAP_BYTES,
+                 chunk_size: int = 64 * 1024):
+        self.path = path
+        self.bootstrap_bytes = bootstrap_bytes
+        self.chunk_size = chunk_size
+        self._inode = None
+        self._offset = None
+
+    @staticmethod
+    def parse(line: str) -> Optional[QueryRecord]:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 2 or not fields[1]:
+            return None
+        try:
+            timestamp = float(fields[0])
+        except ValueError:
+            return None
+        return timestamp, fields[1], fields[2] if len(fields) > 2 and fields[2] else fields[1]
+
+    def read_new(self) -> Iterator[QueryRecord]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+
+        with open(self.path, "rb") as f:
+            if self._inode != stat.st_ino or self._offset is None or stat.st_size < self._offset:
+                # First read, rotated or truncated
+                start = 0
+                if self._offset is None and stat.st_size > self.bootstrap_bytes:
+                    start = stat.st_size - self.bootstrap_bytes
+                self._inode = stat.st_ino
+                self._offset = start
+                f.seek(start)
+                if start:
+                    # Skip the partial line we landed in
+                    self._offset += len(f.readline())
+            f.seek(self._offset)
+
+            pending = b""
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                pending += chunk
+                lines = pending.split(b"\n")
+                # The last element is an incomplete line (or b""); keep it for the next chunk or call
+                pending = lines.pop()
+                for line in lines:
+                    self._offset += len(line) + 1
+                    record = self.parse(line.decode("utf-8", errors="replace"))
+                    if record:
+                        yield record
+
+class DecayedTopK:
+    """
+    Space-Saving heavy hitters with exponentially decayed counts
+
+    Tracks at most `capacity` distinct queries in O(capacity) memory. Counts
+    use forward decay: an occurrence at time t adds 2 ** ((t - landmark) / half_life),
+    so old entries never have to be rescaled and a query's score halves for
+    every half_life without new occurrences. When the table is full the
+    lowest-count entry is evicted and the newcomer inherits its count (the
+    classic Space-Saving overestimate, kept in `error`).
+    """
+
+    def __init__(self, capacity: int = 1000, half_life_seconds: float = 24 * 3600):
+        self.capacity = capacity
+        self.half_life = half_life_seconds
+        self.landmark = None
+        # key -> [weighted count, error, latest raw text, last seen]
+        self._entries: Dict[str, list] = {}
+        # Lazy min-heap of (weighted count, key); stale items are skipped on pop
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _weight(self, timestamp: float) -> float:
+        if self.landmark is None:
+            self.landmark = timestamp
+        exponent = (timestamp - self.landmark) / self.half_life
+        if exponent > 500:
+            self._rebase(timestamp)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rebase(self, timestamp: float):
+        """Move the landmark forward before weights overflow"""
+        scale = 2.0 ** (-(timestamp - self.landmark) / self.half_life)
+        for entry in self._entries.values():
+            entry[0] *= scale
+            entry[1] *= scale
+        self.landmark = timestamp
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(entry[0], key) for key, entry in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self) -> str:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == count:
+                return key
+
+    def add(self, key: str, timestamp: Optional[float] = None, raw: Optional[str] = None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            weight = self._weight(timestamp)
+            entry = self._entries.get(key)
+            if entry is None:
+                error = 0.0
+                if len(self._entries) >= self.capacity:
+                    evicted = self._pop_min()
+                    error = self._entries.pop(evicted)[0]
+                entry = self._entries[key] = [error, error, raw or key, timestamp]
+            entry[0] += weight
+            entry[2] = raw or entry[2]
+            entry[3] = max(entry[3], timestamp)
+            heapq.heappush(self._heap, (entry[0], key))
+            if len(self._heap) > 4 * max(self.capacity, 16):
+                self._rebuild_heap()
+
+    def score(self, key: str, now: Optional[float] = None) -> float:
+        """Decayed count at `now` (occurrences, each worth 1 when it happened)"""
+        entry = self._entries.get(key)
+        if entry is None or self.landmark is None:
+            return 0.0
+        now = now if now is not None else time.time()
+        return entry[0] * 2.0 ** (-(now - self.landmark) / self.half_life)
+
+    def top(self, n: int, now: Optional[float] = None, min_score: float = 0.0) -> List[Dict[str, object]]:
+        """The n highest-scoring keys with their decayed score and most recent raw text"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if self.landmark is None:
+                return []
+            decay = 2.0 ** (-(now - self.landmark) / self.half_life)
+            best = heapq.nlargest(n, self._entries.items(), key=lambda item: item[1][0])
+        results = []
+        for key, (count, error, raw, last_seen) in best:
+            score = count * decay
+            if score < min_score or math.isinf(score):
+                continue
+            results.append({"query": raw, "normalized": key, "score": score,
+                            "error": error * decay, "last_seen": last_seen})
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+            self.landmark = None
+
+# Global query log
+query_log = QueryLog()
+
+def logs_query(func: Callable) -> Callable:
+    """Decorator recording the `query` argument of each call in the query log"""
+    parameters = list(inspect.signature(func).parameters)
+    position = parameters.index("query") if "query" in parameters else 0
+
+    def _query_of(args, kwargs):
+        if "query" in kwargs:
+            return kwargs["query"]
+        return args[position] if len(args) > position else None
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query_log.record(_query_of(args, kwargs))
+            return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        query_log.record(_query_of(args, kwargs))
+        return func(*args, **kwargs)
+    return wrapper
@@ -1,70 +1,356 @@
 import gzip
+import threading
+import zlib
 import brotli
 import zstandard as zstd
 import json
-from typing import Any, Dict, Union
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
 import time
+from src.compression_dictionary import dictionary_registry
 from src.logging_config import app_logger
+from src.metrics import registry
+
+# Server preference when the client accepts several encodings equally
+RESPONSE_ENCODINGS = [e.strip() for e in os.getenv("RESPONSE_ENCODINGS", "zstd,br,gzip").split(",") if e.strip()]
+# Per-response compression time we are willing to spend; levels step down to stay within it
+COMPRESSION_CPU_BUDGET = float(os.getenv("RESPONSE_COMPRESSION_CPU_BUDGET_MS", "5")) / 1000.0
+COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1000"))
+# Longest a streamed chunk waits for a word boundary while tokens keep arriving (0 disables)
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "150")) / 1000.0
+
+# Content-Coding tokens (Accept-Encoding / Content-Encoding) <-> compress_response methods
+_METHOD_FOR_CODING = {"br": "brotli", "zstd": "zstd", "gzip": "gzip", "identity": "identity"}
+_CODING_FOR_METHOD = {method: coding for coding, method in _METHOD_FOR_CODING.items()}
+
+# Candidate levels per method from best ratio to fastest, and the payload sizes
+# up to which each is the starting point (larger payloads start at a faster level)
+# (zstd_dict uses the trained dictionary; only for clients that ship the same dictionaries)
+_LEVELS = {"brotli": (9, 6, 4, 1), "zstd": (9, 6, 3, 1), "zstd_dict": (9, 6, 3, 1), "gzip": (9, 6, 4, 1)}
+_LEVEL_SIZE_LIMITS = (16 * 1024, 256 * 1024, 2 * 1024 * 1024)
+# Levels used for streams, where every chunk is flushed and latency matters more than ratio
+_STREAM_LEVELS = {"brotli": 4, "zstd": 3, "gzip": 6}
+
+compression_responses = registry.counter(
+    "response_compression_total", "Responses passed through compress_response", ["method", "outcome"]
+)
+compression_bytes = registry.counter("response_compression_bytes_total", "Response bytes before/after compression", ["method", "stage"])
+compression_ratios = registry.histogram(
+    "response_compression_ratio", "Fraction of bytes saved per response", ["method"],
+    buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+compression_seconds = registry.histogram("response_compression_seconds", "Compression latency", ["method"])
+
+def negotiate_encoding(accept_encoding: Optional[str], supported: Iterable[str] = None) -> str:
+    """
+    Pick a Content-Encoding from an Accept-Encoding header (RFC 9110)
+    
+    :param accept_encoding: Header value, e.g. "gzip, br;q=0.9, *;q=0"
+    :param supported: Codings in server preference order (RESPONSE_ENCODINGS)
+    :return: "zstd", "br", "gzip" or "identity"
+    """
+    supported = list(supported or RESPONSE_ENCODINGS)
+    if not accept_encoding:
+        return "identity"
+    
+    weights = {}
+    for item in accept_encoding.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        coding = parts[0].lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in parts[1:]:
+            if param.lower().startswith("q="):
+                try:
+                    weight = float(param[2:])
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    
+    wildcard = weights.get("*")
+    best, best_weight = "identity", 0.0
+    for coding in supported:
+        weight = weights.get(coding, wildcard if wildcard is not None else 0.0)
+        # Strictly greater keeps the earlier (preferred) coding on ties
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+class StreamCompressor:
+    """
+    Incremental compressor for token streams
+    
+    Every compress() call returns output flushed to a block boundary, so the
+    client can decode each chunk as soon as it arrives; finish() ends the
+    stream. One instance per response.
+    """
+    
+    def __init__(self, method: str, level: Optional[int] = None):
+        self.method = _METHOD_FOR_CODING.get(method, method)
+        self.level = level if level is not None else _STREAM_LEVELS.get(self.method)
+        self.original_size = 0
+        self.compressed_size = 0
+        self.seconds = 0.0
+        if self.method == "brotli":
+            self._compressor = brotli.Compressor(quality=self.level)
+        elif self.method == "zstd":
+            # Own context per stream: compressobj() objects from one ZstdCompressor share (and reset) its state
+            self._compressor = zstd.ZstdCompressor(level=self.level).compressobj()
+        elif self.method == "gzip":
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            self.method = "identity"
+            self._compressor = None
+    
+    @property
+    def content_encoding(self) -> Optional[str]:
+        return None if self.method == "identity" else _CODING_FOR_METHOD[self.method]
+    
+    def _account(self, start: float, original: int, output: bytes) -> bytes:
+        self.seconds += time.perf_counter() - start
+        self.original_size += original
+        self.compressed_size += len(output)
+        return output
+    
+    def compress(self, chunk: Union[str, bytes]) -> bytes:
+        start = time.perf_counter()
+        data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        if self.method == "brotli":
+            output = self._compressor.process(data) + self._compressor.flush()
+        elif self.method == "zstd":
+            output = self._compressor.compress(data) + self._compressor.flush(zstd.COMPRESSOBJ_FLUSH_BLOCK)
+        elif self.method == "gzip":
+            output = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            output = data
+        return self._account(start, len(data), output)
+    
+    def finish(self) -> bytes:
+        start = time.perf_counter()
+        if self.method == "brotli":
+            output = self._compressor.finish()
+        elif self.method in ("zstd", "gzip"):
+            output = self._compressor.flush()
+        else:
+            output = b""
+        return self._account(start, 0, output)
+
+# Sentence ends (punctuation, closing quotes/brackets, then whitespace) and paragraph breaks
+_SENTENCE_END = re.compile(r'[.!?:;][)"\'\]]*\s+|\n\s*')
+_WHITESPACE = re.compile(r'\s+')
+_CODE_FENCE = "```"
+
+class TextChunker:
+    """
+    Splits text arriving as a token stream into display chunks
+    
+    Chunks end at sentence or word boundaries and keep all whitespace, so
+    joining them reproduces the input exactly (newlines, Markdown and code
+    blocks included). Inside fenced code blocks chunks end at line breaks.
+    Boundaries are searched in place with regex pos/endpos and chunks are
+    slices; pending text is joined once per emitted chunk rather than
+    concatenated per token.
+    """
+    
+    def __init__(self, chunk_size: int = 50, flush_interval: float = STREAM_FLUSH_INTERVAL):
+        self.chunk_size = max(chunk_size, 1)
+        self.flush_interval = flush_interval
+        self._parts = []
+        self._pending = 0
+        self._in_code = False
+        self._last_emit = time.monotonic()
+    
+    def _cut(self, text: str, start: int, limit: int) -> Optional[int]:
+        """End of the chunk starting at `start`, ideally no later than `limit`"""
+        if self._in_code:
+            newline = text.rfind("\n", start, limit)
+            if newline >= start:
+                return newline + 1
+        else:
+            sentence_end = None
+            for match in _SENTENCE_END.finditer(text, start, limit):
+                sentence_end = match.end()
+            # Only prefer the sentence end if it doesn't leave a tiny chunk
+            if sentence_end is not None and sentence_end - start >= self.chunk_size // 2:
+                return sentence_end
+        
+        space = max(text.rfind(" ", start, limit), text.rfind("\n", start, limit), text.rfind("\t", start, limit))
+        if space >= start:
+            # Keep the whole whitespace run with this chunk
+            return _WHITESPACE.match(text, space).end()
+        # A single word longer than chunk_size becomes its own chunk; runs without
+        # any whitespace (base64, long URLs) are split once they reach 4x chunk_size
+        hard_limit = start + 4 * self.chunk_size
+        match = _WHITESPACE.search(text, limit, hard_limit)
+        if match:
+            return match.end()
+        return limit if len(text) >= hard_limit else None
+    
+    def _emit(self, text: str, start: int, end: int) -> str:
+        chunk = text[start:end]
+        if text.count(_CODE_FENCE, start, end) % 2:
+            self._in_code = not self._in_code
+        self._last_emit = time.monotonic()
+        return chunk
+    
+    def _drain(self, final: bool = False) -> Iterator[str]:
+        text = "".join(self._parts) if len(self._parts) != 1 else self._parts[0]
+        start = 0
+        while len(text) - start > self.chunk_size:
+            end = self._cut(text, start, start + self.chunk_size)
+            if end is None:
+                break
+            yield self._emit(text, start, end)
+            start = end
+        
+        if start < len(text):
+            if final:
+                end = len(text)
+            elif self.flush_interval and time.monotonic() - self._last_emit >= self.flush_interval:
+                # Overdue: send everything up to the last word boundary we already have
+                space = max(text.rfind(" ", start), text.rfind("\n", start), text.rfind("\t", start))
+                end = space + 1 if space >= start else None
+            else:
+                end = None
+            if end is not None and end > start:
+                yield self._emit(text, start, end)
+                start = end
+        
+        remainder = text[start:] if start else text
+        self._parts = [remainder] if remainder else []
+        self._pending = len(remainder)
+    
+    def feed(self, token: str) -> Iterator[str]:
+        """Add a token; yields any chunks that are complete (or overdue)"""
+        if not token:
+            return
+        self._parts.append(token)
+        self._pending += len(token)
+        overdue = self.flush_interval and time.monotonic() - self._last_emit >= self.flush_interval
+        if self._pending > self.chunk_size or overdue:
+            yield from self._drain()
+    
+    def finish(self) -> Iterator[str]:
+        """Flush whatever is left at the end of the stream"""
+        if self._parts:
+            yield from self._drain(final=True)
+
+# One-shot zstd contexts are expensive to create and not thread-safe: keep one per thread and level
+# (streams can't share them, see StreamCompressor)
+_thread_contexts = threading.local()
+
+def _thread_zstd_compressor(level: int) -> zstd.ZstdCompressor:
+    compressors = getattr(_thread_contexts, "zstd", None)
+    if compressors is None:
+        compressors = _thread_contexts.zstd = {}
+    compressor = compressors.get(level)
+    if compressor is None:
+        compressor = compressors[level] = zstd.ZstdCompressor(level=level)
+    return compressor
+
+def _record(method: str, outcome: str, original_size: int, compressed_size: int, seconds: float):
+    ratio = (original_size - compressed_size) / original_size if original_size else 0.0
+    compression_responses.labels(method, outcome).inc()
+    compression_bytes.labels(method, "original").inc(original_size)
+    compression_bytes.labels(method, "compressed").inc(compressed_size)
+    compression_ratios.labels(method).observe(min(max(ratio, 0.0), 1.0))
+    compression_seconds.labels(method).observe(seconds)
+    return ratio
 
 class ResponseOptimizer:
     """Optimizes responses through compression and streaming"""
     
-    def __init__(self):
-        self.compression_stats = {
-            "total_responses": 0,
-            "compression_enabled": 0,
-            "bytes_saved": 0,
-            "avg_compression_ratio": 0.0
+    def __init__(self, cpu_budget: float = COMPRESSION_CPU_BUDGET, min_size: int = COMPRESSION_MIN_SIZE):
+        self.cpu_budget = cpu_budget
+        self.min_size = min_size
+        # Observed seconds per input byte for each (method, level), as an EWMA
+        self._cost_per_byte: Dict[Tuple[str, int], float] = {}
+    
+    @property
+    def compression_stats(self) -> Dict[str, Any]:
+        """Lifetime compression counters (from the metrics registry)"""
+        original_bytes = compression_bytes.total(stage="original")
+        bytes_saved = original_bytes - compression_bytes.total(stage="compressed")
+        return {
+            "total_responses": int(compression_responses.total()),
+            "compression_enabled": int(compression_responses.total(outcome="compressed")),
+            "bytes_saved": int(bytes_saved),
+            # Byte-weighted: total saved over total input
+            "avg_compression_ratio": (bytes_saved / original_bytes) if original_bytes else 0.0
         }
     
-    def compress_response(self, data: Union[str, Dict], method: str = "brotli") -> bytes:
+    @staticmethod
+    def _encode(data: Union[str, bytes, Dict]) -> bytes:
+        """Serialize a payload to UTF-8 exactly once"""
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, (dict, list)):
+            return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return str(data).encode('utf-8')
+    
+    def choose_level(self, method: str, size: int) -> int:
+        """
+        Compression level for a payload: the best-ratio level for its size whose
+        predicted time (from observed throughput) fits in the CPU budget
+        """
+        levels = _LEVELS[method]
+        index = sum(1 for limit in _LEVEL_SIZE_LIMITS if size > limit)
+        while index < len(levels) - 1:
+            cost = self._cost_per_byte.get((method, levels[index]))
+            if cost is None or cost * size <= self.cpu_budget:
+                break
+            index += 1
+        return levels[index]
+    
+    def _observe_cost(self, method: str, level: int, size: int, seconds: float):
+        if size < 1024:
+            return  # fixed overhead dominates; not representative of throughput
+        key = (method, level)
+        sample = seconds / size
+        previous = self._cost_per_byte.get(key)
+        self._cost_per_byte[key] = sample if previous is None else 0.8 * previous + 0.2 * sample
+    
+    def _compress_bytes(self, payload: bytes, method: str, level: int) -> bytes:
+        if method == "gzip":
+            return gzip.compress(payload, compresslevel=level)
+        if method == "brotli":
+            return brotli.compress(payload, quality=level)
+        if method == "zstd":
+            return _thread_zstd_compressor(level).compress(payload)
+        if method == "zstd_dict":
+            return dictionary_registry.compress(payload, level)
+        return payload
+    
+    def compress_response(self, data: Union[str, bytes, Dict], method: str = "brotli", level: Optional[int] = None) -> bytes:
         """
         Compress response data using specified method
         
-        :param data: Data to compress (string or dict)
-        :param method: Compression method ('gzip', 'brotli', 'zstd')
+        :param data: Data to compress (string, bytes or dict)
+        :param method: Compression method ('gzip', 'brotli', 'zstd', 'zstd_dict') or Content-Encoding token ('br')
+        :param level: Compression level; chosen from payload size and CPU budget when omitted
         :return: Compressed bytes
         """
-        start_time = time.time()
+        method = _METHOD_FOR_CODING.get(method, method)
+        payload = b""
         
         try:
-            # Convert to string if dict
-            if isinstance(data, dict):
-                data_str = json.dumps(data, separators=(',', ':'))
-            else:
-                data_str = str(data)
-            
-            original_size = len(data_str.encode('utf-8'))
-            
-            # Choose compression method
-            if method == "gzip":
-                compressed = gzip.compress(data_str.encode('utf-8'), compresslevel=6)
-            elif method == "brotli":
-                compressed = brotli.compress(data_str.encode('utf-8'), quality=6)
-            elif method == "zstd":
-                cctx = zstd.ZstdCompressor(level=6)
-                compressed = cctx.compress(data_str.encode('utf-8'))
-            else:
+            payload = self._encode(data)
+            if method not in _LEVELS:
                 # Fallback to no compression
-                compressed = data_str.encode('utf-8')
+                return payload
             
-            compressed_size = len(compressed)
-            compression_ratio = (original_size - compressed_size) / original_size
+            level = level if level is not None else self.choose_level(method, len(payload))
+            start = time.perf_counter()
+            compressed = self._compress_bytes(payload, method, level)
+            processing_time = time.perf_counter() - start
+            self._observe_cost(method, level, len(payload), processing_time)
             
-            # Update stats
-            self.compression_stats["total_responses"] += 1
-            if compression_ratio > 0:
-                self.compression_stats["compression_enabled"] += 1
-                self.compression_stats["bytes_saved"] += (original_size - compressed_size)
-                
-                # Update average compression ratio
-                self.compression_stats["avg_compression_ratio"] = (
-                    self.compression_stats["bytes_saved"] / 
-                    (self.compression_stats["total_responses"] * original_size)
-                )
+            compression_ratio = _record(method, "compressed" if len(compressed) < len(payload) else "uncompressed",
+                                        len(payload), len(compressed), processing_time)
             
-            processing_time = time.time() - start_time
-            app_logger.debug(f"Compression ({method}): {original_size} -> {compressed_size} bytes "
+            app_logger.debug(f"Compression ({method}, level {level}): {len(payload)} -> {len(compressed)} bytes "
                            f"({compression_ratio:.1%} reduction) in {processing_time:.3f}s")
             
             return compressed
@@ -72,37 +358,97 @@ class ResponseOptimizer:
         except Exception as e:
             app_logger.error(f"Compression error with {method}: {str(e)}")
             # Return uncompressed data as fallback
-            return data_str.encode('utf-8') if isinstance(data, str) else json.dumps(data).encode('utf-8')
+            return payload or self._encode(data)
     
-    def stream_response_chunks(self, response: str, chunk_size: int = 50) -> list:
+    def compress_for_client(self, data: Union[str, bytes, Dict], accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
         """
-        Break response into chunks for streaming display
+        Encode and (if worthwhile and accepted) compress a response body
         
-        :param response: Full response text
-        :param chunk_size: Size of each chunk in characters
-        :return: List of response chunks
+        :param data: Response payload
+        :param accept_encoding: The request's Accept-Encoding header
+        :return: (body, Content-Encoding header value or None)
         """
-        if not response:
-            return []
+        payload = self._encode(data)
+        coding = negotiate_encoding(accept_encoding)
+        if coding == "identity" or not self.should_compress(payload, self.min_size):
+            return payload, None
         
-        # Split response into word-boundary chunks for better display
-        words = response.split()
-        chunks = []
-        current_chunk = ""
+        compressed = self.compress_response(payload, coding)
+        if len(compressed) >= len(payload):
+            return payload, None
+        return compressed, coding
+    
+    def stream_compressor(self, accept_encoding: Optional[str]) -> StreamCompressor:
+        """Streaming compressor for the encoding the client prefers (check .content_encoding)"""
+        return StreamCompressor(negotiate_encoding(accept_encoding))
+    
+    def compress_stream(self, chunks: Iterable[Union[str, bytes]], accept_encoding: Optional[str]) -> Tuple[Optional[str], Iterator[bytes]]:
+        """
+        Compress a token/chunk stream on the fly
         
-        for word in words:
-            if len(current_chunk) + len(word) + 1 <= chunk_size:
-                current_chunk += word + " "
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = word + " "
+        :param chunks: Text chunks as they are produced (e.g. LLM deltas)
+        :param accept_encoding: The request's Accept-Encoding header
+        :return: (Content-Encoding header value or None, iterator of compressed chunks)
+        """
+        compressor = self.stream_compressor(accept_encoding)
         
-        # Add the last chunk
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        def _generate():
+            try:
+                for chunk in chunks:
+                    output = compressor.compress(chunk)
+                    if output:
+                        yield output
+                tail = compressor.finish()
+                if tail:
+                    yield tail
+            finally:
+                _record(compressor.method, "streamed", compressor.original_size,
+                        compressor.compressed_size, compressor.seconds)
         
-        return chunks
+        return compressor.content_encoding, _generate()
+    
+    def compress_sse(self, events: Iterable[Union[str, Dict]], accept_encoding: Optional[str],
+                     event: Optional[str] = None) -> Tuple[Optional[str], Iterator[bytes]]:
+        """
+        Format events as Server-Sent Events and compress them on the fly
+        
+        :return: (Content-Encoding header value or None, iterator of body chunks)
+        """
+        def _frames():
+            for item in events:
+                data = item if isinstance(item, str) else json.dumps(item, separators=(',', ':'), ensure_ascii=False)
+                prefix = f"event: {event}\n" if event else ""
+                yield prefix + "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+        
+        return self.compress_stream(_frames(), accept_encoding)
+    
+    def stream_response_chunks(self, response: Union[str, Iterable[str]], chunk_size: int = 50,
+                               flush_interval: float = STREAM_FLUSH_INTERVAL) -> Iterator[str]:
+        """
+        Break a response into chunks for streaming display
+        
+        Accepts the full text or a token stream (e.g. model deltas) and yields
+        chunks as soon as they are complete, so the result can be passed
+        straight to compress_stream/compress_sse. Chunks keep all whitespace;
+        "".join(chunks) == response.
+        
+        :param response: Full response text or an iterable of text tokens
+        :param chunk_size: Target size of each chunk in characters
+        :param flush_interval: Seconds after which buffered text is sent at the
+                               last word boundary even if the chunk isn't full
+        :return: Iterator of response chunks
+        """
+        if not response:
+            return
+        
+        chunker = TextChunker(chunk_size, flush_interval)
+        if isinstance(response, str):
+            # Whole text: no time-based flushing, slices of the original string
+            chunker.flush_interval = 0
+            response = (response,)
+        for token in response:
+            yield from chunker.feed(token)
+        yield from chunker.finish()
     
     def optimize_json_response(self, data: Dict[str, Any]) -> str:
         """
@@ -143,12 +489,16 @@ class ResponseOptimizer:
     
     def get_compression_stats(self) -> Dict[str, Any]:
         """Get compression statistics"""
+        stats = self.compression_stats
         return {
-            **self.compression_stats,
+            **stats,
             "compression_rate": (
-                self.compression_stats["compression_enabled"] / 
-                max(self.compression_stats["total_responses"], 1) * 100
-            )
+                stats["compression_enabled"] / 
+                max(stats["total_responses"], 1) * 100
+            ),
+            "compression_ratio_by_method": {
+                labels["method"]: histogram.snapshot() for labels, histogram in compression_ratios.children()
+            }
         }
     
     def estimate_transfer_time(self, data_size: int, connection_speed_mbps: float = 10.0) -> float:
@@ -163,20 +513,15 @@ class ResponseOptimizer:
         bytes_per_second = connection_speed_mbps * 1024 * 1024 / 8
         return data_size / bytes_per_second
     
-    def should_compress(self, data: Union[str, Dict], min_size: int = 1000) -> bool:
+    def should_compress(self, data: Union[str, bytes, Dict], min_size: int = 1000) -> bool:
         """
         Determine if data should be compressed based on size
         
-        :param data: Data to check
+        :param data: Data to check (pass already-encoded bytes to avoid serializing twice)
         :param min_size: Minimum size in bytes to consider compression
         :return: True if should compress
         """
-        if isinstance(data, dict):
-            data_str = json.dumps(data)
-        else:
-            data_str = str(data)
-        
-        return len(data_str.encode('utf-8')) >= min_size
+        return len(self._encode(data)) >= min_size
 
 # Global response optimizer instance
 response_optimizer = ResponseOptimizer()
\ No newline at end of file
@@ -0,0 +1,226 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+from src.logging_config import app_logger
+
+# none (default, zero-cost) | stdout | file | otel (requires opentelemetry-api/sdk to be configured)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+
+# Active span for the current thread / asyncio task
+_current_span = contextvars.ContextVar("current_span", default=None)
+# Marks a subtree whose root was not sampled
+_UNSAMPLED = object()
+
+class JsonLinesExporter:
+    """Writes one JSON object per finished span to a stream"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]):
+        line = json.dumps(span, default=str, separators=(',', ':'))
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+class _NoOpSpan:
+    """Span returned when tracing is disabled or the trace is not sampled"""
+
+    trace_id = None
+    span_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_exception(self, exception: BaseException):
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+_NOOP_SPAN = _NoOpSpan()
+
+class _UnsampledSpan(_NoOpSpan):
+    """Root of an unsampled trace; children see the marker and stay no-op"""
+
+    def __enter__(self):
+        self._token = _current_span.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+class Span:
+    """A timed operation; exported as a JSON record when it ends"""
+
+    def __init__(self, name: str, exporter: JsonLinesExporter, parent: Optional["Span"],
+                 attributes: Optional[Dict[str, Any]] = None, scope: str = ""):
+        self.name = name
+        self.scope = scope
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = "ok"
+        self.error = None
+        self._exporter = exporter
+        self._token = None
+        self._start_time = 0.0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._start) * 1000.0
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_exception(exc)
+        try:
+            self._exporter.export({
+                "name": self.name,
+                "scope": self.scope,
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "start_time": self._start_time,
+                "duration_ms": round(duration_ms, 3),
+                "status": self.status,
+                "error": self.error,
+                "attributes": self.attributes,
+            })
+        except Exception as e:
+            app_logger.debug(f"Failed to export span '{self.name}': {str(e)}")
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def record_exception(self, exception: BaseException):
+        self.status = "error"
+        self.error = f"{type(exception).__name__}: {str(exception)}"
+
+    def is_recording(self) -> bool:
+        return True
+
+class Tracer:
+    """Minimal tracer with the OpenTelemetry start_as_current_span() API"""
+
+    def __init__(self, name: str, exporter: Optional[JsonLinesExporter], sample_rate: float = 1.0):
+        self.name = name
+        self._exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        """Context manager creating a child of the current span (or a new sampled root)"""
+        if self._exporter is None:
+            return _NOOP_SPAN
+        parent = _current_span.get()
+        if parent is _UNSAMPLED:
+            return _NOOP_SPAN
+        if parent is None and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return _UnsampledSpan()
+        return Span(name, self._exporter, parent, attributes, scope=self.name)
+
+def _build_exporter() -> Optional[JsonLinesExporter]:
+    """Exporter for the configured TRACING_EXPORTER (None when tracing is off)"""
+    if TRACING_EXPORTER == "stdout":
+        return JsonLinesExporter(sys.stdout)
+    if TRACING_EXPORTER == "file":
+        try:
+            return JsonLinesExporter(open(TRACING_FILE, "a", encoding="utf-8"))
+        except OSError as e:
+            app_logger.warning(f"Cannot open trace file {TRACING_FILE}, tracing disabled: {str(e)}")
+    return None
+
+_exporter = _build_exporter()
+
+try:
+    if TRACING_EXPORTER == "otel":
+        from opentelemetry import trace as _otel_trace
+    else:
+        _otel_trace = None
+except ImportError:
+    app_logger.warning("TRACING_EXPORTER=otel but opentelemetry is not installed, tracing disabled")
+    _otel_trace = None
+
+def tracing_enabled() -> bool:
+    return _exporter is not None or _otel_trace is not None
+
+def get_tracer(name: str):
+    """Tracer for a module; an OpenTelemetry tracer when TRACING_EXPORTER=otel"""
+    if _otel_trace is not None:
+        return _otel_trace.get_tracer(name)
+    return Tracer(name, _exporter, TRACING_SAMPLE_RATE)
+
+def current_trace_id() -> Optional[str]:
+    """Trace ID of the active span, for log correlation"""
+    if _otel_trace is not None:
+        span_context = _otel_trace.get_current_span().get_span_context()
+        return format(span_context.trace_id, "032x") if span_context.is_valid else None
+    span = _current_span.get()
+    return span.trace_id if isinstance(span, Span) else None
+
+def traced(name: Optional[str] = None, tracer=None):
+    """
+    Decorator wrapping a sync or async function in a span
+
+    When tracing is disabled the function is returned unchanged, so
+    decorated hot paths pay nothing.
+    """
+    def decorator(func: Callable):
+        if not tracing_enabled():
+            return func
+        span_name = name or func.__qualname__
+        span_tracer = tracer or get_tracer(func.__module__)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span_tracer.start_as_current_span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span_tracer.start_as_current_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def with_current_context(func: Callable) -> Callable:
+    """
+    Bind func to a copy of the caller's context
+
+    run_in_executor does not carry contextvars into worker threads; wrapping
+    the callable keeps spans created there in the caller's trace.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)